@@ -0,0 +1,238 @@
+"""Tiempo de arranque de la aplicación, costo de un fixture y memoria de los workers.
+
+Mide:
+
+- `python -X importtime` al crear la app: tiempo total de importación, los
+  paquetes que más tardan y si algún módulo de `aplicacion.PEREZOSOS`
+  (formularios, importación, slugify) se cargó antes de usarse;
+- en un proceso nuevo, cuánto tardan el import, `create_app` y la primera
+  petición (GET /login, que sí carga los formularios);
+- fixtures de prueba: `create_app` con su propia base SQLite en memoria más
+  el esquema completo, por app, y que dos apps no ven los datos de la otra;
+- con `--gunicorn` (solo Linux), gunicorn con N workers sin y con precarga
+  (WEB_PRECARGA): tiempo hasta responder y memoria PSS total y privada por
+  worker después de calentarlos.
+
+Uso:
+    python benchmarks/bench_arranque.py [--repeticiones 7] [--fixtures 50] [--gunicorn] [--procesos 4]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_arranque.db')
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTORNO = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(RAIZ, 'src'), os.environ.get('PYTHONPATH', '')]))
+
+CREAR = "from prestamos.aplicacion import create_app; create_app()"
+
+# Tiempos de un proceso nuevo: import, create_app y primera petición
+PROCESO = """
+import time
+inicio = time.perf_counter()
+from prestamos.aplicacion import create_app
+importado = time.perf_counter()
+app = create_app()
+creada = time.perf_counter()
+assert app.test_client().get('/login').status_code == 200
+print(importado - inicio, creada - importado, time.perf_counter() - creada)
+"""
+
+
+def importtime():
+    """Corre CREAR con -X importtime; devuelve ({módulo: (propio, acumulado)}, total) en ms"""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', CREAR], env=ENTORNO, cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stderr
+    modulos, total = {}, 0.0
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulos[nombre.strip()] = (int(propio) / 1000, int(acumulado) / 1000)
+        if not nombre.startswith('  '):
+            # Solo los imports de primer nivel: su acumulado ya incluye a los anidados
+            total += int(acumulado) / 1000
+    return modulos, total
+
+
+def reportar_importtime(repeticiones):
+    corridas = sorted((importtime() for _ in range(repeticiones)), key=lambda corrida: corrida[1])
+    modulos, total = corridas[len(corridas) // 2]
+    print(f"importtime de create_app(): {total:.0f} ms (mediana de {repeticiones})")
+    paquetes = Counter()
+    for nombre, (propio, _) in modulos.items():
+        paquetes[nombre.split('.')[0]] += propio
+    print(f"  {'paquete':<24} {'ms propios':>10}")
+    for paquete, propio in paquetes.most_common(10):
+        print(f"  {paquete:<24} {propio:>10.1f}")
+
+    from prestamos.aplicacion import PEREZOSOS
+    cargados = [modulo for modulo in PEREZOSOS if modulo in modulos]
+    print(f"  módulos perezosos cargados al arrancar: {', '.join(cargados) or 'ninguno'}\n")
+    return not cargados
+
+
+def reportar_proceso(repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run([sys.executable, '-c', PROCESO], env=ENTORNO, cwd=RAIZ,
+                                capture_output=True, text=True, check=True).stdout
+        tiempos.append([float(valor) * 1000 for valor in salida.split()] + [(time.perf_counter() - inicio) * 1000])
+    columnas = zip(*tiempos)
+    importado, creada, primera, total = (statistics.median(columna) for columna in columnas)
+    print(f"proceso nuevo (mediana de {repeticiones}): import {importado:.0f} ms, create_app {creada:.1f} ms, "
+          f"primera petición {primera:.0f} ms, total con el intérprete {total:.0f} ms\n")
+
+
+def reportar_fixtures(cantidad):
+    import sqlalchemy as sa
+
+    from prestamos.aplicacion import create_app
+    from prestamos.database import db
+    from prestamos.migraciones import aplicar_migraciones
+    from prestamos.models import Usuario
+
+    def fixture():
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQLALCHEMY_BINDS': {},
+                          'TESTING': True, 'WTF_CSRF_ENABLED': False})
+        with app.app_context():
+            db.create_all()
+            aplicar_migraciones(db.engine, verbose=False)
+        return app
+
+    fixture()  # la primera compila las sentencias del esquema
+    inicio = time.perf_counter()
+    apps = [fixture() for _ in range(cantidad)]
+    duracion = (time.perf_counter() - inicio) / cantidad * 1000
+
+    with apps[0].app_context():
+        db.session.add(Usuario(nombre='Aislado', email='aislado@ejemplo.com'))
+        db.session.commit()
+    with apps[1].app_context():
+        ajenos = db.session.scalar(sa.select(sa.func.count()).select_from(Usuario))
+    print(f"fixture (create_app + esquema en SQLite en memoria): {duracion:.1f} ms por app, "
+          f"filas de otra app visibles: {ajenos}\n")
+    return ajenos == 0
+
+
+def _puerto_libre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _hijos(pid):
+    hijos = []
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as archivo:
+                campos = archivo.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(campos[1]) == pid:
+            hijos.append(int(entrada))
+    return hijos
+
+
+def _memoria(pid):
+    """(PSS, privada) en MiB según /proc/<pid>/smaps_rollup"""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as archivo:
+        for linea in archivo:
+            partes = linea.split()
+            if len(partes) >= 2 and partes[1].isdigit():
+                valores[partes[0].rstrip(':')] = int(partes[1])
+    return valores['Pss'] / 1024, (valores['Private_Clean'] + valores['Private_Dirty']) / 1024
+
+
+def medir_gunicorn(precarga, procesos, calentamiento):
+    puerto = _puerto_libre()
+    url = f'http://127.0.0.1:{puerto}/login'
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ, 'gunicorn.conf.py'), '--bind', f'127.0.0.1:{puerto}',
+         '--workers', str(procesos), '--threads', '2', 'prestamos.wsgi:app'],
+        env=dict(ENTORNO, WEB_PRECARGA='1' if precarga else '0'), cwd=RAIZ,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        inicio = time.perf_counter()
+        while True:
+            if proceso.poll() is not None:
+                raise RuntimeError(f"gunicorn terminó con código {proceso.returncode}")
+            try:
+                urllib.request.urlopen(url, timeout=5).read()
+                break
+            except OSError:
+                time.sleep(0.05)
+        listo = time.perf_counter() - inicio
+        # Cada petición abre una conexión nueva, así que se reparten entre los workers
+        for _ in range(calentamiento * procesos):
+            urllib.request.urlopen(url, timeout=30).read()
+        workers = _hijos(proceso.pid)
+        pss_total = _memoria(proceso.pid)[0] + sum(_memoria(pid)[0] for pid in workers)
+        privada = statistics.mean(_memoria(pid)[1] for pid in workers)
+        return listo, pss_total, privada
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def reportar_gunicorn(procesos, calentamiento):
+    if importlib.util.find_spec('gunicorn') is None or not os.path.exists('/proc/self/smaps_rollup'):
+        print("gunicorn: se omite (requiere gunicorn y Linux)")
+        return
+    print(f"gunicorn, {procesos} workers, {calentamiento} GET /login por worker:")
+    print(f"  {'':<14} {'listo s':>8} {'PSS total MiB':>14} {'privada/worker MiB':>19}")
+    for nombre, precarga in (('sin precarga', False), ('con precarga', True)):
+        listo, pss_total, privada = medir_gunicorn(precarga, procesos, calentamiento)
+        print(f"  {nombre:<14} {listo:>8.2f} {pss_total:>14.1f} {privada:>19.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=7)
+    parser.add_argument('--fixtures', type=int, default=50)
+    parser.add_argument('--gunicorn', action='store_true', help='medir también la memoria de gunicorn')
+    parser.add_argument('--procesos', type=int, default=4, help='workers de gunicorn')
+    parser.add_argument('--calentamiento', type=int, default=20, help='peticiones por worker antes de medir')
+    args = parser.parse_args()
+
+    from prestamos import db_init
+    from prestamos.aplicacion import create_app
+    from prestamos.database import db
+    from prestamos.migraciones import tabla_versiones
+
+    with create_app().app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}\n")
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+    db_init.init_db()
+
+    perezosos_ok = reportar_importtime(args.repeticiones)
+    reportar_proceso(args.repeticiones)
+    aisladas = reportar_fixtures(args.fixtures)
+    if args.gunicorn:
+        reportar_gunicorn(args.procesos, args.calentamiento)
+    return 0 if perezosos_ok and aisladas else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
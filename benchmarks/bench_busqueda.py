@@ -0,0 +1,101 @@
+"""Latencia de `search_personas` / `search_elementos` frente al ILIKE anterior.
+
+Uso:
+    python benchmarks/bench_busqueda.py [--filas 1000000]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_busqueda.db')
+
+import sqlalchemy as sa
+
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona
+from prestamos.search import search_personas, search_elementos
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Ana', 'Luis', 'Sofía', 'Andrés', 'Valentina', 'Jorge', 'Camila']
+APELLIDOS = ['Pérez', 'González', 'Rodríguez', 'Gómez', 'López', 'Martínez', 'Díaz', 'Torres', 'Ramírez', 'Vargas']
+ELEMENTOS = ['Cámara Sony', 'Micrófono Shure', 'Trípode Manfrotto', 'Luz LED', 'Cable XLR', 'Proyector Epson']
+TIPOS = ['camara', 'microfono', 'tripode', 'iluminacion', 'audio', 'otro']
+
+
+def poblar(filas):
+    db.session.execute(sa.insert(Usuario), [{'id': 1, 'nombre': 'Admin', 'email': 'admin@ejemplo.com', 'es_admin': True}])
+    for inicio in range(0, filas, 20_000):
+        rango = range(inicio + 1, min(filas, inicio + 20_000) + 1)
+        db.session.execute(sa.insert(Persona), [
+            {'id': i, 'nombre': f'{random.choice(NOMBRES)}{i % 997}', 'apellido': random.choice(APELLIDOS),
+             'identificacion': str(10_000_000 + i), 'rol': 'estudiante'}
+            for i in rango
+        ])
+        db.session.execute(sa.insert(ElementoAudiovisual), [
+            {'id': i, 'placa': f'PLA{i:07d}', 'nombre': f'{random.choice(ELEMENTOS)} {i % 101}',
+             'tipo': random.choice(TIPOS), 'disponible': i % 4 != 0, 'slug': f'elemento-{i}', 'user_id': 1}
+            for i in rango
+        ])
+    db.session.commit()
+
+
+def ilike_personas(q, limite):
+    patron = f"%{q}%"
+    return Persona.query.filter(sa.or_(
+        Persona.nombre.ilike(patron), Persona.apellido.ilike(patron), Persona.identificacion.ilike(patron)
+    )).order_by(Persona.nombre).limit(limite).all()
+
+
+def medir(nombre, funcion, consultas, limite):
+    tiempos = []
+    for q in consultas:
+        inicio = time.perf_counter()
+        funcion(q, limite)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        db.session.rollback()
+    tiempos.sort()
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    print(f"{nombre:<28} p50 {statistics.median(tiempos):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=200_000)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--limite', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+        db.create_all()
+        print(f"Poblando {args.filas} personas y elementos en {db.engine.url.render_as_string()}...")
+        aplicar_migraciones(db.engine, verbose=False)
+        poblar(args.filas)
+        with db.engine.begin() as conexion:
+            conexion.execute(sa.text('ANALYZE'))
+
+        consultas = [random.choice([
+            str(10_000_000 + random.randint(1, args.filas))[2:7],
+            random.choice(APELLIDOS)[:4].lower(),
+            f"{random.choice(NOMBRES)}{random.randint(0, 996)}",
+        ]) for _ in range(args.consultas)]
+        medir('ILIKE (anterior)', ilike_personas, consultas, args.limite)
+        medir('search_personas', lambda q, l: search_personas(q, limite=l), consultas, args.limite)
+        consultas = [random.choice(['cable xlr', 'sony', f'PLA{random.randint(1, args.filas):07d}', 'manfrotto 7'])
+                     for _ in range(args.consultas)]
+        medir('search_elementos', lambda q, l: search_elementos(q, limite=l, solo_disponibles=True),
+              consultas, args.limite)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Consultas en el tiempo sobre `prestamo_intervalos` frente a la tabla `prestamo`.
+
+Llena la base con un historial de préstamos sin solapamientos por elemento,
+arma el registro de eventos y su proyección (`eventos.desde_prestamos` y
+`eventos.reconstruir`) y mide:
+
+- elementos afuera en un instante T (hoy, hace un mes, hace un año), con
+  `eventos.afuera_en` y con la consulta equivalente sobre `prestamo`;
+- uso por elemento en los últimos 7, 30 y 365 días;
+- `eventos.conciliar` después de invertir `disponible` en algunos elementos,
+  comprobando que corrige exactamente esos.
+
+Uso:
+    python benchmarks/bench_eventos.py [--prestamos 500000] [--elementos 5000] [--repeticiones 5]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_eventos.db')
+
+import sqlalchemy as sa
+
+from prestamos import eventos
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo, ESTADOS_ACTIVOS
+
+
+def preparar(num_elementos, num_prestamos):
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.add(Persona(id=1, nombre='Nombre', apellido='Apellido', identificacion='10000000', rol='estudiante'))
+    db.session.execute(sa.insert(ElementoAudiovisual), [
+        {'id': i, 'placa': f'PLA{i:06d}', 'nombre': f'Elemento {i}', 'tipo': 'camara',
+         'disponible': True, 'slug': f'elemento-{i}', 'user_id': 1}
+        for i in range(1, num_elementos + 1)
+    ])
+    ahora = datetime.utcnow()
+    inicio = ahora - timedelta(days=3 * 365)
+    ventana = int((ahora - inicio).total_seconds())
+    filas = []
+    for elemento_id in range(1, num_elementos + 1):
+        salidas = sorted(inicio + timedelta(seconds=random.randrange(ventana))
+                         for _ in range(num_prestamos // num_elementos))
+        for fecha, siguiente in zip(salidas, salidas[1:] + [None]):
+            regreso = fecha + timedelta(hours=random.randint(1, 240))
+            if siguiente is None and random.random() < 0.1:
+                # El último préstamo de algunos elementos sigue abierto
+                filas.append({'usuario_id': 1, 'elemento_id': elemento_id, 'persona_id': 1,
+                              'fecha_prestamo': fecha, 'estado': 'activo'})
+                continue
+            filas.append({'usuario_id': 1, 'elemento_id': elemento_id, 'persona_id': 1, 'fecha_prestamo': fecha,
+                          'fecha_devolucion': min(regreso, siguiente or ahora), 'estado': 'devuelto'})
+        if len(filas) >= 20_000:
+            db.session.execute(sa.insert(Prestamo), filas)
+            filas = []
+    if filas:
+        db.session.execute(sa.insert(Prestamo), filas)
+    db.session.execute(
+        sa.update(ElementoAudiovisual)
+        .where(ElementoAudiovisual.id.in_(sa.select(Prestamo.elemento_id).where(Prestamo.estado == 'activo')))
+        .values(disponible=False)
+    )
+    db.session.commit()
+
+
+def afuera_en_prestamo(momento):
+    """La misma pregunta sobre `prestamo`: el OR de abiertos y devueltos impide un único rango"""
+    return db.session.scalars(
+        sa.select(Prestamo.elemento_id).distinct().where(
+            Prestamo.fecha_prestamo <= momento,
+            sa.or_(Prestamo.estado.in_(ESTADOS_ACTIVOS), Prestamo.fecha_devolucion > momento),
+        )
+    ).all()
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, sorted(tiempos)[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--prestamos', type=int, default=500_000)
+    parser.add_argument('--elementos', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--corruptos', type=int, default=25, help='elementos con `disponible` invertido')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+        preparar(args.elementos, args.prestamos)
+        inicio = time.perf_counter()
+        eventos.desde_prestamos(db.session)
+        intervalos = eventos.reconstruir(db.session)
+        db.session.commit()
+        with db.engine.begin() as conexion:
+            conexion.execute(sa.text('ANALYZE'))
+        print(f"Registro e intervalos ({intervalos}) en {time.perf_counter() - inicio:.1f} s\n")
+
+        ahora = datetime.utcnow()
+        print(f"{'consulta':<28} {'filas':>7} {'intervalos ms':>14} {'prestamo ms':>12}")
+        for nombre, dias in [('afuera hoy', 0), ('afuera hace 30 días', 30), ('afuera hace 365 días', 365)]:
+            momento = ahora - timedelta(days=dias)
+            ids, intervalos_ms = medir(lambda: eventos.afuera_en(momento), args.repeticiones)
+            ids_prestamo, prestamo_ms = medir(lambda: afuera_en_prestamo(momento), args.repeticiones)
+            marca = '' if sorted(ids) == sorted(ids_prestamo) else '  ¡distintos!'
+            print(f"{nombre:<28} {len(ids):>7} {intervalos_ms:>14.1f} {prestamo_ms:>12.1f}{marca}")
+        for dias in (7, 30, 365):
+            filas, intervalos_ms = medir(lambda: eventos.uso(ahora - timedelta(days=dias), ahora), args.repeticiones)
+            print(f"{f'uso últimos {dias} días':<28} {len(filas):>7} {intervalos_ms:>14.1f} {'-':>12}")
+
+        corruptos = random.sample(range(1, args.elementos + 1), args.corruptos)
+        db.session.execute(sa.update(ElementoAudiovisual).where(ElementoAudiovisual.id.in_(corruptos))
+                           .values(disponible=sa.not_(ElementoAudiovisual.disponible)))
+        db.session.commit()
+        inicio = time.perf_counter()
+        corregidos = eventos.conciliar()
+        print(f"\nconciliar: {corregidos} elementos corregidos de {args.corruptos} alterados "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return 0 if corregidos == args.corruptos else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""Consultas SQL por petición en las páginas más usadas, con y sin caché de identidad.
+
+Inicia sesión como administrador y recorre las páginas frecuentes contando las
+sentencias que llegan a la base de datos en cada petición: primero cargando
+el usuario en cada petición (`IDENTIDAD_TTL=0`) y luego reutilizando la
+identidad en caché. Las peticiones se hacen seguidas, dentro del TTL de la
+identidad (`aplicacion.ttl_identidad`: IDENTIDAD_TTL, o como máximo
+IDENTIDAD_TTL_MEMORIA con el backend en memoria); pasado ese tiempo, la
+siguiente petición vuelve a consultar `usuario`.
+
+Uso:
+    python benchmarks/bench_identidad.py [--repeticiones 200]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_identidad.db')
+
+import sqlalchemy as sa
+
+from prestamos import config, db_init
+from prestamos.aplicacion import create_app, ttl_identidad
+from prestamos.database import db
+from prestamos.migraciones import tabla_versiones
+
+PAGINAS = ['/', '/elementos', '/prestamos', '/personas', '/api/elementos?q=cam']
+
+
+def preparar(app):
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+    db_init.init_db()
+    db_init.add_sample_data()
+
+
+def medir(app, cliente, repeticiones):
+    """Devuelve {pagina: (consultas por petición, ms por petición)}"""
+    consultas = [0]
+
+    def contar(*args):
+        consultas[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, 'before_cursor_execute', contar)
+    resultados = {}
+    try:
+        for pagina in PAGINAS:
+            cliente.get(pagina)  # calienta cachés y plantillas
+            consultas[0] = 0
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                respuesta = cliente.get(pagina)
+                assert respuesta.status_code == 200, (pagina, respuesta.status_code)
+            duracion = time.perf_counter() - inicio
+            resultados[pagina] = (consultas[0] / repeticiones, duracion / repeticiones * 1000)
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', contar)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app({'WTF_CSRF_ENABLED': False})
+    preparar(app)
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'email': 'admin@prestamos.com', 'password': 'admin123'})
+    assert respuesta.status_code == 302, 'no se pudo iniciar sesión'
+
+    ttl = config.IDENTIDAD_TTL or 60
+    config.IDENTIDAD_TTL = 0
+    sin_cache = medir(app, cliente, args.repeticiones)
+    config.IDENTIDAD_TTL = ttl
+    con_cache = medir(app, cliente, args.repeticiones)
+
+    print(f"caché {config.CACHE_BACKEND}: identidad reutilizada durante {ttl_identidad()} s\n")
+    print(f"{'página':<24} {'consultas/petición':>22} {'ms/petición':>20}")
+    print(f"{'':<24} {'sin caché':>11}{'con caché':>11} {'sin caché':>10}{'con caché':>10}")
+    for pagina in PAGINAS:
+        (c0, t0), (c1, t1) = sin_cache[pagina], con_cache[pagina]
+        print(f"{pagina:<24} {c0:>11.2f}{c1:>11.2f} {t0:>10.2f}{t1:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
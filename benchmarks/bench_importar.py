@@ -0,0 +1,79 @@
+"""Rendimiento del importador masivo de personas y elementos (filas por segundo).
+
+Genera archivos CSV sintéticos en memoria y los importa con
+`prestamos.importar` sobre una base de datos recién creada.
+
+Uso:
+    python benchmarks/bench_importar.py [--personas 50000] [--elementos 10000]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import csv
+import io
+import os
+import tempfile
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_importar.db')
+
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.importar import importar_personas, importar_elementos, COLUMNAS_PERSONAS, COLUMNAS_ELEMENTOS
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario
+
+
+def csv_personas(cantidad, duplicados):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS_PERSONAS)
+    for i in range(cantidad):
+        # Un porcentaje de filas repite una identificación anterior para ejercitar la deduplicación
+        numero = i - 1 if duplicados and i % duplicados == 0 and i else i
+        escritor.writerow([f'Nombre{i}', f'Apellido{i}', str(20_000_000 + numero),
+                           f'persona{i}@ejemplo.com', '3000000000', 'estudiante'])
+    salida.seek(0)
+    return salida
+
+
+def csv_elementos(cantidad):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS_ELEMENTOS)
+    for i in range(cantidad):
+        escritor.writerow([f'IMP{i:07d}', 'Cable XLR', 'audio', 'Cable balanceado de 5 m'])
+    salida.seek(0)
+    return salida
+
+
+def informe(nombre, resultado):
+    print(f"{nombre:<10} {resultado.leidas:>8} leídas {resultado.insertadas:>8} insertadas "
+          f"{len(resultado.errores):>6} errores {resultado.segundos:7.2f} s "
+          f"{resultado.filas_por_segundo:>10.0f} filas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--personas', type=int, default=50_000)
+    parser.add_argument('--elementos', type=int, default=10_000)
+    parser.add_argument('--duplicados', type=int, default=100, help='una fila duplicada cada N (0 = ninguna)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+        db.create_all()
+        aplicar_migraciones(db.engine, verbose=False)
+        db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+        db.session.commit()
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+
+        informe('personas', importar_personas(csv_personas(args.personas, args.duplicados)))
+        informe('elementos', importar_elementos(csv_elementos(args.elementos), usuario_id=1))
+
+
+if __name__ == '__main__':
+    main()
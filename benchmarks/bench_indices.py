@@ -0,0 +1,124 @@
+"""Planes de consulta antes y después de aplicar los índices de la migración 1.
+
+Crea una base de datos de prueba sin índices secundarios, la llena con datos
+sintéticos, muestra el plan y el tiempo de las consultas frecuentes de
+`run.py`, aplica las migraciones y repite la medición.
+
+Uso:
+    python benchmarks/bench_indices.py [--prestamos 200000]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_indices.db')
+
+import sqlalchemy as sa
+
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo
+
+CONSULTAS = {
+    'mis_prestamos': ("SELECT * FROM prestamo WHERE usuario_id = :usuario ORDER BY fecha_prestamo DESC LIMIT 50", {'usuario': 2}),
+    'listado (keyset)': ("SELECT * FROM prestamo WHERE fecha_prestamo < :fecha ORDER BY fecha_prestamo DESC, id DESC LIMIT 50", {'fecha': datetime(2024, 6, 1)}),
+    'eliminar_elemento': ("SELECT count(*) FROM prestamo WHERE elemento_id = :elemento", {'elemento': 17}),
+    'eliminar_persona': ("SELECT count(*) FROM prestamo WHERE persona_id = :persona", {'persona': 17}),
+    'préstamos activos': ("SELECT * FROM prestamo WHERE estado IN ('pendiente', 'activo') AND elemento_id = :elemento", {'elemento': 17}),
+    'elementos disponibles': ("SELECT * FROM elementos_audiovisuales WHERE disponible = true AND tipo = :tipo", {'tipo': 'audio'}),
+    'validate_email': ("SELECT * FROM persona WHERE email = :email LIMIT 1", {'email': 'persona500@ejemplo.com'}),
+}
+
+
+def poblar(num_prestamos, num_personas, num_elementos):
+    ahora = datetime(2025, 1, 1)
+    tipos = ['camara', 'microfono', 'tripode', 'iluminacion', 'audio', 'otro']
+    db.session.execute(sa.insert(Usuario), [
+        {'id': i, 'nombre': f'Usuario {i}', 'email': f'usuario{i}@ejemplo.com', 'es_admin': i == 1}
+        for i in range(1, 11)
+    ])
+    db.session.execute(sa.insert(Persona), [
+        {'id': i, 'nombre': f'Nombre{i}', 'apellido': f'Apellido{i}', 'identificacion': str(10_000_000 + i),
+         'email': f'persona{i}@ejemplo.com', 'rol': 'estudiante'}
+        for i in range(1, num_personas + 1)
+    ])
+    db.session.execute(sa.insert(ElementoAudiovisual), [
+        {'id': i, 'placa': f'PLA{i:06d}', 'nombre': f'Elemento {i}', 'tipo': tipos[i % len(tipos)],
+         'disponible': i % 3 != 0, 'slug': f'elemento-{i}', 'user_id': 1}
+        for i in range(1, num_elementos + 1)
+    ])
+    lote = []
+    for i in range(1, num_prestamos + 1):
+        lote.append({
+            'usuario_id': random.randint(1, 10),
+            'elemento_id': random.randint(1, num_elementos),
+            'persona_id': random.randint(1, num_personas),
+            'fecha_prestamo': ahora - timedelta(minutes=i),
+            'estado': 'activo' if i % 50 == 0 else 'devuelto',
+        })
+        if len(lote) == 10_000:
+            db.session.execute(sa.insert(Prestamo), lote)
+            lote = []
+    if lote:
+        db.session.execute(sa.insert(Prestamo), lote)
+    db.session.commit()
+
+
+def plan(conexion, sql, params):
+    if conexion.dialect.name == 'postgresql':
+        filas = conexion.execute(sa.text('EXPLAIN ' + sql), params)
+        return [fila[0] for fila in filas]
+    filas = conexion.execute(sa.text('EXPLAIN QUERY PLAN ' + sql), params)
+    return [fila[-1] for fila in filas]
+
+
+def medir(titulo, repeticiones):
+    print(f"\n=== {titulo} ===")
+    with db.engine.connect() as conexion:
+        for nombre, (sql, params) in CONSULTAS.items():
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                conexion.execute(sa.text(sql), params).fetchall()
+            ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+            print(f"{nombre:<24} {ms:9.3f} ms")
+            for linea in plan(conexion, sql, params):
+                print(f"    {linea}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--prestamos', type=int, default=200_000)
+    parser.add_argument('--personas', type=int, default=20_000)
+    parser.add_argument('--elementos', type=int, default=2_000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+        db.create_all()
+        # Simula una base de datos anterior a la migración 1
+        for tabla in db.metadata.tables.values():
+            for indice in tabla.indexes:
+                indice.drop(db.engine, checkfirst=True)
+        print(f"Poblando {args.prestamos} préstamos en {db.engine.url.render_as_string()}...")
+        poblar(args.prestamos, args.personas, args.elementos)
+
+        medir('Sin índices', args.repeticiones)
+        aplicar_migraciones(db.engine)
+        with db.engine.begin() as conexion:
+            conexion.execute(sa.text('ANALYZE'))
+        medir('Con índices', args.repeticiones)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Rendimiento del inicio de sesión bajo concurrencia ("tormenta de logins").
+
+Varios hilos inician sesión a la vez mientras otro hilo pide una página liviana
+(`/elementos`). Se informa cuántos logins por segundo se atienden y la
+latencia de ambos tipos de petición, para comparar métodos de hash y tamaños
+del pool de hashing.
+
+Uso:
+    python benchmarks/bench_login.py [--hilos 16] [--logins 10] [--metodo scrypt:32768:8:1] [--pool 4]
+
+`--pool 0` calcula los hashes en el hilo de cada petición (sin pool).
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=16, help='hilos iniciando sesión a la vez')
+    parser.add_argument('--logins', type=int, default=10, help='logins por hilo')
+    parser.add_argument('--metodo', default=None, help='PASSWORD_HASH_METODO (por defecto, el configurado)')
+    parser.add_argument('--pool', type=int, default=None, help='PASSWORD_HASH_HILOS (por defecto, el configurado)')
+    return parser.parse_args()
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))] * 1000
+
+
+def main():
+    args = argumentos()
+    # La política de hash se lee al importar prestamos.config
+    if args.metodo:
+        os.environ['PASSWORD_HASH_METODO'] = args.metodo
+    if args.pool is not None:
+        os.environ['PASSWORD_HASH_HILOS'] = str(args.pool)
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+
+    from prestamos import config, db_init
+    from prestamos.aplicacion import create_app
+    from prestamos.database import db
+    from prestamos.migraciones import tabla_versiones
+
+    app = create_app({'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+    db_init.init_db()
+    db_init.add_sample_data()
+
+    print(f"Método: {config.PASSWORD_HASH_METODO}, pool de hashing: {config.PASSWORD_HASH_HILOS or 'sin pool'}, "
+          f"{os.cpu_count()} CPU")
+
+    latencias_login, latencias_pagina, fallos = [], [], []
+    terminado = threading.Event()
+    barrera = threading.Barrier(args.hilos + 1)
+
+    def iniciar_sesiones():
+        cliente = app.test_client()
+        barrera.wait()
+        for _ in range(args.logins):
+            inicio = time.perf_counter()
+            respuesta = cliente.post('/login', data={'email': 'admin@prestamos.com', 'password': 'admin123'})
+            latencias_login.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 302:
+                fallos.append(respuesta.status_code)
+            cliente.get('/logout')
+
+    def navegar():
+        cliente = app.test_client()
+        cliente.post('/login', data={'email': 'admin@prestamos.com', 'password': 'admin123'})
+        barrera.wait()
+        while not terminado.is_set():
+            inicio = time.perf_counter()
+            cliente.get('/elementos')
+            latencias_pagina.append(time.perf_counter() - inicio)
+
+    lector = threading.Thread(target=navegar)
+    lector.start()
+    hilos = [threading.Thread(target=iniciar_sesiones) for _ in range(args.hilos)]
+    for hilo in hilos:
+        hilo.start()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    lector.join()
+
+    total = len(latencias_login)
+    print(f"{total} logins en {duracion:.2f} s: {total / duracion:.1f} logins/s, {len(fallos)} fallidos")
+    for nombre, valores in (('login', latencias_login), ('/elementos', latencias_pagina)):
+        print(f"  {nombre:<11} p50 {percentil(valores, 50):8.1f} ms  p95 {percentil(valores, 95):8.1f} ms  "
+              f"p99 {percentil(valores, 99):8.1f} ms  media {statistics.mean(valores) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
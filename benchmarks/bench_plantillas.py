@@ -0,0 +1,151 @@
+"""Render del listado de préstamos con y sin caché de fragmentos, y compilación de plantillas.
+
+Mide:
+
+- el render de `prestamos/lista.html` con N filas (por defecto 1.000): sin
+  caché de fragmentos (FRAGMENTOS_MAX=0), la primera vez con la caché vacía
+  y con la caché caliente, y verifica que el HTML sea el mismo. Solo se mide
+  el render: la página de préstamos se consulta una vez antes;
+- después de devolver un préstamo, el render siguiente: solo esa fila cambia
+  de clave y se vuelve a renderizar;
+- la compilación de todas las plantillas en un entorno nuevo (lo que paga
+  cada worker al arrancar) sin caché de bytecode y leyéndolas de la caché.
+
+Uso:
+    python benchmarks/bench_plantillas.py [--filas 1000] [--repeticiones 20]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_plantillas.db')
+
+import sqlalchemy as sa
+from flask import render_template
+from flask_login import login_user
+
+from prestamos.aplicacion import create_app
+from prestamos.database import db
+from prestamos.db_init import add_sample_data
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import ElementoAudiovisual, Persona, Prestamo, Usuario
+from prestamos.services import PrestamoService
+
+ESTADOS = ('pendiente', 'activo', 'devuelto', 'cancelado')
+
+
+def preparar(app, filas):
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}\n")
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+        db.create_all()
+        aplicar_migraciones(db.engine, verbose=False)
+    add_sample_data()
+    with app.app_context():
+        usuarios = [u.id for u in Usuario.query]
+        db.session.execute(sa.insert(Persona), [
+            {'nombre': f'Nombre{i}', 'apellido': f'Apellido{i}', 'identificacion': str(30_000_000 + i),
+             'email': f'persona{i}@ejemplo.com', 'rol': random.choice(('estudiante', 'docente', 'administrativo'))}
+            for i in range(max(filas // 5, 1))
+        ])
+        db.session.execute(sa.insert(ElementoAudiovisual), [
+            {'placa': f'PLA{i:05d}', 'nombre': f'Elemento {i}', 'tipo': 'camara', 'disponible': True,
+             'slug': f'elemento-{i}-pla{i:05d}', 'user_id': usuarios[0]}
+            for i in range(filas)
+        ])
+        personas = [p.id for p in Persona.query]
+        elementos = db.session.scalars(sa.select(ElementoAudiovisual.id).where(ElementoAudiovisual.placa.like('PLA%')))
+        ahora = datetime.utcnow()
+        filas_prestamo = []
+        for i, elemento_id in enumerate(elementos):
+            estado = random.choice(ESTADOS)
+            fecha = ahora - timedelta(hours=i * 3)
+            filas_prestamo.append({
+                'usuario_id': usuarios[i % len(usuarios)], 'elemento_id': elemento_id,
+                'persona_id': personas[i % len(personas)], 'fecha_prestamo': fecha,
+                'fecha_vencimiento': fecha + timedelta(days=7), 'estado': estado,
+                'fecha_devolucion': fecha + timedelta(days=2) if estado == 'devuelto' else None,
+            })
+        db.session.execute(sa.insert(Prestamo), filas_prestamo)
+        db.session.commit()
+        return db.session.scalar(sa.select(Usuario.id).where(Usuario.es_admin.is_(True)))
+
+
+def medir_render(app, usuario_id, filas, repeticiones, devolver=False):
+    """(primer render, mediana de los siguientes, render después de devolver un préstamo) en ms, y el html"""
+    with app.test_request_context('/prestamos/lista'):
+        login_user(db.session.get(Usuario, usuario_id))
+        pagina = Prestamo.listar_pagina(limite=filas)
+
+        def renderizar():
+            inicio = time.perf_counter()
+            html = render_template('prestamos/lista.html', prestamos=pagina)
+            return (time.perf_counter() - inicio) * 1000, html
+
+        primero, _ = renderizar()
+        mediciones = [renderizar() for _ in range(repeticiones)]
+        # El HTML que se compara es el de la última vuelta (con la caché caliente, si la hay)
+        tiempos, html = [tiempo for tiempo, _ in mediciones], mediciones[-1][1]
+        tras_cambio = None
+        if devolver:
+            abierto = next(prestamo.id for prestamo in pagina if prestamo.estado in ('pendiente', 'activo'))
+            PrestamoService().devolver(abierto)
+            # El commit expira los objetos cargados: se vuelve a consultar la página antes de medir
+            pagina = Prestamo.listar_pagina(limite=filas)
+            tras_cambio, _ = renderizar()
+        return primero, statistics.median(tiempos), tras_cambio, html
+
+
+def medir_compilacion(carpeta, repeticiones):
+    """Mediana en ms de cargar todas las plantillas en un entorno nuevo"""
+    tiempos = []
+    for _ in range(repeticiones):
+        entorno = create_app({'PLANTILLAS_CACHE': carpeta}).jinja_env
+        inicio = time.perf_counter()
+        for nombre in entorno.list_templates():
+            entorno.get_template(nombre)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=1000, help='préstamos en la tabla')
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    usuario_id = preparar(create_app(), args.filas)
+
+    _, sin_cache, _, html_sin = medir_render(create_app({'FRAGMENTOS_MAX': 0}), usuario_id,
+                                             args.filas, args.repeticiones)
+    fria, caliente, tras_cambio, html_con = medir_render(create_app({'FRAGMENTOS_MAX': args.filas * 2}), usuario_id,
+                                                         args.filas, args.repeticiones, devolver=True)
+    iguales = html_sin == html_con
+    print(f"render de prestamos/lista.html con {args.filas} filas (mediana de {args.repeticiones}):")
+    print(f"  sin caché de fragmentos        {sin_cache:>8.1f} ms")
+    print(f"  caché vacía (primer render)    {fria:>8.1f} ms")
+    print(f"  caché caliente                 {caliente:>8.1f} ms  ({sin_cache / caliente:.1f}x, objetivo 5x)")
+    print(f"  después de devolver 1 préstamo {tras_cambio:>8.1f} ms")
+    print(f"  HTML idéntico con y sin caché: {'sí' if iguales else 'NO'}\n")
+
+    carpeta = tempfile.mkdtemp()
+    sin_bytecode = medir_compilacion('off', args.repeticiones)
+    medir_compilacion(carpeta, 1)  # llena la caché de bytecode
+    con_bytecode = medir_compilacion(carpeta, args.repeticiones)
+    print(f"compilación de las plantillas en un entorno nuevo (mediana de {args.repeticiones}):")
+    print(f"  sin caché de bytecode          {sin_bytecode:>8.1f} ms")
+    print(f"  desde la caché de bytecode     {con_bytecode:>8.1f} ms  ({len(os.listdir(carpeta))} archivos)")
+    return 0 if iguales else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
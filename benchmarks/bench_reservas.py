@@ -0,0 +1,171 @@
+"""Búsqueda de elementos libres y comprobación de choques sobre muchas reservas.
+
+Llena la base con elementos de varios tipos y un historial de reservas sin
+solapamientos por elemento (casi todas ya terminadas, algunas futuras), más
+préstamos abiertos en una parte de los elementos, y mide:
+
+- `reservas.libres` para rangos de un día y de una semana (todas las
+  cámaras libres, primera página), frente a cargar las reservas del tipo y
+  filtrar en Python;
+- `PrestamoService.reservar` sobre rangos libres y ocupados (choques por
+  segundo, incluido el rechazo).
+
+Uso:
+    python benchmarks/bench_reservas.py [--reservas 500000] [--elementos 20000] [--repeticiones 5]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_reservas.db')
+
+import sqlalchemy as sa
+
+from prestamos import reservas
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo, Reserva, TIPOS_ELEMENTO
+from prestamos.services import PrestamoService, ElementoReservado, vencimiento
+
+TIPOS = [tipo for tipo, _ in TIPOS_ELEMENTO]
+
+
+def preparar(num_elementos, num_reservas):
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.add_all([Persona(id=i, nombre='Nombre', apellido=f'Apellido {i}', identificacion=f'{10000000 + i}',
+                                rol='estudiante') for i in range(1, 101)])
+    db.session.execute(sa.insert(ElementoAudiovisual), [
+        {'id': i, 'placa': f'PLA{i:06d}', 'nombre': f'Elemento {i}', 'tipo': TIPOS[i % len(TIPOS)],
+         'disponible': True, 'slug': f'elemento-{i}', 'user_id': 1}
+        for i in range(1, num_elementos + 1)
+    ])
+    ahora = datetime.utcnow()
+    inicio = ahora - timedelta(days=3 * 365)
+    # Tres años hacia atrás y dos meses hacia adelante: ~5 % de las reservas siguen vigentes
+    ventana = int((ahora + timedelta(days=60) - inicio).total_seconds())
+    filas = []
+    for elemento_id in range(1, num_elementos + 1):
+        salidas = sorted(inicio + timedelta(seconds=random.randrange(ventana))
+                         for _ in range(num_reservas // num_elementos))
+        for desde, siguiente in zip(salidas, salidas[1:] + [None]):
+            hasta = desde + timedelta(hours=random.randint(2, 72))
+            if siguiente is not None:
+                hasta = min(hasta, siguiente)
+            filas.append({'elemento_id': elemento_id, 'persona_id': random.randint(1, 100), 'usuario_id': 1,
+                          'desde': desde, 'hasta': hasta,
+                          'estado': 'cancelada' if random.random() < 0.05 else 'activa', 'creada_en': desde})
+        if len(filas) >= 20_000:
+            db.session.execute(sa.insert(Reserva), filas)
+            filas = []
+    if filas:
+        db.session.execute(sa.insert(Reserva), filas)
+    # Préstamos abiertos en el 10 % de los elementos
+    prestados = random.sample(range(1, num_elementos + 1), num_elementos // 10)
+    db.session.execute(sa.insert(Prestamo), [
+        {'usuario_id': 1, 'elemento_id': elemento_id, 'persona_id': 1, 'fecha_prestamo': ahora - timedelta(days=2),
+         'fecha_vencimiento': vencimiento(ahora - timedelta(days=2)), 'estado': 'activo'}
+        for elemento_id in prestados
+    ])
+    db.session.execute(sa.update(ElementoAudiovisual).where(ElementoAudiovisual.id.in_(prestados))
+                       .values(disponible=False))
+    db.session.commit()
+    with db.engine.begin() as conexion:
+        conexion.execute(sa.text('ANALYZE'))
+
+
+def libres_en_python(desde, hasta, tipo):
+    """La misma pregunta cargando las reservas y préstamos del tipo y filtrando en Python"""
+    ocupados = set()
+    for reserva in db.session.scalars(
+            sa.select(Reserva).join(ElementoAudiovisual).where(ElementoAudiovisual.tipo == tipo)):
+        if reserva.estado == 'activa' and reserva.hasta > desde and reserva.desde < hasta:
+            ocupados.add(reserva.elemento_id)
+    for prestamo in db.session.scalars(
+            sa.select(Prestamo).join(ElementoAudiovisual).where(ElementoAudiovisual.tipo == tipo)):
+        if prestamo.estado in ('pendiente', 'activo') and prestamo.fecha_vencimiento > desde:
+            ocupados.add(prestamo.elemento_id)
+    return [e for e in db.session.scalars(sa.select(ElementoAudiovisual).where(ElementoAudiovisual.tipo == tipo)
+                                          .order_by(ElementoAudiovisual.nombre, ElementoAudiovisual.id))
+            if e.id not in ocupados]
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, sorted(tiempos)[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=500_000)
+    parser.add_argument('--elementos', type=int, default=20_000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--intentos', type=int, default=500, help='reservas nuevas a intentar')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+        inicio = time.perf_counter()
+        preparar(args.elementos, args.reservas)
+        print(f"{args.reservas} reservas en {args.elementos} elementos ({time.perf_counter() - inicio:.1f} s)\n")
+
+        manana = datetime.utcnow().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        print(f"{'consulta':<32} {'libres':>7} {'SQL ms':>9} {'Python ms':>10}")
+        for nombre, desde, hasta in [('un día (mañana)', manana, manana + timedelta(hours=10)),
+                                     ('una semana (en 10 días)', manana + timedelta(days=10),
+                                      manana + timedelta(days=17))]:
+            todos, sql_ms = medir(lambda: reservas.libres(desde, hasta, tipo='camara', limite=None),
+                                  args.repeticiones)
+            en_python, python_ms = medir(lambda: libres_en_python(desde, hasta, 'camara'), args.repeticiones)
+            marca = '' if [e.id for e in todos] == [e.id for e in en_python] else '  ¡distintos!'
+            print(f"{'cámaras, ' + nombre:<32} {len(todos):>7} {sql_ms:>9.1f} {python_ms:>10.1f}{marca}")
+            _, pagina_ms = medir(lambda: reservas.libres(desde, hasta, tipo='camara'), args.repeticiones)
+            print(f"{'  primera página (20)':<32} {'':>7} {pagina_ms:>9.1f} {'-':>10}")
+
+        servicio = PrestamoService()
+        creadas = rechazadas = 0
+        inicio = time.perf_counter()
+        for _ in range(args.intentos):
+            desde = manana + timedelta(hours=random.randrange(60 * 24))
+            try:
+                servicio.reservar(random.randint(1, args.elementos), random.randint(1, 100), 1,
+                                  desde, desde + timedelta(hours=random.randint(2, 72)))
+                creadas += 1
+            except ElementoReservado:
+                rechazadas += 1
+        duracion = time.perf_counter() - inicio
+        print(f"\nreservar: {creadas} creadas, {rechazadas} rechazadas por choque, "
+              f"{args.intentos / duracion:.0f} por segundo")
+
+        # Ningún par de reservas activas del mismo elemento se solapa
+        otra = sa.orm.aliased(Reserva)
+        solapadas = db.session.scalar(
+            sa.select(sa.func.count()).select_from(Reserva)
+            .join(otra, sa.and_(otra.elemento_id == Reserva.elemento_id, otra.id > Reserva.id))
+            .where(Reserva.estado == 'activa', otra.estado == 'activa',
+                   Reserva.hasta > manana, otra.hasta > manana,
+                   otra.desde < Reserva.hasta, otra.hasta > Reserva.desde)
+        )
+        print(f"reservas vigentes solapadas: {solapadas}")
+        return 0 if solapadas == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
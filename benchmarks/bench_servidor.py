@@ -0,0 +1,158 @@
+"""Peticiones por segundo y latencia de la app bajo distintos servidores.
+
+Levanta la aplicación en un puerto libre con cada servidor y lanza contra
+ella los usuarios virtuales de escenarios.py:
+
+    werkzeug   app.run(threaded=True), el servidor de `python run.py` (sin debug)
+    gunicorn   gunicorn.conf.py + prestamos.wsgi (workers gthread)
+    uvicorn    prestamos.asgi (a2wsgi sobre un pool de hilos)
+
+Con `--recorrido lectura` cada usuario solo recorre las páginas de lectura
+(catálogo, detalle de un elemento y autocompletado); con `mixto` hace el
+recorrido completo de escenarios.py, con préstamos y devoluciones.
+
+Uso:
+    python benchmarks/generar_datos.py
+    python benchmarks/bench_servidor.py [--servidores werkzeug,gunicorn,uvicorn] [--procesos 4] [--hilos 8]
+                                        [--usuarios 32] [--iteraciones 20] [--recorrido lectura|mixto]
+
+Usa la base de datos de generar_datos.py (`DATABASE_URL`, por defecto
+`<tmp>/prestamos_carga.db`). Los servidores que no estén instalados se
+omiten. Con SQLite y varios procesos las escrituras del recorrido mixto
+compiten por el bloqueo del archivo; para comparar servidores en serio
+conviene PostgreSQL.
+"""
+import argparse
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import escenarios
+from escenarios import ClienteHTTP, UsuarioVirtual, datos_de_prueba, imprimir, resumir
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _werkzeug(puerto, args):
+    return [sys.executable, '-c', f"from prestamos.wsgi import app; app.run('127.0.0.1', {puerto}, threaded=True)"]
+
+
+def _gunicorn(puerto, args):
+    return [sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ, 'gunicorn.conf.py'),
+            '--bind', f'127.0.0.1:{puerto}', '--workers', str(args.procesos), '--threads', str(args.hilos),
+            'prestamos.wsgi:app']
+
+
+def _uvicorn(puerto, args):
+    return [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(puerto),
+            '--workers', str(args.procesos), '--no-access-log', '--log-level', 'warning', 'prestamos.asgi:app']
+
+
+SERVIDORES = {
+    'werkzeug': (_werkzeug, None),
+    'gunicorn': (_gunicorn, 'gunicorn'),
+    'uvicorn': (_uvicorn, 'uvicorn'),
+}
+
+
+class LectorVirtual(UsuarioVirtual):
+    """Usuario virtual que solo recorre páginas de lectura"""
+
+    def _recorrido(self):
+        datos, azar = self.datos, self.azar
+        self._paso('catalogo_tipo', 'GET', '/elementos?' + urlencode({'tipo': azar.choice(datos['tipos'])}))
+        self._paso('ver_elemento', 'GET', f"/elemento/{azar.choice(datos['slugs'])}/")
+        self._paso('api_elementos', 'GET', '/api/elementos?' + urlencode({'q': azar.choice(datos['nombres'])}))
+        self._paso('api_personas', 'GET', '/api/personas?' + urlencode({'q': azar.choice(datos['apellidos'])}))
+
+
+def _puerto_libre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _esperar(puerto, proceso, espera=60):
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"el servidor terminó con código {proceso.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("el servidor no respondió a tiempo")
+
+
+def medir(nombre, args, datos):
+    fabricar = SERVIDORES[nombre][0]
+    puerto = _puerto_libre()
+    entorno = dict(os.environ, WEB_HILOS=str(args.hilos),
+                   PYTHONPATH=os.pathsep.join([os.path.join(RAIZ, 'src'), os.environ.get('PYTHONPATH', '')]))
+    proceso = subprocess.Popen(fabricar(puerto, args), env=entorno, cwd=RAIZ,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _esperar(puerto, proceso)
+        clase = LectorVirtual if args.recorrido == 'lectura' else UsuarioVirtual
+        usuarios = [clase(i, ClienteHTTP(f'http://127.0.0.1:{puerto}'), datos, args.iteraciones, args.semilla)
+                    for i in range(1, args.usuarios + 1)]
+        inicio = time.perf_counter()
+        for usuario in usuarios:
+            usuario.start()
+        for usuario in usuarios:
+            usuario.join()
+        return resumir(usuarios, time.perf_counter() - inicio)
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servidores', default=','.join(SERVIDORES))
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hilos', type=int, default=8, help='hilos por proceso (gunicorn y uvicorn)')
+    parser.add_argument('--usuarios', type=int, default=32, help='usuarios virtuales concurrentes')
+    parser.add_argument('--iteraciones', type=int, default=20)
+    parser.add_argument('--recorrido', choices=['lectura', 'mixto'], default='lectura')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--detalle', action='store_true', help='muestra también cada paso')
+    args = parser.parse_args()
+
+    datos = datos_de_prueba()
+    if args.usuarios > datos['usuarios']:
+        parser.error(f"hay {datos['usuarios']} usuarios de carga; genere más con --usuarios-carga")
+    with escenarios.app.app_context():
+        datos['slugs'] = escenarios.db.session.scalars(
+            escenarios.sa.select(escenarios.ElementoAudiovisual.slug).limit(500)).all()
+    print(f"Base de datos: {datos['base_de_datos']} ({datos['filas']['elementos']} elementos)")
+    print(f"{args.usuarios} usuarios, recorrido {args.recorrido}, {args.procesos} procesos × {args.hilos} hilos\n")
+
+    resultados = {}
+    for nombre in args.servidores.split(','):
+        modulo = SERVIDORES[nombre][1]
+        if modulo and importlib.util.find_spec(modulo) is None:
+            print(f"{nombre}: no instalado, se omite")
+            continue
+        resultados[nombre] = medir(nombre, args, datos)
+        if args.detalle:
+            print(f"\n{nombre}")
+            imprimir(resultados[nombre])
+
+    print(f"\n{'servidor':<10} {'n':>7} {'errores':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for nombre, pasos in resultados.items():
+        r = pasos['total']
+        print(f"{nombre:<10} {r['n']:>7} {r['errores']:>7} {r['rps']:>8.1f} "
+              f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""Costo de asignar slugs únicos al crear muchos elementos con el mismo nombre.
+
+Crea `--elementos` elementos "Cable XLR" con `ElementoAudiovisual.save()` y
+cuenta las consultas por elemento. Luego repite el caso extremo en que todos
+comparten la misma base de slug (`cable-xlr`, `cable-xlr-1`, ...) con el
+asignador actual (contador por base en `slug_contadores`) y con el sondeo
+secuencial anterior (una consulta por candidato), y por último con `--hilos`
+hilos compitiendo por la misma base.
+
+Uso:
+    python benchmarks/bench_slugs.py [--elementos 10000] [--sondeo 1000] [--hilos 8]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_slugs.db')
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual
+
+BASE = 'cable-xlr'
+
+
+class ContadorConsultas:
+    """Cuenta las consultas de asignación de slug (SELECT y el contador) sobre el engine"""
+
+    def __init__(self, engine):
+        self.total = 0
+        sa.event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, conexion, cursor, sentencia, parametros, contexto, executemany):
+        sentencia = sentencia.lstrip().upper()
+        if sentencia.startswith('SELECT') or sentencia.startswith('INSERT INTO SLUG_CONTADORES'):
+            self.total += 1
+
+
+def sondeo_anterior(base):
+    """Algoritmo previo: prueba base, base-1, base-2, ... con una consulta cada uno"""
+    candidato, indice = base, 1
+    while ElementoAudiovisual.query.filter_by(slug=candidato).first():
+        candidato = f"{base}-{indice}"
+        indice += 1
+    return candidato
+
+
+def preparar():
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.commit()
+
+
+def crear(cantidad, prefijo, contador, generador=None):
+    """Crea `cantidad` elementos con save(); `generador` fija cómo se elige el slug"""
+    if generador:
+        ElementoAudiovisual._generate_unique_slug = lambda self: generador(BASE)
+    antes = contador.total
+    inicio = time.perf_counter()
+    for i in range(cantidad):
+        ElementoAudiovisual(placa=f'{prefijo}{i}', nombre='Cable XLR', tipo='audio', user_id=1).save()
+    duracion = time.perf_counter() - inicio
+    return duracion, (contador.total - antes) / cantidad
+
+
+def informe(nombre, cantidad, duracion, consultas):
+    print(f"{nombre:<34} {cantidad:>7} elementos {duracion:8.2f} s "
+          f"{cantidad / duracion:>8.0f} elem/s {consultas:6.2f} consultas/elem")
+
+
+def competir(app, hilos, por_hilo):
+    """Varios hilos crean elementos con la misma base de slug a la vez"""
+    errores = []
+    bloqueos = Counter()
+    barrera = threading.Barrier(hilos)
+
+    def trabajador(numero):
+        with app.app_context():
+            barrera.wait()
+            for i in range(por_hilo):
+                while True:
+                    try:
+                        ElementoAudiovisual(placa=f'H{numero}-{i}', nombre='Cable XLR', tipo='audio', user_id=1).save()
+                        break
+                    except OperationalError as error:
+                        db.session.rollback()
+                        # SQLite admite un solo escritor: se reintenta la transacción completa
+                        if 'database is locked' not in str(error):
+                            errores.append(error)
+                            break
+                        bloqueos['reintentos'] += 1
+                    except Exception as error:
+                        db.session.rollback()
+                        errores.append(error)
+                        break
+            db.session.remove()
+
+    lista = [threading.Thread(target=trabajador, args=(n,)) for n in range(hilos)]
+    inicio = time.perf_counter()
+    for hilo in lista:
+        hilo.start()
+    for hilo in lista:
+        hilo.join()
+    return time.perf_counter() - inicio, errores, bloqueos['reintentos']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--elementos', type=int, default=10_000)
+    parser.add_argument('--sondeo', type=int, default=1_000,
+                        help='elementos para el algoritmo anterior (cuadrático)')
+    parser.add_argument('--hilos', type=int, default=8)
+    args = parser.parse_args()
+
+    app = create_app()
+    generar_original = ElementoAudiovisual._generate_unique_slug
+    with app.app_context():
+        contador = ContadorConsultas(db.engine)
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+
+        preparar()
+        informe('nombre repetido (placa distinta)', args.elementos, *crear(args.elementos, 'A', contador))
+
+        preparar()
+        informe('misma base, asignador O(1)', args.elementos,
+                *crear(args.elementos, 'B', contador, ElementoAudiovisual.slug_libre))
+
+        preparar()
+        informe('misma base, sondeo anterior', args.sondeo,
+                *crear(args.sondeo, 'C', contador, sondeo_anterior))
+
+        preparar()
+        ElementoAudiovisual._generate_unique_slug = lambda self: ElementoAudiovisual.slug_libre(BASE)
+    por_hilo = max(1, args.elementos // (10 * args.hilos))
+    duracion, errores, reintentos = competir(app, args.hilos, por_hilo)
+    ElementoAudiovisual._generate_unique_slug = generar_original
+
+    with app.app_context():
+        total = db.session.scalar(sa.select(sa.func.count(ElementoAudiovisual.id)))
+        distintos = db.session.scalar(sa.select(sa.func.count(sa.distinct(ElementoAudiovisual.slug))))
+    print(f"{args.hilos} hilos compitiendo por '{BASE}': {total} creados en {duracion:.2f} s, "
+          f"{distintos} slugs distintos, {len(errores)} errores, {reintentos} reintentos por bloqueo")
+    for error in errores[:5]:
+        print(f"  {type(error).__name__}: {error}")
+    return 1 if errores or distintos != total else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Tiempo del tablero con contadores frente a agregar la tabla `prestamo` en cada visita.
+
+Para cada tamaño de historial, llena la base con préstamos sintéticos,
+reconstruye los contadores y mide `tablero.resumen()` contra las mismas
+cifras calculadas con GROUP BY sobre `prestamo`. Al final comprueba que los
+contadores mantenidos por `PrestamoService` coinciden con un recálculo.
+
+Uso:
+    python benchmarks/bench_tablero.py [--tamanos 10000 100000 1000000] [--repeticiones 20]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_tablero.db')
+
+import sqlalchemy as sa
+
+from prestamos import tablero
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import (Usuario, ElementoAudiovisual, Persona, Prestamo, ContadorTablero,
+                              ESTADOS_ACTIVOS, ROLES_PERSONA, TIPOS_ELEMENTO)
+from prestamos.services import PrestamoService
+
+NUM_ELEMENTOS = 2000
+NUM_PERSONAS = 1000
+
+
+def preparar():
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    roles = [clave for clave, _ in ROLES_PERSONA]
+    tipos = [clave for clave, _ in TIPOS_ELEMENTO]
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.execute(sa.insert(Persona), [
+        {'id': i, 'nombre': f'Nombre{i}', 'apellido': f'Apellido{i}', 'identificacion': str(10_000_000 + i),
+         'rol': roles[i % len(roles)]}
+        for i in range(1, NUM_PERSONAS + 1)
+    ])
+    db.session.execute(sa.insert(ElementoAudiovisual), [
+        {'id': i, 'placa': f'PLA{i:06d}', 'nombre': f'Elemento {i}', 'tipo': tipos[i % len(tipos)],
+         'disponible': True, 'slug': f'elemento-{i}', 'user_id': 1}
+        for i in range(1, NUM_ELEMENTOS + 1)
+    ])
+    db.session.commit()
+
+
+def agregar_historial(cantidad):
+    """Préstamos cerrados repartidos en los últimos dos años"""
+    ahora = datetime.utcnow()
+    for inicio in range(0, cantidad, 10_000):
+        db.session.execute(sa.insert(Prestamo), [
+            {'usuario_id': 1, 'elemento_id': random.randint(1, NUM_ELEMENTOS),
+             'persona_id': random.randint(1, NUM_PERSONAS),
+             'fecha_prestamo': ahora - timedelta(minutes=random.randint(0, 2 * 365 * 24 * 60)),
+             'estado': random.choice(['devuelto', 'devuelto', 'devuelto', 'cancelado'])}
+            for _ in range(min(10_000, cantidad - inicio))
+        ])
+    db.session.commit()
+
+
+def agregado_directo():
+    """Lo que haría el tablero sin contadores: agregar todo el historial"""
+    abiertos = Prestamo.estado.in_(ESTADOS_ACTIVOS)
+    db.session.execute(sa.select(Prestamo.estado, sa.func.count()).group_by(Prestamo.estado)).all()
+    db.session.execute(sa.select(ElementoAudiovisual.tipo, sa.func.count()).select_from(Prestamo)
+                       .join(ElementoAudiovisual, ElementoAudiovisual.id == Prestamo.elemento_id)
+                       .where(abiertos).group_by(ElementoAudiovisual.tipo)).all()
+    db.session.execute(sa.select(Persona.rol, sa.func.count()).select_from(Prestamo)
+                       .join(Persona, Persona.id == Prestamo.persona_id).group_by(Persona.rol)).all()
+    dia = sa.func.date(Prestamo.fecha_prestamo)
+    db.session.execute(sa.select(dia, sa.func.count())
+                       .where(Prestamo.fecha_prestamo >= datetime.utcnow() - timedelta(days=30)).group_by(dia)).all()
+    db.session.scalar(sa.select(sa.func.count()).where(
+        abiertos, Prestamo.fecha_prestamo < datetime.utcnow() - timedelta(days=7)))
+
+
+def medir(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+        db.session.rollback()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def verificar_servicio(operaciones):
+    """Presta, devuelve y cancela al azar con el servicio y compara contra un recálculo"""
+    servicio = PrestamoService()
+    abiertos = []
+    for _ in range(operaciones):
+        if abiertos and random.random() < 0.4:
+            prestamo_id = abiertos.pop(random.randrange(len(abiertos)))
+            (servicio.devolver if random.random() < 0.7 else servicio.cancelar)(prestamo_id)
+        else:
+            elemento_id = random.randint(1, NUM_ELEMENTOS)
+            try:
+                prestamo = servicio.prestar(elemento_id, random.randint(1, NUM_PERSONAS), 1,
+                                            estado=random.choice(ESTADOS_ACTIVOS),
+                                            fecha=datetime.utcnow() - timedelta(days=random.randint(0, 20)))
+                abiertos.append(prestamo.id)
+            except Exception:
+                db.session.rollback()
+    leer = lambda: {(c.metrica, c.clave): c.valor for c in ContadorTablero.query if c.valor}
+    incremental = leer()
+    tablero.recalcular()
+    return incremental == leer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--operaciones', type=int, default=2000, help='operaciones del servicio a verificar')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+        preparar()
+        print(f"{'préstamos':>10} {'contadores (ms)':>16} {'GROUP BY (ms)':>14}")
+        total = 0
+        for tamano in sorted(args.tamanos):
+            agregar_historial(tamano - total)
+            total = tamano
+            tablero.recalcular()
+            print(f"{tamano:>10} {medir(tablero.resumen, args.repeticiones):>16.2f} "
+                  f"{medir(agregado_directo, args.repeticiones):>14.2f}")
+
+        coinciden = verificar_servicio(args.operaciones)
+        print(f"Contadores del servicio tras {args.operaciones} operaciones: "
+              f"{'coinciden' if coinciden else 'NO coinciden'} con el recálculo")
+        return 0 if coinciden else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+"""Escaneo de préstamos vencidos y envío de avisos desde la cola de trabajos.
+
+Llena la base con un historial grande (casi todo devuelto), muestra el plan de
+la consulta del escaneo, mide `escanear_vencidos()` con dos trabajadores a la
+vez (y verifica que ningún préstamo reciba dos avisos) y luego mide cuántos
+trabajos por segundo procesa `procesar()`.
+
+Uso:
+    python benchmarks/bench_vencidos.py [--prestamos 500000] [--abiertos 0.02] [--vencidos 0.5]
+
+Por defecto usa un archivo SQLite temporal y escribe los correos en memoria
+(SMTP_HOST vacío, sin límite de envío); con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_vencidos.db')
+os.environ.setdefault('SMTP_HOST', '')
+os.environ.setdefault('CORREOS_POR_MINUTO', '0')
+
+import sqlalchemy as sa
+
+from prestamos.avisos import escanear_vencidos
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo, Trabajo
+from prestamos.trabajos import procesar
+
+CONSULTA_ESCANEO = (
+    "SELECT prestamo.id FROM prestamo "
+    "WHERE estado IN ('pendiente', 'activo') AND aviso_vencido_en IS NULL AND fecha_vencimiento < :ahora "
+    "ORDER BY fecha_vencimiento, id LIMIT 500"
+)
+
+
+def poblar(num_prestamos, abiertos, vencidos, num_personas=5000, num_elementos=2000):
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.execute(sa.insert(Persona), [
+        {'id': i, 'nombre': f'Nombre{i}', 'apellido': f'Apellido{i}', 'identificacion': str(10_000_000 + i),
+         'email': f'persona{i}@ejemplo.com' if i % 10 else None, 'rol': 'estudiante'}
+        for i in range(1, num_personas + 1)
+    ])
+    db.session.execute(sa.insert(ElementoAudiovisual), [
+        {'id': i, 'placa': f'PLA{i:06d}', 'nombre': f'Elemento {i}', 'tipo': 'camara',
+         'disponible': True, 'slug': f'elemento-{i}', 'user_id': 1}
+        for i in range(1, num_elementos + 1)
+    ])
+    ahora = datetime.utcnow()
+    esperados = 0
+    for inicio in range(0, num_prestamos, 10_000):
+        lote = []
+        for _ in range(min(10_000, num_prestamos - inicio)):
+            abierto = random.random() < abiertos
+            vencido = abierto and random.random() < vencidos
+            fecha = ahora - timedelta(days=random.uniform(8, 700) if vencido else random.uniform(0, 6.9))
+            if not abierto:
+                fecha = ahora - timedelta(days=random.uniform(0, 700))
+            persona_id = random.randint(1, num_personas)
+            esperados += vencido and persona_id % 10 != 0
+            lote.append({
+                'usuario_id': 1, 'elemento_id': random.randint(1, num_elementos), 'persona_id': persona_id,
+                'fecha_prestamo': fecha, 'fecha_vencimiento': fecha + timedelta(days=7),
+                'estado': random.choice(['activo', 'pendiente']) if abierto else 'devuelto',
+            })
+        db.session.execute(sa.insert(Prestamo), lote)
+    db.session.commit()
+    with db.engine.begin() as conexion:
+        conexion.execute(sa.text('ANALYZE'))
+    return esperados
+
+
+def plan(sql, params):
+    with db.engine.connect() as conexion:
+        if conexion.dialect.name == 'postgresql':
+            return [fila[0] for fila in conexion.execute(sa.text('EXPLAIN ' + sql), params)]
+        return [fila[-1] for fila in conexion.execute(sa.text('EXPLAIN QUERY PLAN ' + sql), params)]
+
+
+def escanear_en_paralelo(app, hilos):
+    resultados = []
+
+    def trabajador():
+        with app.app_context():
+            resultados.append(escanear_vencidos())
+            db.session.remove()
+
+    inicio = time.perf_counter()
+    corriendo = [threading.Thread(target=trabajador) for _ in range(hilos)]
+    for hilo in corriendo:
+        hilo.start()
+    for hilo in corriendo:
+        hilo.join()
+    return resultados, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--prestamos', type=int, default=500_000)
+    parser.add_argument('--abiertos', type=float, default=0.02, help='fracción de préstamos abiertos')
+    parser.add_argument('--vencidos', type=float, default=0.5, help='fracción de los abiertos ya vencidos')
+    parser.add_argument('--hilos', type=int, default=2, help='trabajadores escaneando a la vez')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+        esperados = poblar(args.prestamos, args.abiertos, args.vencidos)
+        print(f"{args.prestamos} préstamos, {esperados} vencidos con email")
+        print("Plan del escaneo:")
+        for linea in plan(CONSULTA_ESCANEO, {'ahora': datetime.utcnow()}):
+            print(f"  {linea}")
+
+    resultados, segundos = escanear_en_paralelo(app, args.hilos)
+    with app.app_context():
+        avisos = Counter(trabajo.datos['prestamo_id'] for trabajo in Trabajo.query)
+        repetidos = sum(1 for veces in avisos.values() if veces > 1)
+        print(f"Escaneo con {args.hilos} trabajadores: {sum(resultados)} avisos encolados "
+              f"({' + '.join(map(str, resultados))}) en {segundos:.2f} s; repetidos: {repetidos}")
+        inicio = time.perf_counter()
+        with db.engine.connect() as conexion:
+            conexion.execute(sa.text(CONSULTA_ESCANEO), {'ahora': datetime.utcnow()}).all()
+        print(f"Escaneo sin vencidos pendientes: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        inicio = time.perf_counter()
+        procesados = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            while lote := procesar():
+                procesados += lote
+        segundos = time.perf_counter() - inicio
+        print(f"Trabajos procesados: {procesados} en {segundos:.2f} s ({procesados / segundos:.0f}/s); "
+              f"quedan {Trabajo.query.count()} en la cola")
+        ok = sum(resultados) == esperados and not repetidos
+        print('OK' if ok else 'ERROR: la cantidad de avisos no coincide con los préstamos vencidos')
+        return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
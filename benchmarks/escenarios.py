@@ -0,0 +1,347 @@
+"""Prueba de carga de los flujos de préstamo con usuarios virtuales.
+
+Cada usuario virtual (un hilo) inicia sesión con su propia cuenta
+`carga<n>@prestamos.com` y repite el recorrido:
+
+    catalogo_tipo       GET /elementos?tipo=...
+    catalogo_placa      GET /elementos?placa=...
+    buscar_prestamo     GET /prestamos/nuevo?q_persona=...&q_elemento=...
+    api_elementos       GET /api/elementos?q=...&disponibles=1
+    registrar_prestamo  POST /prestamos/nuevo
+    mis_prestamos       GET /prestamos
+    devolver            GET /devolver-prestamo/<id>
+
+Con `--modo cliente` las peticiones van por el cliente de pruebas de Flask
+(mide la aplicación sin red); con `--modo http` van por HTTP con conexiones
+persistentes, a `--url` (p. ej. gunicorn) o a un servidor werkzeug con hilos
+que se levanta en un puerto libre. Como un navegador, cada usuario virtual
+guarda las páginas con ETag y las revalida con If-None-Match. Al final imprime por paso la cantidad de
+peticiones, errores, peticiones por segundo y los percentiles p50/p95/p99.
+`--json` guarda los resultados (con el commit actual) y `--comparar` muestra
+la diferencia contra un resultado guardado, p. ej. de otro commit.
+
+Uso:
+    python benchmarks/generar_datos.py
+    python benchmarks/escenarios.py [--modo cliente|http] [--url URL] [--usuarios 8] [--iteraciones 20]
+                                    [--json salida.json] [--comparar base.json]
+
+Usa la misma base de datos que generar_datos.py (`DATABASE_URL`, por defecto
+`<tmp>/prestamos_carga.db`). Cada recorrido registra y devuelve un préstamo,
+así que la base de datos queda casi igual; para comparar con rigor conviene
+regenerarla antes de cada corrida.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'prestamos_carga.db'))
+
+import sqlalchemy as sa
+
+from prestamos.aplicacion import create_app
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Persona, Prestamo, Usuario, TIPOS_ELEMENTO
+
+app = create_app()
+
+PASSWORD_CARGA = 'carga123'
+PASOS = ['login', 'catalogo_tipo', 'catalogo_placa', 'buscar_prestamo', 'api_elementos', 'registrar_prestamo',
+         'mis_prestamos', 'devolver']
+
+_CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+_DEVOLVER = re.compile(r'/devolver-prestamo/(\d+)')
+
+
+class Navegador:
+    """Guarda el ETag y el cuerpo de cada GET y los revalida con If-None-Match, como un navegador"""
+
+    def __init__(self):
+        self._guardadas = {}
+        self.revalidadas = 0
+
+    def pedir(self, metodo, ruta, datos=None):
+        guardada = self._guardadas.get(ruta) if metodo == 'GET' else None
+        cabeceras = {'If-None-Match': guardada[0]} if guardada else {}
+        estado, cuerpo, etiqueta = self._enviar(metodo, ruta, datos, cabeceras)
+        if estado == 304 and guardada:
+            self.revalidadas += 1
+            return 200, guardada[1]
+        if metodo == 'GET' and estado == 200 and etiqueta:
+            self._guardadas[ruta] = (etiqueta, cuerpo)
+        return estado, cuerpo
+
+
+class ClienteFlask(Navegador):
+    """Peticiones a través del cliente de pruebas de Flask"""
+
+    def __init__(self):
+        super().__init__()
+        self._cliente = app.test_client()
+
+    def _enviar(self, metodo, ruta, datos, cabeceras):
+        respuesta = self._cliente.open(ruta, method=metodo, data=datos, headers=cabeceras)
+        return respuesta.status_code, respuesta.get_data(as_text=True), respuesta.headers.get('ETag')
+
+
+class ClienteHTTP(Navegador):
+    """Peticiones HTTP por una conexión persistente, sin seguir redirecciones"""
+
+    def __init__(self, url):
+        super().__init__()
+        partes = urlsplit(url)
+        self._conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=60)
+        self._prefijo = partes.path.rstrip('/')
+        self._cookies = {}
+
+    def _enviar(self, metodo, ruta, datos, cabeceras):
+        if self._cookies:
+            cabeceras['Cookie'] = '; '.join(f'{nombre}={valor}' for nombre, valor in self._cookies.items())
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urlencode(datos)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self._conexion.request(metodo, self._prefijo + ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self._conexion.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # El servidor cerró la conexión persistente: se reintenta una vez con una nueva
+            self._conexion.close()
+            self._conexion.request(metodo, self._prefijo + ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self._conexion.getresponse()
+        for cabecera in respuesta.headers.get_all('Set-Cookie') or []:
+            nombre, _, valor = cabecera.split(';', 1)[0].partition('=')
+            self._cookies[nombre.strip()] = valor
+        return respuesta.status, respuesta.read().decode('utf-8', 'replace'), respuesta.headers.get('ETag')
+
+
+class UsuarioVirtual(threading.Thread):
+    """Recorre los flujos de préstamo y guarda la latencia de cada paso"""
+
+    def __init__(self, numero, cliente, datos, iteraciones, semilla):
+        super().__init__(name=f'carga{numero}', daemon=True)
+        self.email = f'carga{numero}@prestamos.com'
+        self.cliente = cliente
+        self.datos = datos
+        self.iteraciones = iteraciones
+        self.azar = random.Random(semilla + numero)
+        self.tiempos = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.conflictos = 0
+
+    def _paso(self, paso, metodo, ruta, datos=None, esperado=200):
+        inicio = time.perf_counter()
+        try:
+            estado, cuerpo = self.cliente.pedir(metodo, ruta, datos)
+        except Exception:
+            estado, cuerpo = None, ''
+        self.tiempos[paso].append((time.perf_counter() - inicio) * 1000)
+        if estado != esperado:
+            self.errores[paso] += 1
+            return None
+        return cuerpo
+
+    def _login(self):
+        formulario = self.cliente.pedir('GET', '/login')[1]
+        token = _CSRF.search(formulario)
+        datos = {'email': self.email, 'password': PASSWORD_CARGA, 'csrf_token': token.group(1) if token else ''}
+        return self._paso('login', 'POST', '/login', datos, esperado=302) is not None
+
+    def _recorrido(self):
+        datos, azar = self.datos, self.azar
+        self._paso('catalogo_tipo', 'GET', '/elementos?' + urlencode({'tipo': azar.choice(datos['tipos'])}))
+        self._paso('catalogo_placa', 'GET', '/elementos?' + urlencode({'placa': azar.choice(datos['placas'])}))
+        formulario = self._paso('buscar_prestamo', 'GET', '/prestamos/nuevo?' + urlencode({
+            'q_persona': azar.choice(datos['apellidos']), 'q_elemento': azar.choice(datos['nombres'])}))
+        encontrados = self._paso('api_elementos', 'GET', '/api/elementos?' + urlencode({
+            'q': azar.choice(datos['nombres']), 'disponibles': 1}))
+        if formulario is None or encontrados is None:
+            return
+        resultados = json.loads(encontrados)['resultados']
+        token = _CSRF.search(formulario)
+        if resultados and token:
+            inicio = time.perf_counter()
+            estado, cuerpo = self.cliente.pedir('POST', '/prestamos/nuevo', {
+                'persona_id': azar.choice(datos['personas']), 'elemento_id': azar.choice(resultados)['id'],
+                'notas': 'Prueba de carga', 'csrf_token': token.group(1)})
+            self.tiempos['registrar_prestamo'].append((time.perf_counter() - inicio) * 1000)
+            if estado == 200 and 'no está disponible' in cuerpo:
+                # Otro usuario virtual tomó el mismo elemento: la aplicación responde bien, no es un error
+                self.conflictos += 1
+            elif estado != 302:
+                self.errores['registrar_prestamo'] += 1
+        listado = self._paso('mis_prestamos', 'GET', '/prestamos')
+        pendientes = [int(prestamo_id) for prestamo_id in _DEVOLVER.findall(listado or '')]
+        if pendientes:
+            self._paso('devolver', 'GET', f'/devolver-prestamo/{max(pendientes)}', esperado=302)
+
+    def run(self):
+        if not self._login():
+            return
+        for _ in range(self.iteraciones):
+            self._recorrido()
+
+
+def datos_de_prueba(muestra=500):
+    """Valores reales de la base de datos para armar filtros y búsquedas"""
+    with app.app_context():
+        usuarios = db.session.scalar(sa.select(sa.func.count()).where(Usuario.email.like('carga%')))
+        if not usuarios:
+            raise SystemExit("No hay usuarios de carga: ejecute primero benchmarks/generar_datos.py")
+        placas = db.session.scalars(sa.select(ElementoAudiovisual.placa).limit(muestra)).all()
+        nombres = db.session.scalars(sa.select(ElementoAudiovisual.nombre).distinct().limit(muestra)).all()
+        return {
+            # str() de la URL oculta la contraseña
+            'base_de_datos': str(db.engine.url),
+            'usuarios': usuarios,
+            'tipos': [clave for clave, _ in TIPOS_ELEMENTO],
+            # Un prefijo de placa: la búsqueda es por coincidencia parcial
+            'placas': [placa[:-1] for placa in placas],
+            'nombres': sorted({nombre.split()[0] for nombre in nombres}),
+            'apellidos': sorted({apellido.split()[0] for apellido in db.session.scalars(
+                sa.select(Persona.apellido).distinct().limit(muestra))}),
+            'personas': db.session.scalars(sa.select(Persona.id).limit(muestra)).all(),
+            'filas': {
+                'personas': db.session.scalar(sa.select(sa.func.count()).select_from(Persona)),
+                'elementos': db.session.scalar(sa.select(sa.func.count()).select_from(ElementoAudiovisual)),
+                'prestamos': db.session.scalar(sa.select(sa.func.count()).select_from(Prestamo)),
+            },
+        }
+
+
+def _servidor_local():
+    from werkzeug.serving import make_server
+    # Sin el registro de cada petición: solo agregaría trabajo al servidor medido
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_port}'
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumir(usuarios, segundos):
+    pasos = {}
+    todos = []
+    # Los pasos de este recorrido y los que agreguen otros (p. ej. bench_servidor.py)
+    extras = sorted({paso for usuario in usuarios for paso in usuario.tiempos} - set(PASOS))
+    for paso in PASOS + extras:
+        tiempos = [t for usuario in usuarios for t in usuario.tiempos[paso]]
+        todos += tiempos
+        pasos[paso] = {
+            'n': len(tiempos),
+            'errores': sum(usuario.errores[paso] for usuario in usuarios),
+            'rps': len(tiempos) / segundos,
+            'p50': percentil(tiempos, 50), 'p95': percentil(tiempos, 95), 'p99': percentil(tiempos, 99),
+        }
+    pasos['total'] = {
+        'n': len(todos),
+        'errores': sum(paso['errores'] for paso in pasos.values()),
+        'rps': len(todos) / segundos,
+        'p50': percentil(todos, 50), 'p95': percentil(todos, 95), 'p99': percentil(todos, 99),
+    }
+    return pasos
+
+
+def imprimir(pasos, base=None):
+    encabezado = f"{'paso':<20} {'n':>6} {'errores':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    if base:
+        encabezado += f" {'Δ req/s':>8} {'Δ p95':>8}"
+    print(encabezado)
+    for paso, r in pasos.items():
+        linea = (f"{paso:<20} {r['n']:>6} {r['errores']:>7} {r['rps']:>8.1f} "
+                 f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+        anterior = (base or {}).get(paso)
+        if anterior and anterior['rps'] and anterior['p95']:
+            linea += (f" {(r['rps'] / anterior['rps'] - 1) * 100:>+7.0f}%"
+                      f" {(r['p95'] / anterior['p95'] - 1) * 100:>+7.0f}%")
+        print(linea)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modo', choices=['cliente', 'http'], default='cliente')
+    parser.add_argument('--url', help='servidor ya iniciado (solo --modo http)')
+    parser.add_argument('--usuarios', type=int, default=8, help='usuarios virtuales concurrentes')
+    parser.add_argument('--iteraciones', type=int, default=20, help='recorridos por usuario virtual')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help='guarda los resultados en este archivo')
+    parser.add_argument('--comparar', help='resultados guardados con --json para comparar')
+    args = parser.parse_args()
+
+    datos = datos_de_prueba()
+    if args.usuarios > datos['usuarios']:
+        parser.error(f"hay {datos['usuarios']} usuarios de carga; genere más con --usuarios-carga")
+
+    servidor, url = None, args.url
+    if args.modo == 'http' and not url:
+        servidor, url = _servidor_local()
+    fabricar = ClienteFlask if args.modo == 'cliente' else (lambda: ClienteHTTP(url))
+    usuarios = [UsuarioVirtual(i, fabricar(), datos, args.iteraciones, args.semilla)
+                for i in range(1, args.usuarios + 1)]
+
+    print(f"{args.usuarios} usuarios × {args.iteraciones} recorridos, modo {args.modo}"
+          f"{' contra ' + url if url else ''}; filas: {datos['filas']}")
+    inicio = time.perf_counter()
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    segundos = time.perf_counter() - inicio
+    if servidor is not None:
+        servidor.shutdown()
+
+    pasos = resumir(usuarios, segundos)
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        base = anterior['pasos']
+        print(f"Comparado con {args.comparar} (commit {anterior.get('commit')}, {anterior.get('fecha')})")
+    imprimir(pasos, base)
+    print(f"{segundos:.1f} s; préstamos no registrados porque otro usuario tomó el elemento: "
+          f"{sum(usuario.conflictos for usuario in usuarios)}; respuestas 304: "
+          f"{sum(usuario.cliente.revalidadas for usuario in usuarios)}")
+
+    if args.json:
+        resultado = {
+            'commit': _commit(),
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'base_de_datos': datos['base_de_datos'],
+            'modo': args.modo,
+            'usuarios': args.usuarios,
+            'iteraciones': args.iteraciones,
+            'filas': datos['filas'],
+            'segundos': segundos,
+            'pasos': pasos,
+        }
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    return 1 if pasos['total']['errores'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,212 @@
+"""Genera una base de datos de carga para benchmarks/escenarios.py.
+
+Parte de `db_init.init_db()` y `db_init.add_sample_data()` (usuarios admin y
+regular, elementos y personas de ejemplo) y agrega, con INSERT por lotes:
+personas, elementos audiovisuales, un historial de préstamos devueltos o
+cancelados, préstamos abiertos (sus elementos quedan no disponibles) y
+usuarios `carga<n>@prestamos.com` / `carga123` para los usuarios virtuales.
+Con la misma `--semilla` los datos son siempre los mismos. Al terminar
+arma el registro de eventos, recalcula los contadores del tablero y las
+estadísticas del planificador.
+
+Uso:
+    python benchmarks/generar_datos.py [--personas 100000] [--elementos 20000] [--prestamos 2000000]
+
+Por defecto escribe en `<tmp>/prestamos_carga.db` (SQLite), la misma base que
+usa escenarios.py; con `DATABASE_URL` apuntando a PostgreSQL se usa esa base
+de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'prestamos_carga.db'))
+
+import sqlalchemy as sa
+from slugify import slugify
+
+from prestamos import db_init, eventos, tablero
+from prestamos.aplicacion import create_app
+from prestamos.database import db
+from prestamos.migraciones import tabla_versiones
+from prestamos.models import (Usuario, ElementoAudiovisual, Persona, Prestamo, TIPOS_ELEMENTO, ROLES_PERSONA,
+                              SLUG_BASE_MAX)
+from prestamos.services import vencimiento
+
+LOTE = 20_000
+PASSWORD_CARGA = 'carga123'
+
+NOMBRES = ['Ana', 'Juan', 'María', 'Carlos', 'Laura', 'Andrés', 'Sofía', 'Diego', 'Valentina', 'Camilo',
+           'Daniela', 'Felipe', 'Isabella', 'Santiago', 'Mariana', 'Sebastián', 'Paula', 'Nicolás', 'Lucía', 'Mateo']
+APELLIDOS = ['Pérez', 'González', 'Rodríguez', 'Gómez', 'Martínez', 'López', 'Díaz', 'Hernández', 'Ramírez',
+             'Torres', 'Vargas', 'Moreno', 'Rojas', 'Castro', 'Ortiz', 'Suárez', 'Jiménez', 'Ruiz', 'Álvarez', 'Mejía']
+MARCAS = {
+    'camara': ('CAM', ['Cámara Sony', 'Cámara Canon', 'Cámara Panasonic', 'Cámara Blackmagic']),
+    'microfono': ('MIC', ['Micrófono Shure', 'Micrófono Rode', 'Micrófono Sennheiser']),
+    'tripode': ('TRP', ['Trípode Manfrotto', 'Trípode Benro']),
+    'iluminacion': ('LUZ', ['Panel LED Aputure', 'Reflector Godox']),
+    'audio': ('AUD', ['Grabadora Zoom', 'Consola Behringer', 'Audífonos Sony']),
+    'otro': ('OTR', ['Proyector Epson', 'Estabilizador DJI', 'Monitor Atomos']),
+}
+
+
+def _insertar(modelo, filas, etiqueta, total):
+    """Inserta `filas` (un generador) por lotes e informa el avance"""
+    inicio = time.perf_counter()
+    lote, hechas = [], 0
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == LOTE:
+            db.session.execute(sa.insert(modelo), lote)
+            db.session.commit()
+            hechas += len(lote)
+            lote = []
+            print(f"\r  {etiqueta}: {hechas}/{total}", end='', flush=True)
+    if lote:
+        db.session.execute(sa.insert(modelo), lote)
+        db.session.commit()
+        hechas += len(lote)
+    segundos = time.perf_counter() - inicio
+    print(f"\r  {etiqueta}: {hechas} en {segundos:.1f} s ({hechas / max(segundos, 1e-9):.0f} filas/s)")
+
+
+def _personas(azar, cantidad, desde):
+    roles = [clave for clave, _ in ROLES_PERSONA]
+    for i in range(desde, desde + cantidad):
+        nombre, apellido = azar.choice(NOMBRES), azar.choice(APELLIDOS)
+        yield {
+            'nombre': nombre,
+            'apellido': f"{apellido} {azar.choice(APELLIDOS)}",
+            'identificacion': str(1_000_000_000 + i),
+            'email': f"{slugify(nombre)}.{slugify(apellido)}{i}@ejemplo.com",
+            'telefono': f"3{azar.randint(0, 999_999_999):09d}",
+            'rol': roles[i % len(roles)],
+        }
+
+
+def _elementos(azar, cantidad, usuario_id):
+    tipos = [clave for clave, _ in TIPOS_ELEMENTO]
+    for i in range(cantidad):
+        tipo = tipos[i % len(tipos)]
+        prefijo, modelos = MARCAS[tipo]
+        placa = f"{prefijo}{i:06d}"
+        nombre = f"{azar.choice(modelos)} {azar.randint(1, 999)}"
+        yield {
+            'placa': placa,
+            'nombre': nombre,
+            'tipo': tipo,
+            'descripcion': f"{nombre} para préstamo",
+            'disponible': True,
+            'slug': slugify(f"{nombre}-{placa}")[:SLUG_BASE_MAX],
+            'user_id': usuario_id,
+        }
+
+
+def _historial(azar, cantidad, personas, elementos, usuarios, ahora):
+    """Préstamos ya cerrados de los últimos tres años, sin solaparse en un mismo elemento"""
+    fin = ahora - timedelta(days=15)
+    inicio = fin - timedelta(days=365 * 3)
+    ventana = int((fin - inicio).total_seconds())
+    por_elemento = Counter(azar.choices(elementos, k=cantidad))
+    for elemento_id in elementos:
+        salidas = sorted(inicio + timedelta(seconds=azar.randrange(ventana)) for _ in range(por_elemento[elemento_id]))
+        for fecha, siguiente in zip(salidas, salidas[1:] + [fin]):
+            devuelto = azar.random() < 0.85
+            regreso = min(fecha + timedelta(hours=azar.randint(1, 24 * 10)), siguiente)
+            yield {
+                'usuario_id': azar.choice(usuarios),
+                'elemento_id': elemento_id,
+                'persona_id': azar.choice(personas),
+                'fecha_prestamo': fecha,
+                'fecha_vencimiento': vencimiento(fecha),
+                'fecha_devolucion': regreso if devuelto else None,
+                'estado': 'devuelto' if devuelto else 'cancelado',
+            }
+
+
+def _abiertos(azar, elementos, personas, usuarios, ahora):
+    for elemento_id in elementos:
+        fecha = ahora - timedelta(minutes=azar.randint(10, 60 * 24 * 14))
+        yield {
+            'usuario_id': azar.choice(usuarios),
+            'elemento_id': elemento_id,
+            'persona_id': azar.choice(personas),
+            'fecha_prestamo': fecha,
+            'fecha_vencimiento': vencimiento(fecha),
+            'estado': 'activo' if azar.random() < 0.9 else 'pendiente',
+        }
+
+
+def generar(args):
+    azar = random.Random(args.semilla)
+    app = create_app()
+    with app.app_context():
+        print(f"Base de datos: {db.engine.url.render_as_string()}")
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+    db_init.init_db()
+    db_init.add_sample_data()
+
+    with app.app_context():
+        admin = Usuario.get_by_email('admin@prestamos.com')
+        inicio = time.perf_counter()
+        for i in range(1, args.usuarios_carga + 1):
+            usuario = Usuario(nombre=f'Usuario de carga {i}', email=f'carga{i}@prestamos.com', es_admin=False)
+            usuario.set_password(PASSWORD_CARGA)
+            db.session.add(usuario)
+        db.session.commit()
+        print(f"  usuarios de carga: {args.usuarios_carga} en {time.perf_counter() - inicio:.1f} s")
+
+        _insertar(Persona, _personas(azar, args.personas, Persona.query.count()), 'personas', args.personas)
+        _insertar(ElementoAudiovisual, _elementos(azar, args.elementos, admin.id), 'elementos', args.elementos)
+
+        personas = list(db.session.scalars(sa.select(Persona.id)))
+        elementos = list(db.session.scalars(sa.select(ElementoAudiovisual.id)))
+        # El historial se reparte entre los usuarios de ejemplo: los de carga empiezan sin préstamos
+        usuarios = list(db.session.scalars(sa.select(Usuario.id).where(~Usuario.email.like('carga%'))))
+        ahora = datetime.utcnow()
+        _insertar(Prestamo, _historial(azar, args.prestamos, personas, elementos, usuarios, ahora),
+                  'préstamos cerrados', args.prestamos)
+        prestados = azar.sample(elementos, int(len(elementos) * args.prestados))
+        _insertar(Prestamo, _abiertos(azar, prestados, personas, usuarios, ahora), 'préstamos abiertos',
+                  len(prestados))
+        for inicio_lote in range(0, len(prestados), LOTE):
+            db.session.execute(
+                sa.update(ElementoAudiovisual)
+                .where(ElementoAudiovisual.id.in_(prestados[inicio_lote:inicio_lote + LOTE]))
+                .values(disponible=False)
+            )
+        db.session.commit()
+
+        inicio = time.perf_counter()
+        eventos.desde_prestamos(db.session)
+        intervalos = eventos.reconstruir(db.session)
+        db.session.commit()
+        print(f"  registro de eventos e intervalos ({intervalos}) en {time.perf_counter() - inicio:.1f} s")
+
+        inicio = time.perf_counter()
+        tablero.recalcular()
+        with db.engine.begin() as conexion:
+            conexion.execute(sa.text('ANALYZE'))
+        print(f"  contadores del tablero y ANALYZE en {time.perf_counter() - inicio:.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--personas', type=int, default=100_000)
+    parser.add_argument('--elementos', type=int, default=20_000)
+    parser.add_argument('--prestamos', type=int, default=2_000_000, help='préstamos cerrados del historial')
+    parser.add_argument('--prestados', type=float, default=0.1, help='fracción de elementos con un préstamo abierto')
+    parser.add_argument('--usuarios-carga', type=int, default=32, help='usuarios para los usuarios virtuales')
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+    generar(args)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+"""Verifica el presupuesto de consultas de cada endpoint y busca cargas N+1.
+
+Crea una base de datos con los datos de ejemplo más suficientes préstamos,
+personas y elementos como para que una relación cargada de forma perezosa
+en un listado supere NMASUNO_UMBRAL, inicia sesión como administrador y
+pide cada endpoint de `nmasuno.PRESUPUESTOS` dentro de `limite_consultas`.
+Termina con código 1 si algún endpoint se pasa del presupuesto o tiene
+consultas repetidas.
+
+Uso:
+    python benchmarks/presupuesto_consultas.py [--prestamos 60]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'presupuesto_consultas.db')
+# Cada endpoint se mide con limite_consultas; el detector por petición queda apagado
+os.environ['NMASUNO_MODO'] = 'off'
+
+import sqlalchemy as sa
+
+from prestamos.aplicacion import create_app
+from prestamos.database import db
+from prestamos.db_init import add_sample_data
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import ElementoAudiovisual, Persona, Usuario
+from prestamos.nmasuno import PRESUPUESTOS, ConsultasExcesivas, limite_consultas
+from prestamos.services import PrestamoService
+
+app = create_app()
+
+
+def preparar(num_prestamos):
+    with app.app_context():
+        db.drop_all()
+        tabla_versiones.drop(db.engine, checkfirst=True)
+        db.create_all()
+        aplicar_migraciones(db.engine, verbose=False)
+    add_sample_data()
+    with app.app_context():
+        usuarios = [u.id for u in Usuario.query]
+        db.session.execute(sa.insert(Persona), [
+            {'nombre': f'Nombre{i}', 'apellido': f'Apellido{i}', 'identificacion': str(20_000_000 + i),
+             'email': f'persona{i}@ejemplo.com', 'rol': 'estudiante'}
+            for i in range(num_prestamos)
+        ])
+        db.session.execute(sa.insert(ElementoAudiovisual), [
+            {'placa': f'BEN{i:04d}', 'nombre': f'Elemento {i}', 'tipo': 'camara', 'disponible': True,
+             'slug': f'elemento-{i}-ben{i:04d}', 'user_id': usuarios[0]}
+            for i in range(num_prestamos)
+        ])
+        db.session.commit()
+        personas = [p.id for p in Persona.query]
+        elementos = [e.id for e in ElementoAudiovisual.query.filter_by(disponible=True)]
+        servicio = PrestamoService()
+        # Préstamos de distintos usuarios, personas y elementos: una carga perezosa por fila se nota
+        for i, elemento_id in enumerate(elementos[:num_prestamos]):
+            servicio.prestar(elemento_id, personas[i % len(personas)], usuarios[i % len(usuarios)],
+                             fecha=datetime.utcnow() - timedelta(hours=i))
+            if random.random() < 0.5:
+                servicio.devolver(servicio.session.scalars(
+                    sa.text('SELECT max(id) FROM prestamo')).one())
+        return ElementoAudiovisual.query.first().slug
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--prestamos', type=int, default=60)
+    args = parser.parse_args()
+
+    slug = preparar(args.prestamos)
+    app.config['WTF_CSRF_ENABLED'] = False
+    cliente = app.test_client()
+    cliente.post('/login', data={'email': 'admin@prestamos.com', 'password': 'admin123'})
+    # Primera visita: carga la identidad en la caché
+    cliente.get('/')
+
+    urls = {
+        'elementos.ver_elemento_slug': f'/elemento/{slug}/',
+        'api.api_personas': '/api/personas?q=Nom',
+        'api.api_elementos': '/api/elementos?q=Ele',
+    }
+    fallas = 0
+    print(f"{'endpoint':<28} {'consultas':>9} {'presupuesto':>11}  resultado")
+    with app.test_request_context():
+        rutas = {regla.endpoint: regla.rule for regla in app.url_map.iter_rules()}
+    for endpoint, maximo in PRESUPUESTOS.items():
+        url = urls.get(endpoint, rutas[endpoint])
+        try:
+            with limite_consultas(maximo) as registro:
+                respuesta = cliente.get(url)
+            resultado = 'ok' if respuesta.status_code == 200 else f'HTTP {respuesta.status_code}'
+        except ConsultasExcesivas as error:
+            resultado = f'FALLA: {error}'
+            fallas += 1
+        print(f"{endpoint:<28} {registro.consultas:>9} {maximo:>11}  {resultado}")
+    return 1 if fallas else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+"""Prueba de estrés multihilo de `PrestamoService`: verifica que no haya préstamos dobles.
+
+Varios hilos prestan y devuelven al azar un conjunto pequeño de elementos (para
+forzar colisiones). Al final se comprueba que cada elemento tenga como máximo
+un préstamo activo y que `disponible` sea coherente con ese préstamo.
+
+Uso:
+    python benchmarks/stress_prestamos.py [--hilos 16] [--operaciones 500] [--elementos 5]
+
+Por defecto usa un archivo SQLite temporal; con `DATABASE_URL` apuntando a
+PostgreSQL se usa esa base de datos (¡se borran sus tablas!).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress_prestamos.db')
+
+import sqlalchemy as sa
+
+from prestamos.database import db
+from prestamos.aplicacion import create_app
+from prestamos.migraciones import tabla_versiones, aplicar_migraciones
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo, ESTADOS_ACTIVOS
+from prestamos.services import PrestamoService, ElementoNoDisponible, PrestamoNoModificable
+
+
+def preparar(num_elementos):
+    db.drop_all()
+    tabla_versiones.drop(db.engine, checkfirst=True)
+    db.create_all()
+    aplicar_migraciones(db.engine, verbose=False)
+    db.session.add(Usuario(id=1, nombre='Admin', email='admin@ejemplo.com', es_admin=True))
+    db.session.add(Persona(id=1, nombre='Ana', apellido='López', identificacion='1', rol='estudiante'))
+    for i in range(1, num_elementos + 1):
+        db.session.add(ElementoAudiovisual(id=i, placa=f'E{i}', nombre=f'Elemento {i}', tipo='camara',
+                                           slug=f'elemento-{i}', user_id=1, disponible=True))
+    db.session.commit()
+
+
+def trabajador(app, operaciones, num_elementos, contadores, barrera):
+    with app.app_context():
+        servicio = PrestamoService()
+        barrera.wait()
+        for _ in range(operaciones):
+            elemento_id = random.randint(1, num_elementos)
+            if random.random() < 0.6:
+                try:
+                    servicio.prestar(elemento_id, persona_id=1, usuario_id=1)
+                    contadores['prestamos'] += 1
+                except ElementoNoDisponible:
+                    contadores['rechazados'] += 1
+            else:
+                prestamo_id = db.session.scalar(
+                    sa.select(Prestamo.id).where(Prestamo.elemento_id == elemento_id,
+                                                 Prestamo.estado.in_(ESTADOS_ACTIVOS))
+                )
+                db.session.rollback()
+                if prestamo_id is None:
+                    continue
+                try:
+                    servicio.devolver(prestamo_id)
+                    contadores['devoluciones'] += 1
+                except PrestamoNoModificable:
+                    contadores['devoluciones_perdidas'] += 1
+        db.session.remove()
+
+
+def verificar(num_elementos):
+    activos = Counter(db.session.scalars(
+        sa.select(Prestamo.elemento_id).where(Prestamo.estado.in_(ESTADOS_ACTIVOS))
+    ))
+    errores = []
+    for elemento in db.session.scalars(sa.select(ElementoAudiovisual)):
+        if activos[elemento.id] > 1:
+            errores.append(f"Elemento {elemento.id}: {activos[elemento.id]} préstamos activos a la vez")
+        if elemento.disponible == (activos[elemento.id] == 1):
+            errores.append(f"Elemento {elemento.id}: disponible={elemento.disponible} con "
+                           f"{activos[elemento.id]} préstamos activos")
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--operaciones', type=int, default=500, help='operaciones por hilo')
+    parser.add_argument('--elementos', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        preparar(args.elementos)
+
+    # Counter no es atómico entre hilos, pero solo se usa para el informe
+    contadores = Counter()
+    barrera = threading.Barrier(args.hilos)
+    hilos = [threading.Thread(target=trabajador, args=(app, args.operaciones, args.elementos, contadores, barrera))
+             for _ in range(args.hilos)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    total = sum(contadores.values())
+    print(f"{args.hilos} hilos, {total} operaciones en {duracion:.2f} s ({total / duracion:.0f} op/s)")
+    for clave, valor in sorted(contadores.items()):
+        print(f"  {clave:<22} {valor}")
+
+    with app.app_context():
+        errores = verificar(args.elementos)
+    if errores:
+        print("ERROR: se detectaron préstamos dobles o disponibilidad incoherente")
+        for error in errores:
+            print("  " + error)
+        return 1
+    print("OK: ningún elemento se prestó dos veces")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""Configuración de gunicorn para producción.
+
+    gunicorn -c gunicorn.conf.py prestamos.wsgi:app
+
+Los valores salen de las variables WEB_* de prestamos.config. Un proceso por
+CPU con WEB_HILOS hilos cada uno (workers `gthread`): las consultas y los
+hashes de contraseña esperan en un hilo sin frenar al resto del proceso.
+
+Con WEB_PRECARGA=1 (o `--preload`) el maestro crea la app una sola vez y
+los workers la heredan con el fork; ver prestamos.aplicacion.precargar.
+"""
+# Solo nombres en mayúsculas: gunicorn trata cualquier otro nombre del módulo como un ajuste (`config` lo es)
+from prestamos.config import WEB_BIND, WEB_HILOS, WEB_PRECARGA, WEB_PROCESOS, WEB_TIMEOUT
+
+bind = WEB_BIND
+workers = WEB_PROCESOS
+worker_class = 'gthread'
+threads = WEB_HILOS
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_TIMEOUT
+# Conexiones persistentes detrás de un proxy (nginx) que las reutiliza
+keepalive = 5
+# Reinicia cada proceso después de unas miles de peticiones, escalonado, para acotar fugas de memoria
+max_requests = 5000
+max_requests_jitter = 500
+# El maestro crea la app antes del fork (WEB_PRECARGA en prestamos.config)
+preload_app = WEB_PRECARGA
+
+
+def on_starting(server):
+    # Con la app ya creada en el maestro, carga también lo que las vistas importan al usarlo y
+    # compila las plantillas, en memoria que los workers comparten
+    if server.cfg.preload_app:
+        from prestamos.aplicacion import precargar
+        precargar(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    # Cada worker abre sus propias conexiones; las del pool heredado quedan para el maestro
+    if server.cfg.preload_app:
+        from prestamos.aplicacion import descartar_conexiones
+        descartar_conexiones(server.app.wsgi())
@@ -0,0 +1,102 @@
+"""Fábrica de la aplicación Flask.
+
+`create_app(config)` arma una aplicación nueva con sus extensiones y
+blueprints en cada llamada. `config` sobrescribe claves de `app.config`,
+así que una prueba puede usar su propia base de datos:
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+Lo que solo usan algunas vistas (los formularios con WTForms, la
+importación con email_validator, slugify) se importa al usarse por primera
+vez, así que un worker o una prueba arrancan sin cargarlo. Con
+`gunicorn --preload` (WEB_PRECARGA), gunicorn.conf.py llama a `precargar`
+en el proceso maestro: los workers heredan esos módulos y las plantillas
+compiladas en páginas compartidas (copy-on-write) en vez de cargarlos cada
+uno.
+
+    python -X importtime -c "from prestamos.aplicacion import create_app; create_app()"
+
+muestra qué se importa al arrancar (ver benchmarks/bench_arranque.py).
+"""
+import gc
+import importlib
+
+from flask import Flask
+from flask_login import LoginManager
+
+from prestamos import config as configuracion
+from prestamos import fragmentos, instrumentacion, nmasuno
+from prestamos.cache import cache
+from prestamos.database import db, opciones_engine, binds_replica
+from prestamos.models import Usuario, Identidad
+from prestamos.vistas import registrar
+
+# Módulos que las vistas importan recién al usarlos; `precargar` los importa antes del fork
+PEREZOSOS = ('prestamos.forms', 'prestamos.importar', 'slugify')
+
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+login_manager.login_message = configuracion.LOGIN_MESSAGE
+
+def ttl_identidad():
+    """Segundos que se reutiliza la identidad en caché (0 = sin caché)"""
+    if cache.compartida or not configuracion.IDENTIDAD_TTL:
+        return configuracion.IDENTIDAD_TTL
+    # En memoria, editar un usuario solo invalida la copia del proceso que lo editó: en los demás, un
+    # usuario degradado o borrado conserva sus datos (es_admin) hasta que expire, así que el TTL es corto
+    return min(configuracion.IDENTIDAD_TTL, configuracion.IDENTIDAD_TTL_MEMORIA)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    ttl = ttl_identidad()
+    if not ttl:
+        return db.session.get(Usuario, user_id)
+
+    def consultar():
+        usuario = db.session.get(Usuario, user_id)
+        return Identidad.datos(usuario) if usuario else None
+
+    # Evita la consulta del usuario en cada petición; editar un usuario invalida el espacio 'usuarios'
+    datos = cache.obtener('usuarios', f'identidad:{user_id}', consultar, ttl=ttl)
+    return Identidad(**datos) if datos else None
+
+
+def create_app(config=None):
+    """Crea la aplicación; `config` (un dict) sobrescribe los valores que salen de prestamos.config"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = configuracion.SECRET_KEY
+    app.config['SQLALCHEMY_DATABASE_URI'] = configuracion.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = configuracion.SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config['SQLALCHEMY_BINDS'] = binds_replica()
+    app.config.update(config or {})
+    # Las opciones del pool dependen de la base de datos final, que `config` puede haber cambiado
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opciones_engine(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    instrumentacion.instalar(app)
+    nmasuno.instalar(app)
+    fragmentos.instalar(app)
+    registrar(app)
+    return app
+
+
+def precargar(app):
+    """Importa los módulos perezosos y compila todas las plantillas (maestro de gunicorn --preload)"""
+    for modulo in PEREZOSOS:
+        importlib.import_module(modulo)
+    for nombre in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nombre)
+    # Saca lo cargado hasta acá del recolector de ciclos: si un worker lo recorriera, marcaría sus
+    # páginas como escritas y el sistema las copiaría en cada proceso
+    gc.freeze()
+
+
+def descartar_conexiones(app):
+    """En un proceso recién creado con fork: abandona las conexiones heredadas sin cerrarlas"""
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: cerrarlas aquí cortaría también las del proceso padre
+            engine.dispose(close=False)
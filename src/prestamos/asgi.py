@@ -0,0 +1,25 @@
+"""Punto de entrada ASGI (uvicorn, hypercorn, granian...).
+
+    uvicorn prestamos.asgi:app --host 0.0.0.0 --port 8000 --workers 4
+
+El servidor ASGI atiende las conexiones en su bucle de eventos (conexiones
+lentas o inactivas no ocupan hilos) y `a2wsgi` ejecuta la aplicación Flask,
+que es WSGI, en un pool de WEB_HILOS hilos por proceso. No se usa
+`asgiref.wsgi.WsgiToAsgi`: corre todas las peticiones de un proceso en un
+mismo hilo.
+
+Las vistas siguen siendo síncronas. Flask ejecuta una vista `async def` hasta
+el final dentro del hilo de la petición, así que no liberaría el hilo mientras
+espera a la base de datos. Además, un engine asíncrono (psycopg async,
+aiosqlite) no puede reutilizar su pool entre los bucles de eventos que Flask
+crea en cada petición.
+"""
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError as error:
+    raise RuntimeError("prestamos.asgi requiere instalar el paquete 'a2wsgi'") from error
+
+from prestamos import config
+from prestamos.aplicacion import create_app
+
+app = WSGIMiddleware(create_app(), workers=config.WEB_HILOS)
@@ -0,0 +1,156 @@
+"""Avisos por correo de préstamos vencidos.
+
+`escanear_vencidos()` recorre los préstamos abiertos con `fecha_vencimiento`
+pasada y sin aviso, por lotes de VENCIDOS_LOTE sobre el índice parcial
+`ix_prestamo_vencimiento`. Marca cada préstamo con `aviso_vencido_en` y encola
+un trabajo `correo` para la persona en la misma transacción. La marca se pone
+con un `UPDATE` condicional, así que dos trabajadores escaneando a la vez no
+encolan el mismo aviso dos veces.
+
+La tarea `correo` envía cada lote por una sola conexión SMTP, a lo sumo
+CORREOS_POR_MINUTO mensajes por minuto por proceso. Con SMTP_HOST vacío los
+mensajes se escriben en la salida estándar.
+"""
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import EmailMessage
+
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from prestamos import config
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Persona, Prestamo, ESTADOS_ACTIVOS
+from prestamos.trabajos import encolar, tarea
+
+
+class Limitador:
+    """Espacia las llamadas a `esperar()` para no superar `por_minuto` por minuto (0 = sin límite)"""
+
+    def __init__(self, por_minuto):
+        self.intervalo = 60 / por_minuto if por_minuto else 0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+_limitador = Limitador(config.CORREOS_POR_MINUTO)
+
+
+def _aviso(fila):
+    return {
+        'prestamo_id': fila.id,
+        'para': fila.email,
+        'asunto': f"Préstamo vencido: {fila.elemento} ({fila.placa})",
+        'cuerpo': (
+            f"Hola {fila.nombre} {fila.apellido},\n\n"
+            f"El préstamo de {fila.elemento} (placa {fila.placa}) venció el "
+            f"{fila.fecha_vencimiento.strftime('%d/%m/%Y')}. Por favor devuélvelo lo antes posible.\n\n"
+            "Sistema de Préstamos Audiovisuales"
+        ),
+    }
+
+
+def escanear_vencidos(session=None, lote=None, ahora=None):
+    """Encola un aviso por cada préstamo vencido que aún no lo tiene; devuelve cuántos encoló"""
+    session = session or db.session
+    lote = lote or config.VENCIDOS_LOTE
+    ahora = ahora or datetime.utcnow()
+    consulta = (
+        select(Prestamo.id, Prestamo.fecha_vencimiento, Persona.nombre, Persona.apellido, Persona.email,
+               ElementoAudiovisual.nombre.label('elemento'), ElementoAudiovisual.placa)
+        .select_from(Prestamo)
+        .join(Persona, Persona.id == Prestamo.persona_id)
+        .join(ElementoAudiovisual, ElementoAudiovisual.id == Prestamo.elemento_id)
+        # Los estados van como literales: SQLite solo usa el índice parcial si la condición coincide tal cual
+        .where(Prestamo.estado.in_(bindparam('activos', ESTADOS_ACTIVOS, expanding=True, literal_execute=True)),
+               Prestamo.aviso_vencido_en.is_(None), Prestamo.fecha_vencimiento < ahora)
+        .order_by(Prestamo.fecha_vencimiento, Prestamo.id)
+        .limit(lote)
+    )
+    encolados = 0
+    posicion = None
+    while True:
+        pagina = consulta
+        if posicion:
+            fecha, id_ = posicion
+            pagina = consulta.where(or_(
+                Prestamo.fecha_vencimiento > fecha,
+                and_(Prestamo.fecha_vencimiento == fecha, Prestamo.id > id_)
+            ))
+        filas = session.execute(pagina).all()
+        if not filas:
+            break
+        # Solo se avisa de los que este trabajador alcanzó a marcar
+        marcados = set(session.scalars(
+            update(Prestamo)
+            .where(Prestamo.id.in_([fila.id for fila in filas]), Prestamo.aviso_vencido_en.is_(None))
+            .values(aviso_vencido_en=ahora)
+            .returning(Prestamo.id)
+            .execution_options(synchronize_session=False)
+        ))
+        # Las personas sin email quedan marcadas igual, para no revisarlas en cada escaneo
+        avisos = [_aviso(fila) for fila in filas if fila.id in marcados and fila.email]
+        encolar(session, 'correo', avisos)
+        session.commit()
+        encolados += len(avisos)
+        if len(filas) < lote:
+            break
+        posicion = (filas[-1].fecha_vencimiento, filas[-1].id)
+    return encolados
+
+
+class _Consola:
+    """Reemplazo de smtplib.SMTP que escribe los mensajes en la salida estándar"""
+
+    def send_message(self, mensaje):
+        print(f"--- Correo para {mensaje['To']}: {mensaje['Subject']}\n{mensaje.get_content()}", flush=True)
+
+
+@contextmanager
+def _conexion_smtp():
+    if not config.SMTP_HOST:
+        yield _Consola()
+        return
+    with smtplib.SMTP(config.SMTP_HOST, config.SMTP_PORT, timeout=30) as smtp:
+        if config.SMTP_TLS:
+            smtp.starttls()
+        if config.SMTP_USUARIO:
+            smtp.login(config.SMTP_USUARIO, config.SMTP_PASSWORD)
+        yield smtp
+
+
+def _mensaje(datos):
+    mensaje = EmailMessage()
+    mensaje['From'] = config.CORREO_REMITENTE
+    mensaje['To'] = datos['para']
+    mensaje['Subject'] = datos['asunto']
+    mensaje.set_content(datos['cuerpo'])
+    return mensaje
+
+
+@tarea('correo')
+def enviar_correos(trabajos):
+    """Envía los correos del lote por una sola conexión; un destinatario rechazado no frena a los demás"""
+    errores = {}
+    with _conexion_smtp() as smtp:
+        for posicion, trabajo in enumerate(trabajos):
+            _limitador.esperar()
+            try:
+                smtp.send_message(_mensaje(trabajo.datos))
+            except smtplib.SMTPServerDisconnected as error:
+                # Los ya enviados no se repiten; el resto se reintenta más tarde
+                errores.update((pendiente.id, str(error)) for pendiente in trabajos[posicion:])
+                break
+            except smtplib.SMTPException as error:
+                errores[trabajo.id] = str(error)
+    return errores
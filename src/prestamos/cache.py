@@ -0,0 +1,258 @@
+"""Caché de resultados de consultas frecuentes con invalidación por eventos.
+
+Los valores se agrupan en espacios (`elementos`, `personas`, `prestamos`,
+`usuarios`), uno por tabla. Cada espacio tiene un número de generación que
+forma parte de la clave; invalidar un espacio solo incrementa ese número, de
+modo que las entradas anteriores dejan de leerse y el LRU las descarta.
+
+La invalidación es automática: los eventos de SQLAlchemy registran qué tablas
+modifica cada sesión (objetos en el flush y `UPDATE`/`INSERT`/`DELETE` ORM) y,
+al confirmar la transacción, se invalidan sus espacios.
+
+Los espacios de ESPACIOS_VERSIONADOS también suben su fila en la tabla
+`versiones` dentro de la misma transacción, justo antes del COMMIT (así el
+bloqueo de esa fila dura poco). Esa versión sí es común a todos los procesos
+y es la que usan los ETag del catálogo (ver prestamos.condicional).
+
+Backends:
+- `memoria` (por defecto): LRU con TTL dentro del proceso. Con varios workers
+  cada uno invalida solo su copia; el TTL acota el tiempo de una lectura vieja.
+- `redis`: servidor compatible con Redis (requiere el paquete `redis`). Las
+  generaciones se guardan en el servidor, por lo que la invalidación es global.
+
+Los valores deben ser serializables a JSON (no objetos ORM).
+"""
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from prestamos import config
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo, Version
+
+ESPACIOS = {
+    ElementoAudiovisual: 'elementos',
+    Persona: 'personas',
+    Prestamo: 'prestamos',
+    Usuario: 'usuarios',
+}
+
+# Espacios cuya versión se guarda en la base de datos (tabla `versiones`)
+ESPACIOS_VERSIONADOS = {'elementos'}
+
+_CLAVE_PENDIENTES = 'cache_invalidar'
+
+
+class LRUCache:
+    """Diccionario LRU con expiración por entrada, seguro entre hilos"""
+
+    def __init__(self, max_entradas=1024):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        """Devuelve `(encontrado, valor)`"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return False, None
+            expira, valor = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return False, None
+            self._datos.move_to_end(clave)
+            return True, valor
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class RedisCache:
+    """Mismo contrato que `LRUCache` sobre un servidor compatible con Redis"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as error:
+            raise RuntimeError("CACHE_BACKEND=redis requiere instalar el paquete 'redis'") from error
+        self._cliente = redis.Redis.from_url(url)
+
+    def get(self, clave):
+        valor = self._cliente.get(clave)
+        if valor is None:
+            return False, None
+        return True, json.loads(valor)
+
+    def set(self, clave, valor, ttl=None):
+        self._cliente.set(clave, json.dumps(valor), ex=ttl or None)
+
+    def delete(self, clave):
+        self._cliente.delete(clave)
+
+    def incr(self, clave):
+        return self._cliente.incr(clave)
+
+    def generacion(self, clave):
+        return int(self._cliente.get(clave) or 0)
+
+    def clear(self):
+        # Invalida todo incrementando las generaciones en lugar de vaciar el servidor
+        for espacio in ESPACIOS.values():
+            self.incr(f"{config.CACHE_PREFIJO}:gen:{espacio}")
+
+
+class Cache:
+    """Punto de entrada de la caché: lectura por espacio, invalidación y contadores"""
+
+    def __init__(self, backend, ttl=300, prefijo='prestamos'):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self.aciertos = Counter()
+        self.fallos = Counter()
+        self.invalidaciones = Counter()
+        # Generaciones locales, para backends que no las guardan (LRU en memoria).
+        # No viven en el LRU para que una expulsión no las reinicie.
+        self._generaciones = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def activa(self):
+        return self.ttl > 0
+
+    @property
+    def compartida(self):
+        """True si las generaciones viven en el servidor (Redis) y una invalidación llega a todos los procesos"""
+        return hasattr(self.backend, 'incr')
+
+    def _clave_generacion(self, espacio):
+        return f"{self.prefijo}:gen:{espacio}"
+
+    def generacion(self, espacio):
+        if hasattr(self.backend, 'generacion'):
+            return self.backend.generacion(self._clave_generacion(espacio))
+        return self._generaciones[espacio]
+
+    def obtener(self, espacio, clave, calcular, ttl=None):
+        """Devuelve el valor en caché de `clave` o lo calcula con `calcular()` y lo guarda"""
+        if not self.activa:
+            return calcular()
+        clave_completa = f"{self.prefijo}:{espacio}:{self.generacion(espacio)}:{clave}"
+        encontrado, valor = self.backend.get(clave_completa)
+        if encontrado:
+            self.aciertos[espacio] += 1
+            return valor
+        self.fallos[espacio] += 1
+        valor = calcular()
+        self.backend.set(clave_completa, valor, ttl or self.ttl)
+        return valor
+
+    def invalidar(self, *espacios):
+        for espacio in espacios:
+            if self.compartida:
+                self.backend.incr(self._clave_generacion(espacio))
+            else:
+                with self._lock:
+                    self._generaciones[espacio] += 1
+            self.invalidaciones[espacio] += 1
+
+    def estadisticas(self):
+        """Contadores de aciertos, fallos e invalidaciones por espacio"""
+        espacios = sorted(set(ESPACIOS.values()))
+        return {
+            espacio: {
+                'aciertos': self.aciertos[espacio],
+                'fallos': self.fallos[espacio],
+                'invalidaciones': self.invalidaciones[espacio],
+            }
+            for espacio in espacios
+        }
+
+
+def crear_cache():
+    """Crea la caché según `CACHE_BACKEND`, `CACHE_TTL` y `CACHE_MAX_ENTRADAS`"""
+    if config.CACHE_BACKEND == 'redis':
+        backend = RedisCache(config.CACHE_REDIS_URL)
+    else:
+        backend = LRUCache(config.CACHE_MAX_ENTRADAS)
+    return Cache(backend, ttl=config.CACHE_TTL, prefijo=config.CACHE_PREFIJO)
+
+
+cache = crear_cache()
+
+
+def _marcar(session, *clases):
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, set())
+    for clase in clases:
+        espacio = ESPACIOS.get(clase)
+        if espacio:
+            pendientes.add(espacio)
+
+
+def registrar_escritura(session, *modelos):
+    """Para escrituras que no pasan por el ORM (COPY): al confirmar `session` se versionan e
+    invalidan los espacios de `modelos`, como con las demás"""
+    _marcar(session, *modelos)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_flush(session, flush_context):
+    _marcar(session, *{type(obj) for obj in chain(session.new, session.dirty, session.deleted)})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_sentencia(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _marcar(orm_execute_state.session, mapper.class_)
+
+
+@event.listens_for(Session, 'before_commit')
+def _versionar(session):
+    if session.in_nested_transaction():
+        return
+    # commit() hace su flush después de este evento: se adelanta para ver todos los cambios
+    session.flush()
+    espacios = session.info.get(_CLAVE_PENDIENTES, set()) & ESPACIOS_VERSIONADOS
+    if espacios:
+        Version.incrementar(session, *espacios)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_confirmados(session):
+    # También se dispara al liberar un SAVEPOINT (ElementoAudiovisual.save): lo pendiente espera al
+    # commit real, que es el que sube la versión
+    if session.in_nested_transaction():
+        return
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    if pendientes:
+        cache.invalidar(*pendientes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_pendientes(session, previous_transaction):
+    # Un savepoint revertido no descarta los cambios de la transacción externa
+    if previous_transaction.parent is None:
+        session.info.pop(_CLAVE_PENDIENTES, None)
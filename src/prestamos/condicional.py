@@ -0,0 +1,84 @@
+"""GET condicional (ETag y 304) para el catálogo y la página de cada elemento.
+
+El ETag se arma con la versión de los datos que muestra la página (la fila
+`versiones` del espacio `elementos` para /elementos; para /elemento/<slug>/,
+el id, la versión y `actualizado_en` del elemento más el fin de su reserva
+vigente más próxima, que deja de mostrarse al vencer), el usuario que la ve (la barra de
+navegación y los botones dependen de él), la URL y una huella de las
+plantillas. Si el navegador manda ese ETag en `If-None-Match`, la vista
+responde 304 después de leer solo la versión, sin consultar las filas ni
+renderizar.
+
+La versión se lee antes que los datos: si cambian entre medio, el ETag queda
+atrasado y la próxima visita vuelve a renderizar, nunca al revés.
+
+Se envía `Last-Modified` como dato, pero solo se responde 304 por ETag: con
+resolución de un segundo, `If-Modified-Since` no distingue dos cambios en el
+mismo segundo ni a dos usuarios en el mismo navegador.
+"""
+import functools
+import hashlib
+import os
+
+from flask import Response, current_app, request, session
+from flask_login import current_user
+
+from prestamos import config
+
+
+def _leer_huella(carpeta):
+    resumen = hashlib.sha256()
+    for raiz, carpetas, archivos in os.walk(carpeta):
+        carpetas.sort()
+        for nombre in sorted(archivos):
+            ruta = os.path.join(raiz, nombre)
+            resumen.update(os.path.relpath(ruta, carpeta).encode())
+            with open(ruta, 'rb') as archivo:
+                resumen.update(archivo.read())
+    return resumen.hexdigest()
+
+
+_huella_cacheada = functools.lru_cache(maxsize=None)(_leer_huella)
+
+
+def _huella():
+    """Huella del contenido de las plantillas: cambia con cada despliegue que las toca"""
+    carpeta = os.path.join(current_app.root_path, current_app.template_folder)
+    # En modo debug las plantillas se recargan en caliente
+    return _leer_huella(carpeta) if current_app.debug else _huella_cacheada(carpeta)
+
+
+def etag(*partes):
+    """ETag fuerte para la petición actual a partir de `partes` (versiones de los datos mostrados)"""
+    usuario = (current_user.id, current_user.nombre, current_user.es_admin) if current_user.is_authenticated else None
+    texto = repr((_huella(), request.full_path, usuario) + partes)
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def _validadores(respuesta, etiqueta, actualizado_en):
+    respuesta.set_etag(etiqueta)
+    if actualizado_en is not None:
+        respuesta.last_modified = actualizado_en
+    # El navegador guarda la página pero la revalida en cada visita; nunca en cachés compartidas
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+def no_modificado(etiqueta, actualizado_en=None):
+    """Respuesta 304 si el navegador ya tiene la versión `etiqueta`; si no, None"""
+    if not config.ETAGS or request.method not in ('GET', 'HEAD'):
+        return None
+    # Con mensajes flash pendientes la página cambia aunque los datos no
+    if '_flashes' in session:
+        return None
+    if not request.if_none_match.contains(etiqueta):
+        return None
+    return _validadores(Response(status=304), etiqueta, actualizado_en)
+
+
+def con_validadores(respuesta, etiqueta, actualizado_en=None):
+    """Agrega ETag, Last-Modified y Cache-Control a una respuesta renderizada"""
+    respuesta = current_app.make_response(respuesta)
+    if not config.ETAGS or respuesta.status_code != 200:
+        return respuesta
+    return _validadores(respuesta, etiqueta, actualizado_en)
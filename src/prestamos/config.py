@@ -17,5 +17,108 @@ POSTGRES_URI = f"postgresql+psycopg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTG
 SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', POSTGRES_URI)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Réplica de solo lectura para las vistas GET marcadas con @solo_lectura (vacío = sin réplica) y
+# segundos que un usuario sigue leyendo del primario después de confirmar una escritura
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+REPLICA_PEGAJOSA = int(os.environ.get('REPLICA_PEGAJOSA', '10'))
+
+# Pool de conexiones (ver database.opciones_engine). Con varios workers de gunicorn, cada proceso abre
+# hasta DB_POOL_SIZE + DB_MAX_OVERFLOW conexiones: el total debe caber en max_connections de PostgreSQL
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))  # segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # segundos; -1 no recicla
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'si', 'sí')
+DB_POOL_LIFO = os.environ.get('DB_POOL_LIFO', '0').lower() in ('1', 'true', 'si', 'sí')
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', '0'))  # milisegundos (PostgreSQL); 0 sin límite
+# Modo PgBouncer (pool_mode = transaction): sin pool local (NullPool) y sin sentencias preparadas
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0').lower() in ('1', 'true', 'si', 'sí')
+
+# Servidor de producción (gunicorn.conf.py con prestamos.wsgi, o un servidor ASGI con prestamos.asgi):
+# dirección, procesos, hilos por proceso y segundos máximos por petición. Cada hilo puede ocupar una
+# conexión del pool, así que conviene WEB_HILOS <= DB_POOL_SIZE + DB_MAX_OVERFLOW
+WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+WEB_PROCESOS = int(os.environ.get('WEB_PROCESOS', os.cpu_count() or 1))
+WEB_HILOS = int(os.environ.get('WEB_HILOS', '8'))
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', '30'))
+# gunicorn --preload: el maestro crea la app y precarga módulos y plantillas antes del fork, y los
+# workers comparten esa memoria (copy-on-write). Un HUP ya no recarga el código, hay que reiniciar
+WEB_PRECARGA = os.environ.get('WEB_PRECARGA', '0').lower() in ('1', 'true', 'si', 'sí')
+
+# Token para /metrics (cabecera 'Authorization: Bearer <token>'); vacío = solo administradores con sesión
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Medición por petición (ver prestamos.instrumentacion): cabecera Server-Timing en las respuestas y
+# umbral en milisegundos para registrar una consulta como lenta (0 = no se registran)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1').lower() in ('1', 'true', 'si', 'sí')
+SQL_LENTA_MS = float(os.environ.get('SQL_LENTA_MS', '200'))
+# Detector de consultas N+1 (ver prestamos.nmasuno): 'off', 'aviso' o 'error' (vacío = 'aviso' solo en
+# modo debug) y cuántas veces puede repetirse una carga perezosa o una sentencia en una petición
+NMASUNO_MODO = os.environ.get('NMASUNO_MODO', '').lower()
+NMASUNO_UMBRAL = int(os.environ.get('NMASUNO_UMBRAL', '5'))
+# ETag y respuestas 304 en el catálogo y en la página de cada elemento (ver prestamos.condicional)
+ETAGS = os.environ.get('ETAGS', '1').lower() in ('1', 'true', 'si', 'sí')
+# Fragmentos de plantilla renderizados que guarda cada proceso (ver prestamos.fragmentos); 0 los desactiva
+FRAGMENTOS_MAX = int(os.environ.get('FRAGMENTOS_MAX', '5000'))
+# Carpeta de la caché de bytecode de las plantillas (vacío = carpeta temporal de Jinja, 'off' = sin caché)
+PLANTILLAS_CACHE = os.environ.get('PLANTILLAS_CACHE', '')
+
+# Paginación del listado de préstamos
+PRESTAMOS_POR_PAGINA = int(os.environ.get('PRESTAMOS_POR_PAGINA', '50'))
+PRESTAMOS_POR_PAGINA_MAX = int(os.environ.get('PRESTAMOS_POR_PAGINA_MAX', '200'))
+
+# Número máximo de resultados de los buscadores de personas y elementos
+BUSQUEDA_LIMITE = int(os.environ.get('BUSQUEDA_LIMITE', '50'))
+# Resultados por página de las rutas de autocompletado (/api/personas, /api/elementos)
+API_LIMITE = int(os.environ.get('API_LIMITE', '10'))
+
+# Días que dura un préstamo: fija su fecha de vencimiento y cuenta como vencido en el tablero
+PRESTAMO_DIAS = int(os.environ.get('PRESTAMO_DIAS', '7'))
+
+# Máximo de elementos en un préstamo de kit (/prestamos/lote)
+LOTE_MAXIMO = int(os.environ.get('LOTE_MAXIMO', '50'))
+
+# Días que puede durar una reserva (/reservas/nueva)
+RESERVA_DIAS_MAX = int(os.environ.get('RESERVA_DIAS_MAX', '30'))
+
+# Caché de consultas frecuentes: 'memoria' (LRU por proceso) o 'redis'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_TTL = int(os.environ.get('CACHE_TTL', '300'))  # segundos; 0 desactiva la caché
+CACHE_MAX_ENTRADAS = int(os.environ.get('CACHE_MAX_ENTRADAS', '1024'))
+CACHE_PREFIJO = os.environ.get('CACHE_PREFIJO', 'prestamos')
+# Segundos que se reutiliza la identidad del usuario autenticado sin consultar la base de datos
+# (se invalida al modificar cualquier usuario); 0 consulta en cada petición. Con CACHE_BACKEND=memoria
+# la invalidación no llega a los demás procesos y se usa como máximo IDENTIDAD_TTL_MEMORIA
+IDENTIDAD_TTL = int(os.environ.get('IDENTIDAD_TTL', '60'))
+IDENTIDAD_TTL_MEMORIA = int(os.environ.get('IDENTIDAD_TTL_MEMORIA', '5'))
+
+# Hash de contraseñas: método de werkzeug con su costo ('scrypt:n:r:p' o 'pbkdf2:sha256:iteraciones'),
+# hilos dedicados a calcularlo (0 = en el hilo de la petición) y espera máxima en la cola (segundos)
+PASSWORD_HASH_METODO = os.environ.get('PASSWORD_HASH_METODO', 'scrypt:32768:8:1')
+PASSWORD_HASH_HILOS = int(os.environ.get('PASSWORD_HASH_HILOS', os.cpu_count() or 1))
+PASSWORD_HASH_ESPERA = float(os.environ.get('PASSWORD_HASH_ESPERA', '10'))
+
+# Cola de trabajos en segundo plano (python -m prestamos.trabajador): trabajos tomados por vuelta,
+# segundos de espera cuando la cola está vacía, segundos que un trabajo queda reservado para un
+# trabajador (si este muere, otro lo retoma después) e intentos antes de darlo por fallido
+TRABAJOS_LOTE = int(os.environ.get('TRABAJOS_LOTE', '50'))
+TRABAJOS_ESPERA = float(os.environ.get('TRABAJOS_ESPERA', '5'))
+TRABAJOS_RESERVA = int(os.environ.get('TRABAJOS_RESERVA', '300'))
+TRABAJOS_INTENTOS = int(os.environ.get('TRABAJOS_INTENTOS', '5'))
+# Cada cuántos segundos el trabajador busca préstamos vencidos y cuántos revisa por consulta
+VENCIDOS_INTERVALO = int(os.environ.get('VENCIDOS_INTERVALO', '300'))
+VENCIDOS_LOTE = int(os.environ.get('VENCIDOS_LOTE', '500'))
+
+# Correo saliente de los avisos (SMTP_HOST vacío = se escriben en la consola del trabajador).
+# CORREOS_POR_MINUTO limita el envío de cada proceso trabajador
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '1025'))
+SMTP_USUARIO = os.environ.get('SMTP_USUARIO', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_TLS = os.environ.get('SMTP_TLS', '0').lower() in ('1', 'true', 'si', 'sí')
+CORREO_REMITENTE = os.environ.get('CORREO_REMITENTE', 'prestamos@localhost')
+CORREOS_POR_MINUTO = int(os.environ.get('CORREOS_POR_MINUTO', '60'))
+
 # Configuración del sistema de login
 LOGIN_MESSAGE = "Por favor inicia sesión para acceder a esta página."
\ No newline at end of file
@@ -1,4 +1,164 @@
+import functools
+import threading
+import time
+
+from flask import g, has_request_context, request, session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, NullPool
+
+from prestamos import config
+
+class SesionEnrutada(Session):
+    """Sesión que envía las lecturas de las vistas de solo lectura a la réplica.
+
+    Un SELECT va a la réplica (bind 'replica') solo si la vista está marcada con
+    `@solo_lectura`, la sesión no escribió nada todavía y el usuario no confirmó
+    escrituras en los últimos REPLICA_PEGAJOSA segundos (para que vea sus propios
+    cambios aunque la réplica vaya atrasada). Todo lo demás va al primario.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and 'replica' in self._db.engines and self._leer_de_replica(clause):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _leer_de_replica(self, clause):
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if not has_request_context() or not g.get('solo_lectura'):
+            return False
+        if self.info.get('escrituras') or self._flushing:
+            return False
+        return session.get('primario_hasta', 0) < time.time()
+
 
 # Inicialización de la base de datos (sin app)
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
+
+
+def solo_lectura(vista):
+    """Marca una vista cuyas consultas GET pueden leerse desde la réplica"""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.solo_lectura = True
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+@event.listens_for(SesionEnrutada, 'after_flush')
+def _marcar_flush(sesion, flush_context):
+    sesion.info['escrituras'] = True
+
+
+@event.listens_for(SesionEnrutada, 'do_orm_execute')
+def _marcar_sentencia(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['escrituras'] = True
+
+
+@event.listens_for(SesionEnrutada, 'after_commit')
+def _pegar_al_primario(sesion):
+    if sesion.info.pop('escrituras', False) and has_request_context() and config.REPLICA_PEGAJOSA:
+        # Las próximas peticiones de este usuario leen del primario hasta que la réplica lo alcance
+        session['primario_hasta'] = time.time() + config.REPLICA_PEGAJOSA
+
+
+@event.listens_for(SesionEnrutada, 'after_rollback')
+def _descartar_escrituras(sesion):
+    sesion.info.pop('escrituras', None)
+
+
+def binds_replica():
+    """SQLALCHEMY_BINDS con la réplica de lectura, si DATABASE_REPLICA_URL está definida"""
+    if not config.DATABASE_REPLICA_URL:
+        return {}
+    return {'replica': {'url': config.DATABASE_REPLICA_URL, **opciones_engine(config.DATABASE_REPLICA_URL)}}
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto esperan las peticiones por una conexión"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metricas_lock = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.agotados = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            # Se superó DB_POOL_TIMEOUT sin conexión libre
+            with self._metricas_lock:
+                self.agotados += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._metricas_lock:
+                self.checkouts += 1
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+
+
+def opciones_engine(uri=None):
+    """Opciones de `create_engine` (SQLALCHEMY_ENGINE_OPTIONS) según las variables DB_* de config"""
+    url = make_url(uri or config.SQLALCHEMY_DATABASE_URI)
+    opciones = {'pool_pre_ping': config.DB_POOL_PRE_PING}
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        if config.DB_STATEMENT_TIMEOUT:
+            # Con PgBouncer requiere `ignore_startup_parameters = options` en pgbouncer.ini
+            connect_args['options'] = f'-c statement_timeout={config.DB_STATEMENT_TIMEOUT}'
+        if config.DB_PGBOUNCER and url.get_driver_name() == 'psycopg':
+            # PgBouncer en modo transacción no admite sentencias preparadas del lado del servidor
+            connect_args['prepare_threshold'] = None
+    if connect_args:
+        opciones['connect_args'] = connect_args
+
+    if config.DB_PGBOUNCER:
+        # El pool lo lleva PgBouncer: cada checkout abre una conexión liviana hacia él
+        opciones['poolclass'] = NullPool
+    elif url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # SQLite en memoria usa su propio pool de una conexión
+        pass
+    else:
+        opciones.update(
+            poolclass=PoolMedido,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_use_lifo=config.DB_POOL_LIFO,
+        )
+    return opciones
+
+
+def estado_pool(engine):
+    """Estado del pool de `engine` para /metrics"""
+    pool = engine.pool
+    estado = {'clase': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        estado.update(
+            tamano=pool.size(),
+            en_uso=pool.checkedout(),
+            libres=pool.checkedin(),
+            # overflow() es negativo mientras no se hayan abierto todas las conexiones base
+            desborde=max(pool.overflow(), 0),
+            desborde_max=pool._max_overflow,
+        )
+    if isinstance(pool, PoolMedido):
+        with pool._metricas_lock:
+            estado.update(
+                checkouts=pool.checkouts,
+                espera_total=pool.espera_total,
+                espera_max=pool.espera_max,
+                agotados=pool.agotados,
+            )
+    return estado
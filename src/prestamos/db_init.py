@@ -1,22 +1,15 @@
-from flask import Flask
+from prestamos.aplicacion import create_app
 from prestamos.database import db
+from prestamos.migraciones import aplicar_migraciones
 from prestamos.models import Usuario, ElementoAudiovisual, Prestamo, Persona
-from werkzeug.security import generate_password_hash
-from prestamos import config
-
-def create_app():
-    """Crea una instancia de la aplicación para inicializar la base de datos"""
-    app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = config.SQLALCHEMY_TRACK_MODIFICATIONS
-    db.init_app(app)
-    return app
 
 def init_db():
     """Inicializa la base de datos creando todas las tablas"""
     app = create_app()
     with app.app_context():
         db.create_all()
+        # Registra las migraciones como aplicadas y crea los objetos que no dependen de los modelos
+        aplicar_migraciones(db.engine, verbose=False)
         print("Base de datos inicializada correctamente.")
 
 def add_sample_data():
@@ -31,7 +24,7 @@ def add_sample_data():
                 email='admin@prestamos.com',
                 es_admin=True
             )
-            admin.password_hash = generate_password_hash('admin123')
+            admin.set_password('admin123')
             db.session.add(admin)
         
         usuario = Usuario.query.filter_by(email='usuario@prestamos.com').first()
@@ -41,7 +34,7 @@ def add_sample_data():
                 email='usuario@prestamos.com',
                 es_admin=False
             )
-            usuario.password_hash = generate_password_hash('usuario123')
+            usuario.set_password('usuario123')
             db.session.add(usuario)
 
         # Asegurar IDs disponibles
@@ -0,0 +1,227 @@
+"""Registro de eventos de préstamo (solo inserción) y consultas en el tiempo.
+
+`PrestamoService` agrega una fila a `prestamo_eventos` por cada préstamo,
+devolución o cancelación, en la misma transacción que cambia `prestamo` y
+`disponible`. Los triggers que instala `instalar_solo_insercion` rechazan
+cualquier UPDATE o DELETE sobre esa tabla.
+
+Del registro se deriva `prestamo_intervalos`: un intervalo [desde, hasta) por
+préstamo, con `hasta = ABIERTO` mientras el elemento siga afuera. Con esa
+marca (en lugar de NULL) las dos preguntas de este módulo son un único
+recorrido de rango sobre un índice que ya trae todas las columnas:
+
+    afuera_en(T)        elementos afuera en el instante T
+    uso(desde, hasta)   segundos afuera y fracción de uso por elemento
+
+Si `disponible` o la proyección se desalinean del registro:
+
+    python -m prestamos.eventos conciliar      # recalcula `disponible` en un solo UPDATE
+    python -m prestamos.eventos reconstruir    # rehace prestamo_intervalos desde el registro
+    python -m prestamos.eventos afuera [FECHA]
+    python -m prestamos.eventos uso DESDE HASTA
+"""
+import sys
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Prestamo, PrestamoEvento, PrestamoIntervalo
+
+# Fin de los intervalos abiertos: mayor que cualquier fecha real y comparable en un índice
+ABIERTO = datetime(9999, 12, 31)
+
+TIPO_CIERRE = {'devuelto': 'devolucion', 'cancelado': 'cancelacion'}
+
+_SOLO_INSERCION = {
+    'sqlite': [
+        "CREATE TRIGGER IF NOT EXISTS prestamo_eventos_sin_update BEFORE UPDATE ON prestamo_eventos "
+        "BEGIN SELECT RAISE(ABORT, 'prestamo_eventos solo admite INSERT'); END",
+        "CREATE TRIGGER IF NOT EXISTS prestamo_eventos_sin_delete BEFORE DELETE ON prestamo_eventos "
+        "BEGIN SELECT RAISE(ABORT, 'prestamo_eventos solo admite INSERT'); END",
+    ],
+    'postgresql': [
+        "CREATE OR REPLACE FUNCTION prestamo_eventos_solo_insercion() RETURNS trigger LANGUAGE plpgsql AS "
+        "$$ BEGIN RAISE EXCEPTION 'prestamo_eventos solo admite INSERT'; END $$",
+        "DROP TRIGGER IF EXISTS prestamo_eventos_solo_insercion ON prestamo_eventos",
+        "CREATE TRIGGER prestamo_eventos_solo_insercion BEFORE UPDATE OR DELETE ON prestamo_eventos "
+        "FOR EACH ROW EXECUTE FUNCTION prestamo_eventos_solo_insercion()",
+    ],
+}
+
+
+def instalar_solo_insercion(conexion):
+    """Crea los triggers que impiden modificar o borrar eventos (idempotente)"""
+    for sentencia in _SOLO_INSERCION.get(conexion.dialect.name, []):
+        conexion.execute(sa.text(sentencia))
+
+
+def abrir(session, prestamos):
+    """Registra la salida de cada (prestamo_id, elemento_id, fecha) y abre su intervalo"""
+    ahora = datetime.utcnow()
+    session.execute(sa.insert(PrestamoEvento), [
+        {'prestamo_id': prestamo_id, 'elemento_id': elemento_id, 'tipo': 'prestamo', 'fecha': fecha,
+         'registrado_en': ahora}
+        for prestamo_id, elemento_id, fecha in prestamos
+    ])
+    session.execute(sa.insert(PrestamoIntervalo), [
+        {'prestamo_id': prestamo_id, 'elemento_id': elemento_id, 'desde': fecha, 'hasta': ABIERTO}
+        for prestamo_id, elemento_id, fecha in prestamos
+    ])
+
+
+def cerrar(session, prestamo_id, elemento_id, estado, fecha):
+    """Registra la devolución o cancelación (según `estado`) y cierra el intervalo"""
+    session.execute(sa.insert(PrestamoEvento).values(
+        prestamo_id=prestamo_id, elemento_id=elemento_id, tipo=TIPO_CIERRE[estado], fecha=fecha,
+        registrado_en=datetime.utcnow(),
+    ))
+    session.execute(
+        sa.update(PrestamoIntervalo)
+        .where(PrestamoIntervalo.prestamo_id == prestamo_id)
+        .values(hasta=fecha)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# No filtra nada, pero vuelve acotado el rango sobre `hasta`: SQLite, sin histogramas, lo prefiere
+# entonces al rango abierto sobre `desde`, que para fechas recientes recorre casi toda la tabla
+_ACOTADO = PrestamoIntervalo.hasta <= ABIERTO
+
+
+def afuera_en(momento, session=None):
+    """IDs de los elementos que estaban prestados en `momento`"""
+    session = session or db.session
+    return session.scalars(
+        sa.select(PrestamoIntervalo.elemento_id).distinct()
+        .where(PrestamoIntervalo.hasta > momento, _ACOTADO, PrestamoIntervalo.desde <= momento)
+        .order_by(PrestamoIntervalo.elemento_id)
+    ).all()
+
+
+def uso(desde, hasta, session=None, limite=None):
+    """(elemento_id, segundos afuera, fracción de [desde, hasta)) de los elementos prestados en el rango"""
+    session = session or db.session
+    # Los préstamos abiertos cuentan hasta ahora, no hasta el final de un rango futuro
+    hasta = min(hasta, datetime.utcnow())
+    if hasta <= desde:
+        return []
+    if session.get_bind().dialect.name == 'sqlite':
+        # En SQLite min()/max() de dos argumentos son escalares; las fechas se comparan como texto ISO
+        segundos = (sa.func.julianday(sa.func.min(PrestamoIntervalo.hasta, hasta))
+                    - sa.func.julianday(sa.func.max(PrestamoIntervalo.desde, desde))) * 86400
+    else:
+        segundos = sa.extract('epoch', sa.func.least(PrestamoIntervalo.hasta, hasta)
+                              - sa.func.greatest(PrestamoIntervalo.desde, desde))
+    total = sa.func.sum(segundos).label('segundos')
+    consulta = (
+        sa.select(PrestamoIntervalo.elemento_id, total)
+        .where(PrestamoIntervalo.hasta > desde, _ACOTADO, PrestamoIntervalo.desde < hasta)
+        .group_by(PrestamoIntervalo.elemento_id)
+        .order_by(total.desc(), PrestamoIntervalo.elemento_id)
+        .limit(limite)
+    )
+    rango = (hasta - desde).total_seconds()
+    return [(elemento_id, float(segundos), float(segundos) / rango if rango else 0.0)
+            for elemento_id, segundos in session.execute(consulta)]
+
+
+def desde_prestamos(ejecutor):
+    """Agrega al registro los préstamos que no tienen eventos (datos anteriores al registro)"""
+    ahora = datetime.utcnow()
+    sin_eventos = ~sa.exists().where(PrestamoEvento.prestamo_id == Prestamo.id)
+    salida = sa.func.coalesce(Prestamo.fecha_prestamo, ahora)
+    # Primero los cierres: al insertar las salidas los préstamos dejan de estar "sin eventos"
+    for estado, tipo in TIPO_CIERRE.items():
+        ejecutor.execute(sa.insert(PrestamoEvento).from_select(
+            ['prestamo_id', 'elemento_id', 'tipo', 'fecha', 'registrado_en'],
+            sa.select(Prestamo.id, Prestamo.elemento_id, sa.literal(tipo),
+                      sa.func.coalesce(Prestamo.fecha_devolucion, salida), sa.literal(ahora, sa.DateTime))
+            .where(Prestamo.estado == estado, sin_eventos),
+        ))
+    sin_salida = ~sa.exists().where(PrestamoEvento.prestamo_id == Prestamo.id, PrestamoEvento.tipo == 'prestamo')
+    return ejecutor.execute(sa.insert(PrestamoEvento).from_select(
+        ['prestamo_id', 'elemento_id', 'tipo', 'fecha', 'registrado_en'],
+        sa.select(Prestamo.id, Prestamo.elemento_id, sa.literal('prestamo'), salida, sa.literal(ahora, sa.DateTime))
+        .where(sin_salida),
+    )).rowcount
+
+
+def reconstruir(ejecutor):
+    """Reemplaza `prestamo_intervalos` por la proyección del registro (sesión o conexión, sin confirmar)"""
+    cierre = aliased(PrestamoEvento)
+    ejecutor.execute(sa.delete(PrestamoIntervalo))
+    return ejecutor.execute(sa.insert(PrestamoIntervalo).from_select(
+        ['prestamo_id', 'elemento_id', 'desde', 'hasta'],
+        sa.select(PrestamoEvento.prestamo_id, PrestamoEvento.elemento_id, PrestamoEvento.fecha,
+                  sa.func.coalesce(cierre.fecha, sa.literal(ABIERTO, sa.DateTime)))
+        .outerjoin(cierre, sa.and_(cierre.prestamo_id == PrestamoEvento.prestamo_id, cierre.tipo != 'prestamo'))
+        .where(PrestamoEvento.tipo == 'prestamo'),
+    )).rowcount
+
+
+def conciliar(session=None):
+    """Recalcula `disponible` desde el registro con un solo UPDATE; devuelve cuántos elementos corrigió"""
+    session = session or db.session
+    cierre = aliased(PrestamoEvento)
+    # Elementos con una salida sin devolución ni cancelación: el IN se evalúa una vez para toda la tabla
+    afuera = ElementoAudiovisual.id.in_(
+        sa.select(PrestamoEvento.elemento_id)
+        .where(PrestamoEvento.tipo == 'prestamo',
+               ~sa.exists().where(cierre.prestamo_id == PrestamoEvento.prestamo_id, cierre.tipo != 'prestamo'))
+    )
+    resultado = session.execute(
+        sa.update(ElementoAudiovisual)
+        .where(sa.or_(ElementoAudiovisual.disponible.is_(None), ElementoAudiovisual.disponible == afuera))
+        .values(disponible=~afuera, **ElementoAudiovisual.nueva_version())
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return resultado.rowcount
+
+
+def _fecha(texto):
+    return datetime.fromisoformat(texto)
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else ''
+    app = create_app()
+    with app.app_context():
+        if comando == 'conciliar':
+            print(f"Elementos corregidos: {conciliar()}")
+        elif comando == 'reconstruir':
+            filas = reconstruir(db.session)
+            db.session.commit()
+            print(f"Intervalos reconstruidos: {filas}")
+        elif comando == 'afuera':
+            momento = _fecha(argv[1]) if len(argv) > 1 else datetime.utcnow()
+            ids = afuera_en(momento)
+            placas = dict(db.session.execute(
+                sa.select(ElementoAudiovisual.id, ElementoAudiovisual.placa).where(ElementoAudiovisual.id.in_(ids[:50]))
+            ).all())
+            print(f"Elementos afuera el {momento:%Y-%m-%d %H:%M}: {len(ids)}")
+            for elemento_id in ids[:50]:
+                print(f"  {placas.get(elemento_id, elemento_id)}")
+        elif comando == 'uso' and len(argv) == 3:
+            desde, hasta = _fecha(argv[1]), _fecha(argv[2])
+            filas = uso(desde, hasta, limite=20)
+            placas = dict(db.session.execute(
+                sa.select(ElementoAudiovisual.id, ElementoAudiovisual.placa)
+                .where(ElementoAudiovisual.id.in_([fila[0] for fila in filas]))
+            ).all())
+            print(f"Elementos más usados entre {desde:%Y-%m-%d} y {hasta:%Y-%m-%d}:")
+            for elemento_id, segundos, fraccion in filas:
+                print(f"  {placas.get(elemento_id, elemento_id):<12} {segundos / 3600:>10.1f} h {fraccion:>7.1%}")
+        else:
+            print("Uso: python -m prestamos.eventos conciliar|reconstruir|afuera [FECHA]|uso DESDE HASTA")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Exportación del historial de préstamos a CSV (o XLSX) con memoria constante.
+
+Las filas se leen con un cursor del lado del servidor (`yield_per` activa
+`stream_results`) y se escriben a medida que llegan, de modo que ni la ruta
+`/prestamos/exportar` ni el comando de consola cargan el resultado completo.
+
+Uso:
+    python -m prestamos.exportar [--desde 2025-01-01] [--hasta 2025-06-30]
+                                 [--estado devuelto] [--formato csv|xlsx]
+                                 [--salida prestamos.csv]
+
+XLSX requiere el paquete opcional `openpyxl` (modo `write_only`).
+"""
+import argparse
+import csv
+import io
+import sys
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+
+from prestamos.database import db
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, Prestamo
+
+ENCABEZADOS = [
+    'ID', 'Fecha préstamo', 'Fecha devolución', 'Estado',
+    'Placa', 'Elemento', 'Tipo',
+    'Identificación', 'Persona', 'Rol', 'Email',
+    'Registrado por', 'Notas',
+]
+
+FILAS_POR_LOTE = 1000
+
+
+def parsear_fecha(valor):
+    """Convierte 'AAAA-MM-DD' en datetime; lanza ValueError si el formato no es válido"""
+    return datetime.strptime(valor, '%Y-%m-%d') if valor else None
+
+
+def consulta_exportacion(desde=None, hasta=None, estado=None):
+    """SELECT de los préstamos con sus datos relacionados, ordenado por fecha e ID.
+
+    `hasta` es inclusivo: se exportan los préstamos de ese día completo.
+    """
+    registrador = aliased(Usuario)
+    stmt = (
+        sa.select(
+            Prestamo.id, Prestamo.fecha_prestamo, Prestamo.fecha_devolucion, Prestamo.estado,
+            ElementoAudiovisual.placa, ElementoAudiovisual.nombre, ElementoAudiovisual.tipo,
+            Persona.identificacion, (Persona.nombre + ' ' + Persona.apellido), Persona.rol, Persona.email,
+            registrador.nombre, Prestamo.notas,
+        )
+        .join(ElementoAudiovisual, ElementoAudiovisual.id == Prestamo.elemento_id)
+        .join(Persona, Persona.id == Prestamo.persona_id)
+        .join(registrador, registrador.id == Prestamo.usuario_id)
+        .order_by(Prestamo.fecha_prestamo, Prestamo.id)
+    )
+    if desde:
+        stmt = stmt.where(Prestamo.fecha_prestamo >= desde)
+    if hasta:
+        stmt = stmt.where(Prestamo.fecha_prestamo < hasta + timedelta(days=1))
+    if estado:
+        stmt = stmt.where(Prestamo.estado == estado)
+    return stmt
+
+
+def filas_prestamos(desde=None, hasta=None, estado=None, session=None):
+    """Genera las filas de la exportación leyendo la base de datos por lotes"""
+    session = session or db.session
+    stmt = consulta_exportacion(desde, hasta, estado).execution_options(yield_per=FILAS_POR_LOTE)
+    for fila in session.execute(stmt):
+        yield [_formatear(valor) for valor in fila]
+
+
+def _formatear(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return '' if valor is None else valor
+
+
+def generar_csv(filas, filas_por_bloque=500):
+    """Genera el CSV en bloques de texto, incluyendo el BOM para Excel y el encabezado"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(ENCABEZADOS)
+    for numero, fila in enumerate(filas, start=1):
+        escritor.writerow(fila)
+        if numero % filas_por_bloque == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def escribir_xlsx(filas, destino):
+    """Escribe las filas en un libro XLSX en modo `write_only` (memoria constante)"""
+    try:
+        from openpyxl import Workbook
+    except ImportError as error:
+        raise RuntimeError("La exportación XLSX requiere instalar el paquete 'openpyxl'") from error
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Préstamos')
+    hoja.append(ENCABEZADOS)
+    for fila in filas:
+        hoja.append(fila)
+    libro.save(destino)
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    parser = argparse.ArgumentParser(description='Exporta el historial de préstamos.')
+    parser.add_argument('--desde', type=parsear_fecha, help='fecha inicial AAAA-MM-DD')
+    parser.add_argument('--hasta', type=parsear_fecha, help='fecha final AAAA-MM-DD (inclusive)')
+    parser.add_argument('--estado', choices=['pendiente', 'activo', 'devuelto', 'cancelado'])
+    parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--salida', default='-', help="archivo de salida ('-' para la salida estándar, solo CSV)")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        filas = filas_prestamos(args.desde, args.hasta, args.estado)
+        if args.formato == 'xlsx':
+            if args.salida == '-':
+                parser.error('XLSX requiere indicar --salida')
+            escribir_xlsx(filas, args.salida)
+        elif args.salida == '-':
+            for bloque in generar_csv(filas):
+                sys.stdout.write(bloque)
+        else:
+            with open(args.salida, 'w', encoding='utf-8', newline='') as archivo:
+                for bloque in generar_csv(filas):
+                    archivo.write(bloque)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
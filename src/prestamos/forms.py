@@ -1,7 +1,10 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, TextAreaField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from datetime import datetime, timedelta
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, SelectMultipleField, TextAreaField, DateTimeLocalField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
-from prestamos.models import Usuario, Persona, ElementoAudiovisual
+from prestamos.database import db
+from prestamos.models import Usuario, Persona, ElementoAudiovisual, TIPOS_ELEMENTO, ROLES_PERSONA
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -13,14 +16,7 @@ class LoginForm(FlaskForm):
 class ElementoForm(FlaskForm):
     placa = StringField('Número de Placa', validators=[DataRequired()])
     nombre = StringField('Nombre del Elemento', validators=[DataRequired()])
-    tipo = SelectField('Tipo', choices=[
-        ('camara', 'Cámara'),
-        ('microfono', 'Micrófono'),
-        ('tripode', 'Trípode'),
-        ('iluminacion', 'Equipo de Iluminación'),
-        ('audio', 'Equipo de Audio'),
-        ('otro', 'Otro')
-    ], validators=[DataRequired()])
+    tipo = SelectField('Tipo', choices=TIPOS_ELEMENTO, validators=[DataRequired()])
     descripcion = TextAreaField('Descripción', validators=[DataRequired()])
     submit = SubmitField('Guardar Elemento')
 
@@ -37,11 +33,7 @@ class PersonaForm(FlaskForm):
     identificacion = StringField('Identificación', validators=[DataRequired()])
     email = StringField('Email', validators=[Email()])
     telefono = StringField('Teléfono')
-    rol = SelectField('Rol', choices=[
-        ('estudiante', 'Estudiante'),
-        ('docente', 'Docente'),
-        ('administrativo', 'Administrativo')
-    ], validators=[DataRequired()])
+    rol = SelectField('Rol', choices=ROLES_PERSONA, validators=[DataRequired()])
     submit = SubmitField('Guardar Persona')
     
     def validate_identificacion(self, identificacion):
@@ -57,11 +49,79 @@ class PersonaForm(FlaskForm):
 
 
 class PrestamoForm(FlaskForm):
-    persona_id = SelectField('Persona', coerce=int, validators=[DataRequired()])
-    elemento_id = SelectField('Elemento', coerce=int, validators=[DataRequired()])
+    # Las opciones solo se usan para pintar el formulario (resultados del buscador);
+    # los IDs enviados se validan con una búsqueda por clave primaria.
+    persona_id = SelectField('Persona', coerce=int, validate_choice=False, validators=[DataRequired()])
+    elemento_id = SelectField('Elemento', coerce=int, validate_choice=False, validators=[DataRequired()])
     notas = TextAreaField('Notas o Comentarios')
     submit = SubmitField('Registrar Préstamo')
+
+    def validate_persona_id(self, persona_id):
+        self.persona = db.session.get(Persona, persona_id.data)
+        if self.persona is None:
+            raise ValidationError('La persona seleccionada no existe.')
+
+    def validate_elemento_id(self, elemento_id):
+        self.elemento = db.session.get(ElementoAudiovisual, elemento_id.data)
+        if self.elemento is None:
+            raise ValidationError('El elemento seleccionado no existe.')
     
+class PrestamoLoteForm(FlaskForm):
+    persona_id = SelectField('Persona', coerce=int, validate_choice=False, validators=[DataRequired()])
+    elemento_ids = SelectMultipleField('Elementos', coerce=int, validate_choice=False, validators=[DataRequired()])
+    notas = TextAreaField('Notas o Comentarios')
+    submit = SubmitField('Registrar Préstamos')
+
+    def __init__(self, *args, maximo=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.maximo = maximo
+
+    def validate_persona_id(self, persona_id):
+        self.persona = db.session.get(Persona, persona_id.data)
+        if self.persona is None:
+            raise ValidationError('La persona seleccionada no existe.')
+
+    def validate_elemento_ids(self, elemento_ids):
+        ids = set(elemento_ids.data)
+        if self.maximo and len(ids) > self.maximo:
+            raise ValidationError(f'Se pueden prestar como máximo {self.maximo} elementos a la vez.')
+        # Una sola consulta para todos los elementos seleccionados
+        self.elementos = ElementoAudiovisual.query.filter(ElementoAudiovisual.id.in_(ids)).all()
+        if len(self.elementos) != len(ids):
+            raise ValidationError('Alguno de los elementos seleccionados no existe.')
+
+class ReservaForm(FlaskForm):
+    persona_id = SelectField('Persona', coerce=int, validate_choice=False, validators=[DataRequired()])
+    elemento_id = SelectField('Elemento', coerce=int, validate_choice=False, validators=[DataRequired()])
+    desde = DateTimeLocalField('Desde', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
+    hasta = DateTimeLocalField('Hasta', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
+    notas = TextAreaField('Notas o Comentarios')
+    submit = SubmitField('Reservar')
+
+    def __init__(self, *args, dias_maximo=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dias_maximo = dias_maximo
+
+    def validate_persona_id(self, persona_id):
+        self.persona = db.session.get(Persona, persona_id.data)
+        if self.persona is None:
+            raise ValidationError('La persona seleccionada no existe.')
+
+    def validate_elemento_id(self, elemento_id):
+        self.elemento = db.session.get(ElementoAudiovisual, elemento_id.data)
+        if self.elemento is None:
+            raise ValidationError('El elemento seleccionado no existe.')
+
+    def validate_hasta(self, hasta):
+        if self.desde.data is None:
+            return
+        if hasta.data <= self.desde.data:
+            raise ValidationError('La fecha final debe ser posterior a la inicial.')
+        if hasta.data <= datetime.utcnow():
+            raise ValidationError('La reserva debe terminar en el futuro.')
+        if self.dias_maximo and hasta.data - self.desde.data > timedelta(days=self.dias_maximo):
+            raise ValidationError(f'Una reserva puede durar como máximo {self.dias_maximo} días.')
+
 class UsuarioForm(FlaskForm):
     nombre = StringField('Nombre', validators=[DataRequired()])
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -72,4 +132,13 @@ class UsuarioForm(FlaskForm):
     def validate_email(self, email):
         usuario = Usuario.query.filter_by(email=email.data).first()
         if usuario is not None and usuario.id != getattr(self, 'id_usuario', None):
-            raise ValidationError('Este email ya está registrado.')
\ No newline at end of file
+            raise ValidationError('Este email ya está registrado.')
+
+
+class ImportarForm(FlaskForm):
+    tipo = SelectField('Importar', choices=[
+        ('personas', 'Personas'),
+        ('elementos', 'Elementos audiovisuales')
+    ], validators=[DataRequired()])
+    archivo = FileField('Archivo CSV', validators=[FileRequired(), FileAllowed(['csv'], 'Solo se admiten archivos CSV.')])
+    submit = SubmitField('Importar')
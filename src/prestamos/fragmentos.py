@@ -0,0 +1,99 @@
+"""Caché de fragmentos de plantilla y caché de bytecode de Jinja.
+
+El bloque
+
+    {% fragmento prestamo.version_fila, prestamo.vencido %}
+      <tr>...</tr>
+    {% endfragmento %}
+
+se renderiza una vez y después se sirve el HTML guardado bajo sus
+argumentos (más la plantilla y la línea). Las claves llevan la versión de
+cada fila mostrada (`VersionFila.version_fila`): un UPDATE cambia la clave
+en vez de invalidar entradas, así que cada proceso guarda sus fragmentos en
+un LRU propio (FRAGMENTOS_MAX entradas) sin coordinarse con los demás y
+nunca sirve uno viejo. La clave tiene que incluir todo lo que cambia el HTML
+del bloque: las filas que muestra, los permisos del usuario que decidan sus
+botones y lo que dependa de la hora. Las URLs del bloque quedan con el
+prefijo (SCRIPT_NAME) de la petición que lo renderizó: se asume uno solo por
+proceso. En modo debug la caché se desactiva, para ver los cambios de las
+plantillas.
+
+La caché de bytecode (PLANTILLAS_CACHE) guarda las plantillas compiladas en
+disco: un worker nuevo las carga de ahí en vez de compilarlas de nuevo.
+"""
+from collections import Counter
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from prestamos import config
+from prestamos.cache import LRUCache
+
+
+class CacheFragmentos(LRUCache):
+    """LRU de fragmentos renderizados, con aciertos y fallos por plantilla"""
+
+    def __init__(self, max_entradas):
+        super().__init__(max_entradas)
+        self.aciertos = Counter()
+        self.fallos = Counter()
+
+    def leer(self, clave, plantilla):
+        """Como `get`, pero cuenta el acierto o el fallo de `plantilla` (sin TTL: nunca expiran)"""
+        with self._lock:
+            html = self._datos.get(clave)
+            if html is None:
+                self.fallos[plantilla] += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos[plantilla] += 1
+            return html[1]
+
+    def estadisticas(self):
+        with self._lock:
+            return {plantilla: {'aciertos': self.aciertos[plantilla], 'fallos': self.fallos[plantilla]}
+                    for plantilla in sorted(self.aciertos.keys() | self.fallos.keys())}
+
+
+class FragmentoExtension(Extension):
+    """Etiqueta `{% fragmento clave, ... %}...{% endfragmento %}`"""
+    tags = {'fragmento'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        # Sin caché (None) el bloque se renderiza siempre
+        environment.extend(fragmentos=None)
+
+    def parse(self, parser):
+        linea = next(parser.stream).lineno
+        claves = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            claves.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(('name:endfragmento',), drop_needle=True)
+        origen = nodes.Tuple([nodes.Const(parser.name), nodes.Const(linea)], 'load')
+        llamada = self.call_method('_renderizar', [origen, nodes.Tuple(claves, 'load')])
+        return nodes.CallBlock(llamada, [], [], cuerpo).set_lineno(linea)
+
+    def _renderizar(self, origen, claves, caller):
+        fragmentos = self.environment.fragmentos
+        if fragmentos is None:
+            return caller()
+        clave = (origen, claves)
+        html = fragmentos.leer(clave, origen[0])
+        if html is None:
+            html = caller()
+            fragmentos.set(clave, html)
+        return html
+
+
+def instalar(app):
+    """Agrega la etiqueta `fragmento` y la caché de bytecode al entorno de Jinja de `app`"""
+    app.jinja_env.add_extension(FragmentoExtension)
+    maximo = app.config.get('FRAGMENTOS_MAX', config.FRAGMENTOS_MAX)
+    if maximo > 0 and not app.debug:
+        app.jinja_env.fragmentos = CacheFragmentos(maximo)
+
+    carpeta = app.config.get('PLANTILLAS_CACHE', config.PLANTILLAS_CACHE)
+    if carpeta.lower() != 'off':
+        # Vacío: la carpeta temporal por usuario de Jinja (_jinja2-cache-<uid>)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(carpeta or None)
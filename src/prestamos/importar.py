@@ -0,0 +1,308 @@
+"""Importación masiva de personas y elementos desde CSV.
+
+El archivo se procesa en streaming y por lotes: cada lote se valida fila a
+fila, se compara contra la base de datos con una sola consulta por lote
+(`identificacion`/`email` o `placa`/`slug` ... `IN (...)`) y se escribe con
+`COPY` en PostgreSQL (psycopg 3) o con un `INSERT` `executemany` en los demás
+motores. Las filas con errores se informan con su número de línea y no
+impiden importar las demás.
+
+Columnas esperadas:
+    personas:  nombre, apellido, identificacion, email, telefono, rol
+    elementos: placa, nombre, tipo, descripcion
+
+Uso:
+    python -m prestamos.importar personas estudiantes.csv
+    python -m prestamos.importar elementos equipos.csv --usuario admin@prestamos.com
+"""
+import argparse
+import csv
+import functools
+import re
+import sys
+import time
+
+import sqlalchemy as sa
+from email_validator import validate_email, EmailNotValidError
+from slugify import slugify
+
+from prestamos.cache import registrar_escritura
+from prestamos.database import db
+from prestamos.models import Usuario, ElementoAudiovisual, Persona, TIPOS_ELEMENTO, ROLES_PERSONA, SLUG_BASE_MAX
+
+TAMANO_LOTE = 5000
+
+COLUMNAS_PERSONAS = ['nombre', 'apellido', 'identificacion', 'email', 'telefono', 'rol']
+COLUMNAS_ELEMENTOS = ['placa', 'nombre', 'tipo', 'descripcion']
+
+# Se aceptan tanto la clave ('camara') como la etiqueta ('Cámara') del formulario
+_TIPOS = {clave: clave for clave, _ in TIPOS_ELEMENTO}
+_TIPOS.update({etiqueta.lower(): clave for clave, etiqueta in TIPOS_ELEMENTO})
+_ROLES = {clave for clave, _ in ROLES_PERSONA}
+
+# Parte local ASCII sin comillas (dot-atom, RFC 5322); lo demás va a email_validator
+_EMAIL_SIMPLE = re.compile(r"([A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*)@(.+)")
+
+
+class ErrorImportacion(Exception):
+    """El archivo no tiene el formato esperado (por ejemplo, faltan columnas)"""
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: filas leídas, insertadas y errores por línea"""
+
+    def __init__(self):
+        self.leidas = 0
+        self.insertadas = 0
+        self.errores = []
+        self.segundos = 0.0
+
+    def error(self, linea, mensaje):
+        self.errores.append((linea, mensaje))
+
+    @property
+    def filas_por_segundo(self):
+        return self.leidas / self.segundos if self.segundos else 0.0
+
+
+def _lotes(lector, tamano):
+    lote = []
+    # La línea 1 es el encabezado
+    for linea, fila in enumerate(lector, start=2):
+        lote.append((linea, fila))
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _texto(fila, columna, maximo, obligatorio=True):
+    valor = (fila.get(columna) or '').strip()
+    if obligatorio and not valor:
+        raise ValueError(f"'{columna}' es obligatorio")
+    if len(valor) > maximo:
+        raise ValueError(f"'{columna}' supera los {maximo} caracteres")
+    return valor or None
+
+
+@functools.lru_cache(maxsize=4096)
+def _dominio_valido(dominio):
+    """Valida el dominio una sola vez: en un CSV casi todos los correos comparten unos pocos"""
+    try:
+        validate_email(f'x@{dominio}', check_deliverability=False)
+    except EmailNotValidError:
+        return False
+    return True
+
+
+def _email_valido(email):
+    coincidencia = _EMAIL_SIMPLE.fullmatch(email)
+    if coincidencia and len(coincidencia.group(1)) <= 64:
+        return _dominio_valido(coincidencia.group(2))
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError:
+        return False
+    return True
+
+
+def _validar_persona(fila):
+    email = _texto(fila, 'email', 100, obligatorio=False)
+    if email and not _email_valido(email):
+        raise ValueError(f"email inválido: {email}")
+    rol = (fila.get('rol') or '').strip().lower()
+    if rol not in _ROLES:
+        raise ValueError(f"rol inválido: '{rol}'")
+    return {
+        'nombre': _texto(fila, 'nombre', 100),
+        'apellido': _texto(fila, 'apellido', 100),
+        'identificacion': _texto(fila, 'identificacion', 20),
+        'email': email,
+        'telefono': _texto(fila, 'telefono', 20, obligatorio=False),
+        'rol': rol,
+    }
+
+
+def _validar_elemento(fila):
+    tipo = _TIPOS.get((fila.get('tipo') or '').strip().lower())
+    if tipo is None:
+        raise ValueError(f"tipo inválido: '{fila.get('tipo')}'")
+    return {
+        'placa': _texto(fila, 'placa', 20),
+        'nombre': _texto(fila, 'nombre', 100),
+        'tipo': tipo,
+        'descripcion': _texto(fila, 'descripcion', 10_000, obligatorio=False),
+        'disponible': True,
+    }
+
+
+def _existentes(session, columna, valores):
+    """Valores de `columna` que ya existen en la base de datos (una consulta)"""
+    valores = [v for v in valores if v]
+    if not valores:
+        return set()
+    return set(session.scalars(sa.select(columna).where(columna.in_(valores))))
+
+
+def _escribir(session, modelo, columnas, filas):
+    """Inserta las filas con COPY (PostgreSQL + psycopg 3) o con executemany"""
+    conexion = session.connection()
+    driver = conexion.connection.driver_connection
+    if conexion.dialect.name == 'postgresql' and hasattr(driver, 'cursor') and conexion.dialect.driver == 'psycopg':
+        tabla = modelo.__table__.name
+        with driver.cursor() as cursor:
+            with cursor.copy(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN") as copy:
+                for fila in filas:
+                    copy.write_row([fila[c] for c in columnas])
+        # COPY no pasa por los eventos del ORM: se registra a mano para que el commit suba la versión
+        # del catálogo (ETag) e invalide la caché
+        registrar_escritura(session, modelo)
+    else:
+        session.execute(sa.insert(modelo), filas)
+
+
+def importar_personas(archivo, tamano_lote=TAMANO_LOTE, session=None):
+    """Importa personas desde un archivo CSV abierto en modo texto"""
+    session = session or db.session
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    lector = csv.DictReader(archivo)
+    faltantes = set(COLUMNAS_PERSONAS) - set(lector.fieldnames or [])
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas: {', '.join(sorted(faltantes))}")
+
+    vistas_id, vistos_email = set(), set()
+    for lote in _lotes(lector, tamano_lote):
+        validas = []
+        for linea, fila in lote:
+            resultado.leidas += 1
+            try:
+                validas.append((linea, _validar_persona(fila)))
+            except ValueError as error:
+                resultado.error(linea, str(error))
+
+        ids_db = _existentes(session, Persona.identificacion, [p['identificacion'] for _, p in validas])
+        emails_db = _existentes(session, Persona.email, [p['email'] for _, p in validas])
+        nuevas = []
+        for linea, persona in validas:
+            identificacion, email = persona['identificacion'], persona['email']
+            if identificacion in ids_db or identificacion in vistas_id:
+                resultado.error(linea, f"identificación duplicada: {identificacion}")
+            elif email and (email in emails_db or email in vistos_email):
+                resultado.error(linea, f"email duplicado: {email}")
+            else:
+                vistas_id.add(identificacion)
+                if email:
+                    vistos_email.add(email)
+                nuevas.append(persona)
+
+        if nuevas:
+            _escribir(session, Persona, COLUMNAS_PERSONAS, nuevas)
+            session.commit()
+            resultado.insertadas += len(nuevas)
+
+    resultado.errores.sort()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def _asignar_slugs(session, elementos):
+    """Genera los slugs de un lote con una sola consulta de colisiones"""
+    for elemento in elementos:
+        elemento['slug'] = slugify(f"{elemento['nombre']}-{elemento['placa']}")[:SLUG_BASE_MAX]
+    ocupados = _existentes(session, ElementoAudiovisual.slug, [e['slug'] for e in elementos])
+    for elemento in elementos:
+        base = elemento['slug']
+        # Las colisiones son raras (la placa forma parte del slug); el sufijo lo reserva SlugContador
+        while elemento['slug'] in ocupados:
+            elemento['slug'] = ElementoAudiovisual.slug_sufijado(base, session)
+            # Un slug sin sufijo de otro elemento podría coincidir con `base-<n>`
+            ocupados |= _existentes(session, ElementoAudiovisual.slug, [elemento['slug']])
+        ocupados.add(elemento['slug'])
+
+
+def importar_elementos(archivo, usuario_id, tamano_lote=TAMANO_LOTE, session=None):
+    """Importa elementos audiovisuales desde un archivo CSV abierto en modo texto"""
+    session = session or db.session
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    lector = csv.DictReader(archivo)
+    faltantes = set(COLUMNAS_ELEMENTOS) - set(lector.fieldnames or [])
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas: {', '.join(sorted(faltantes))}")
+
+    vistas = set()
+    for lote in _lotes(lector, tamano_lote):
+        validos = []
+        for linea, fila in lote:
+            resultado.leidas += 1
+            try:
+                validos.append((linea, _validar_elemento(fila)))
+            except ValueError as error:
+                resultado.error(linea, str(error))
+
+        placas_db = _existentes(session, ElementoAudiovisual.placa, [e['placa'] for _, e in validos])
+        nuevos = []
+        for linea, elemento in validos:
+            if elemento['placa'] in placas_db or elemento['placa'] in vistas:
+                resultado.error(linea, f"placa duplicada: {elemento['placa']}")
+            else:
+                vistas.add(elemento['placa'])
+                elemento['user_id'] = usuario_id
+                nuevos.append(elemento)
+
+        if nuevos:
+            _asignar_slugs(session, nuevos)
+            _escribir(session, ElementoAudiovisual,
+                      COLUMNAS_ELEMENTOS + ['disponible', 'slug', 'user_id'], nuevos)
+            session.commit()
+            resultado.insertadas += len(nuevos)
+
+    resultado.errores.sort()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    parser = argparse.ArgumentParser(description='Importa personas o elementos desde un archivo CSV.')
+    parser.add_argument('tipo', choices=['personas', 'elementos'])
+    parser.add_argument('archivo', help="archivo CSV en UTF-8 ('-' para la entrada estándar)")
+    parser.add_argument('--usuario', help='email del usuario dueño de los elementos (por defecto, el primer admin)')
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='filas por lote')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        archivo = sys.stdin if args.archivo == '-' else open(args.archivo, encoding='utf-8-sig', newline='')
+        try:
+            if args.tipo == 'personas':
+                resultado = importar_personas(archivo, args.lote)
+            else:
+                if args.usuario:
+                    usuario = Usuario.get_by_email(args.usuario)
+                else:
+                    usuario = Usuario.query.filter_by(es_admin=True).order_by(Usuario.id).first()
+                if usuario is None:
+                    parser.error('No se encontró el usuario dueño de los elementos')
+                resultado = importar_elementos(archivo, usuario.id, args.lote)
+        except ErrorImportacion as error:
+            print(f"Error: {error}")
+            return 1
+        finally:
+            if archivo is not sys.stdin:
+                archivo.close()
+
+    print(f"{resultado.leidas} filas leídas, {resultado.insertadas} insertadas, "
+          f"{len(resultado.errores)} con errores ({resultado.filas_por_segundo:.0f} filas/s)")
+    for linea, mensaje in resultado.errores[:50]:
+        print(f"  línea {linea}: {mensaje}")
+    if len(resultado.errores) > 50:
+        print(f"  ... y {len(resultado.errores) - 50} errores más")
+    return 0 if not resultado.errores else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
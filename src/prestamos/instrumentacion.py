@@ -0,0 +1,154 @@
+"""Medición por petición: consultas SQL, tiempo en la base de datos y tiempo de render.
+
+Los eventos `before_cursor_execute`/`after_cursor_execute` de SQLAlchemy
+(de todos los engines, también la réplica) y las señales de Flask
+(`request_started`, `before_render_template`, `template_rendered`,
+`request_finished`) acumulan los tiempos de cada petición en `g`. Al terminar:
+
+- se agregan a histogramas por endpoint, publicados en /metrics;
+- la respuesta lleva la cabecera `Server-Timing` (visible en la pestaña
+  Red del navegador) si SERVER_TIMING está activo;
+- toda sentencia que tarde más de SQL_LENTA_MS se registra en el logger
+  `prestamos.sql_lenta` con su endpoint.
+
+El código fuera de una petición (trabajador, scripts) solo pasa por el
+registro de consultas lentas.
+"""
+import bisect
+import logging
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, request, request_finished, request_started
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from prestamos import config
+
+logger = logging.getLogger('prestamos.sql_lenta')
+
+_BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_BUCKETS_CONSULTAS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Histograma:
+    """Histograma acumulativo por endpoint, al estilo de Prometheus"""
+
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, endpoint, valor):
+        with self._lock:
+            serie = self._series.get(endpoint)
+            if serie is None:
+                # Un contador por bucket más el +Inf, la suma y la cantidad
+                serie = self._series[endpoint] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def lineas(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {endpoint: (list(conteos), suma, total) for endpoint, (conteos, suma, total) in self._series.items()}
+        for endpoint, (conteos, suma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+            lineas.append(f'{self.nombre}_sum{{endpoint="{endpoint}"}} {suma}')
+            lineas.append(f'{self.nombre}_count{{endpoint="{endpoint}"}} {total}')
+        return lineas
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+
+HISTOGRAMAS = {
+    'total': Histograma('prestamos_http_duracion_segundos', 'Duración de las peticiones', _BUCKETS_SEGUNDOS),
+    'consultas': Histograma('prestamos_http_consultas', 'Consultas SQL por petición', _BUCKETS_CONSULTAS),
+    'sql': Histograma('prestamos_http_sql_segundos', 'Tiempo en la base de datos por petición', _BUCKETS_SEGUNDOS),
+    'render': Histograma('prestamos_http_render_segundos', 'Tiempo de render de plantillas por petición',
+                         _BUCKETS_SEGUNDOS),
+}
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'desconocido'
+    return '-'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_de_consulta(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if contexto is not None:
+        contexto._inicio_consulta = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _despues_de_consulta(conexion, cursor, sentencia, parametros, contexto, executemany):
+    inicio = getattr(contexto, '_inicio_consulta', None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    if has_app_context() and 'consultas' in g:
+        g.consultas += 1
+        g.sql_segundos += duracion
+    if config.SQL_LENTA_MS and duracion * 1000 >= config.SQL_LENTA_MS:
+        logger.warning("%.1f ms en %s: %s", duracion * 1000, _endpoint(), ' '.join(sentencia.split())[:1000])
+
+
+def _inicio_peticion(app, **extra):
+    g.inicio_peticion = time.perf_counter()
+    g.consultas = 0
+    g.sql_segundos = 0.0
+    g.render_segundos = 0.0
+
+
+def _antes_de_render(app, template, context, **extra):
+    g.inicio_render = time.perf_counter()
+
+
+def _despues_de_render(app, template, context, **extra):
+    inicio = g.pop('inicio_render', None)
+    if inicio is not None and 'render_segundos' in g:
+        g.render_segundos += time.perf_counter() - inicio
+
+
+def _fin_peticion(app, response, **extra):
+    if 'inicio_peticion' not in g:
+        return
+    total = time.perf_counter() - g.inicio_peticion
+    endpoint = _endpoint()
+    HISTOGRAMAS['total'].observar(endpoint, total)
+    HISTOGRAMAS['consultas'].observar(endpoint, g.consultas)
+    HISTOGRAMAS['sql'].observar(endpoint, g.sql_segundos)
+    HISTOGRAMAS['render'].observar(endpoint, g.render_segundos)
+    if config.SERVER_TIMING:
+        response.headers['Server-Timing'] = (
+            f'db;dur={g.sql_segundos * 1000:.1f};desc="{g.consultas} consultas", '
+            f'render;dur={g.render_segundos * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+
+def instalar(app):
+    """Conecta las señales de Flask de `app` (los eventos de SQLAlchemy son globales)"""
+    request_started.connect(_inicio_peticion, app)
+    before_render_template.connect(_antes_de_render, app)
+    template_rendered.connect(_despues_de_render, app)
+    request_finished.connect(_fin_peticion, app)
+
+
+def lineas_prometheus():
+    lineas = []
+    for histograma in HISTOGRAMAS.values():
+        lineas.extend(histograma.lineas())
+    return lineas
@@ -0,0 +1,67 @@
+"""Métricas de la aplicación en formato de texto de Prometheus (ruta /metrics).
+
+Incluye el estado del pool de conexiones (para dimensionar DB_POOL_SIZE y
+DB_MAX_OVERFLOW), los contadores de la caché de consultas y de la de
+fragmentos de plantilla y los histogramas por endpoint de
+prestamos.instrumentacion.
+"""
+from prestamos.cache import cache
+from prestamos.database import estado_pool
+from prestamos.instrumentacion import lineas_prometheus
+
+# (clave en estado_pool, nombre de la métrica, tipo, ayuda)
+_METRICAS_POOL = [
+    ('tamano', 'prestamos_db_pool_tamano', 'gauge', 'Conexiones base del pool (DB_POOL_SIZE)'),
+    ('en_uso', 'prestamos_db_pool_en_uso', 'gauge', 'Conexiones prestadas a peticiones en este momento'),
+    ('libres', 'prestamos_db_pool_libres', 'gauge', 'Conexiones abiertas y libres en el pool'),
+    ('desborde', 'prestamos_db_pool_desborde', 'gauge', 'Conexiones abiertas por encima de DB_POOL_SIZE'),
+    ('desborde_max', 'prestamos_db_pool_desborde_max', 'gauge', 'Máximo de conexiones de desborde (DB_MAX_OVERFLOW)'),
+    ('checkouts', 'prestamos_db_pool_checkouts_total', 'counter', 'Conexiones entregadas por el pool'),
+    ('espera_total', 'prestamos_db_pool_espera_segundos_total', 'counter',
+     'Tiempo total esperando una conexión (incluye abrirla)'),
+    ('espera_max', 'prestamos_db_pool_espera_max_segundos', 'gauge', 'Mayor espera por una conexión'),
+    ('agotados', 'prestamos_db_pool_agotados_total', 'counter',
+     'Peticiones que superaron DB_POOL_TIMEOUT sin conexión'),
+]
+
+_METRICAS_CACHE = [
+    ('aciertos', 'prestamos_cache_aciertos_total', 'Lecturas servidas desde la caché'),
+    ('fallos', 'prestamos_cache_fallos_total', 'Lecturas que tuvieron que consultar la base de datos'),
+    ('invalidaciones', 'prestamos_cache_invalidaciones_total', 'Invalidaciones por escrituras confirmadas'),
+]
+
+
+def _metrica(lineas, nombre, tipo, ayuda, muestras):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} {tipo}")
+    for etiquetas, valor in muestras:
+        texto = ','.join(f'{clave}="{valor_etiqueta}"' for clave, valor_etiqueta in etiquetas.items())
+        lineas.append(f"{nombre}{{{texto}}} {valor}" if texto else f"{nombre} {valor}")
+
+
+_METRICAS_FRAGMENTOS = [
+    ('aciertos', 'prestamos_fragmentos_aciertos_total', 'Fragmentos de plantilla servidos desde la caché'),
+    ('fallos', 'prestamos_fragmentos_fallos_total', 'Fragmentos de plantilla que hubo que renderizar'),
+]
+
+
+def texto_prometheus(engine, fragmentos=None):
+    lineas = []
+    estado = estado_pool(engine)
+    _metrica(lineas, 'prestamos_db_pool_info', 'gauge', 'Clase del pool de conexiones',
+             [({'clase': estado['clase']}, 1)])
+    for clave, nombre, tipo, ayuda in _METRICAS_POOL:
+        if clave in estado:
+            _metrica(lineas, nombre, tipo, ayuda, [({}, estado[clave])])
+
+    estadisticas = cache.estadisticas()
+    for clave, nombre, ayuda in _METRICAS_CACHE:
+        _metrica(lineas, nombre, 'counter', ayuda,
+                 [({'espacio': espacio}, valores[clave]) for espacio, valores in estadisticas.items()])
+    if fragmentos is not None:
+        estadisticas = fragmentos.estadisticas()
+        for clave, nombre, ayuda in _METRICAS_FRAGMENTOS:
+            _metrica(lineas, nombre, 'counter', ayuda,
+                     [({'plantilla': plantilla}, valores[clave]) for plantilla, valores in estadisticas.items()])
+    lineas.extend(lineas_prometheus())
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,194 @@
+"""Migraciones versionadas del esquema.
+
+Cada migración se registra con `@migracion(version, descripcion)` y se aplica
+una sola vez sobre bases de datos existentes, sin borrar ni recrear tablas
+(a diferencia de `create_db.py`). Las versiones aplicadas se guardan en la
+tabla `schema_migraciones`.
+
+Uso:
+    python -m prestamos.migraciones            # aplica las pendientes
+    python -m prestamos.migraciones estado     # muestra las versiones
+"""
+import sys
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from prestamos.config import PRESTAMO_DIAS
+from prestamos.database import db
+from prestamos.eventos import desde_prestamos, instalar_solo_insercion, reconstruir as reconstruir_intervalos
+from prestamos.models import Prestamo
+from prestamos.reservas import instalar_exclusion
+from prestamos.search import instalar_busqueda, reinstalar_triggers_actualizacion
+from prestamos.tablero import reconstruir
+
+MIGRACIONES = []
+
+_metadata = sa.MetaData()
+tabla_versiones = sa.Table(
+    'schema_migraciones', _metadata,
+    sa.Column('version', sa.Integer, primary_key=True),
+    sa.Column('descripcion', sa.String(200), nullable=False),
+    sa.Column('aplicada_en', sa.DateTime, nullable=False),
+)
+
+
+def migracion(version, descripcion):
+    """Registra una función `f(conexion)` como la migración `version`"""
+    def decorador(funcion):
+        MIGRACIONES.append((version, descripcion, funcion))
+        MIGRACIONES.sort(key=lambda m: m[0])
+        return funcion
+    return decorador
+
+
+def _crear_indices(conexion, *nombres):
+    """Crea (si no existen) los índices declarados en los modelos con esos nombres"""
+    indices = {indice.name: indice for tabla in db.metadata.tables.values() for indice in tabla.indexes}
+    for nombre in nombres:
+        indices[nombre].create(conexion, checkfirst=True)
+
+
+@migracion(1, 'Índices para filtros y ordenamientos frecuentes')
+def _indices_consultas(conexion):
+    _crear_indices(
+        conexion,
+        'ix_prestamo_fecha_id',
+        'ix_prestamo_usuario_fecha',
+        'ix_prestamo_elemento',
+        'ix_prestamo_persona',
+        'ix_prestamo_estado',
+        'ix_prestamo_activos',
+        'ix_elementos_disponible_tipo',
+        'ix_elementos_disponibles',
+        'ix_persona_email',
+        'ix_persona_nombre',
+    )
+
+
+@migracion(2, 'Índices de búsqueda de texto (pg_trgm / FTS5)')
+def _indices_busqueda(conexion):
+    instalar_busqueda(conexion)
+
+
+@migracion(3, 'Contadores de sufijos de slug e índice de prefijo (PostgreSQL)')
+def _contadores_slug(conexion):
+    db.metadata.tables['slug_contadores'].create(conexion, checkfirst=True)
+    _crear_indices(conexion, 'ix_elementos_slug_prefijo')
+
+
+@migracion(4, 'Contadores del tablero de administración')
+def _contadores_tablero(conexion):
+    db.metadata.tables['contadores_tablero'].create(conexion, checkfirst=True)
+    reconstruir(conexion)
+
+
+def _agregar_columnas(conexion, tabla, *nombres):
+    """Agrega (si no existen) las columnas de `tabla` declaradas en los modelos con esos nombres"""
+    existentes = {columna['name'] for columna in sa.inspect(conexion).get_columns(tabla)}
+    preparador = conexion.dialect.ddl_compiler(conexion.dialect, None)
+    for nombre in nombres:
+        if nombre not in existentes:
+            columna = db.metadata.tables[tabla].c[nombre]
+            conexion.execute(sa.text(f"ALTER TABLE {tabla} ADD COLUMN {preparador.get_column_specification(columna)}"))
+
+
+@migracion(5, 'Fecha de vencimiento de préstamos y cola de trabajos')
+def _vencimientos_y_trabajos(conexion):
+    _agregar_columnas(conexion, 'prestamo', 'fecha_vencimiento', 'aviso_vencido_en')
+    if conexion.dialect.name == 'sqlite':
+        vence = sa.func.datetime(Prestamo.fecha_prestamo, f'+{PRESTAMO_DIAS} days')
+    else:
+        vence = Prestamo.fecha_prestamo + sa.func.make_interval(0, 0, 0, PRESTAMO_DIAS)
+    conexion.execute(
+        sa.update(Prestamo.__table__)
+        .where(Prestamo.fecha_vencimiento.is_(None), Prestamo.fecha_prestamo.isnot(None))
+        .values(fecha_vencimiento=vence)
+    )
+    _crear_indices(conexion, 'ix_prestamo_vencimiento')
+    db.metadata.tables['trabajos'].create(conexion, checkfirst=True)
+
+
+@migracion(6, 'Versiones de elementos y del catálogo para ETag')
+def _versiones(conexion):
+    _agregar_columnas(conexion, 'elementos_audiovisuales', 'version', 'actualizado_en')
+    db.metadata.tables['versiones'].create(conexion, checkfirst=True)
+
+
+@migracion(7, 'Registro de eventos de préstamo y proyección de intervalos')
+def _eventos_prestamo(conexion):
+    db.metadata.tables['prestamo_eventos'].create(conexion, checkfirst=True)
+    db.metadata.tables['prestamo_intervalos'].create(conexion, checkfirst=True)
+    instalar_solo_insercion(conexion)
+    desde_prestamos(conexion)
+    reconstruir_intervalos(conexion)
+
+
+@migracion(8, 'Reservas de elementos con exclusión de solapamientos (PostgreSQL)')
+def _reservas(conexion):
+    db.metadata.tables['reservas'].create(conexion, checkfirst=True)
+    instalar_exclusion(conexion)
+
+
+@migracion(9, 'Versiones de préstamos, personas y usuarios para la caché de fragmentos')
+def _versiones_filas(conexion):
+    for tabla in ('prestamo', 'persona', 'usuario'):
+        _agregar_columnas(conexion, tabla, 'version', 'actualizado_en')
+
+
+@migracion(10, 'Reindexar la búsqueda FTS5 solo al cambiar las columnas indexadas (SQLite)')
+def _triggers_busqueda(conexion):
+    reinstalar_triggers_actualizacion(conexion)
+
+
+def versiones_aplicadas(engine):
+    """Devuelve el conjunto de versiones ya aplicadas en la base de datos"""
+    tabla_versiones.create(engine, checkfirst=True)
+    with engine.connect() as conexion:
+        return {fila[0] for fila in conexion.execute(sa.select(tabla_versiones.c.version))}
+
+
+def aplicar_migraciones(engine, verbose=True):
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción"""
+    aplicadas = versiones_aplicadas(engine)
+    nuevas = []
+    for version, descripcion, funcion in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        with engine.begin() as conexion:
+            funcion(conexion)
+            conexion.execute(tabla_versiones.insert().values(
+                version=version, descripcion=descripcion, aplicada_en=datetime.utcnow()
+            ))
+        nuevas.append(version)
+        if verbose:
+            print(f"Migración {version} aplicada: {descripcion}")
+    return nuevas
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else 'aplicar'
+    app = create_app()
+    with app.app_context():
+        if comando == 'estado':
+            aplicadas = versiones_aplicadas(db.engine)
+            for version, descripcion, _ in MIGRACIONES:
+                marca = 'x' if version in aplicadas else ' '
+                print(f"[{marca}] {version:03d} {descripcion}")
+        elif comando == 'aplicar':
+            if not sa.inspect(db.engine).has_table('prestamo'):
+                print("La base de datos no tiene tablas; inicialícela con 'python -m prestamos.db_init'.")
+                return 1
+            if not aplicar_migraciones(db.engine):
+                print("La base de datos ya está al día.")
+        else:
+            print(f"Comando desconocido: {comando}. Use 'aplicar' o 'estado'.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
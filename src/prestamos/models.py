@@ -1,12 +1,58 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from prestamos.database import db
-from slugify import slugify
+from prestamos.seguridad import generar_hash, verificar_password, necesita_rehash
+from sqlalchemy import and_, or_, func, cast, event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from flask import url_for
+import base64
+import re
 
-class Usuario(UserMixin, db.Model):
+# El slug es `nombre-placa` (más un sufijo numérico si colisiona) y cabe en los 150 caracteres de la columna
+SLUG_BASE_MAX = 140
+SLUG_REINTENTOS = 5
+
+TIPOS_ELEMENTO = [
+    ('camara', 'Cámara'),
+    ('microfono', 'Micrófono'),
+    ('tripode', 'Trípode'),
+    ('iluminacion', 'Equipo de Iluminación'),
+    ('audio', 'Equipo de Audio'),
+    ('otro', 'Otro')
+]
+
+ROLES_PERSONA = [
+    ('estudiante', 'Estudiante'),
+    ('docente', 'Docente'),
+    ('administrativo', 'Administrativo')
+]
+
+class VersionFila:
+    """Versión de la fila: sube con cada UPDATE (ETags y claves de la caché de fragmentos)"""
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    actualizado_en = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def version_fila(self):
+        """Identifica el contenido actual de la fila; actualizado_en distingue un id reutilizado"""
+        return (self.id, self.version, self.actualizado_en)
+
+    @classmethod
+    def nueva_version(cls):
+        """Valores que agregan los UPDATE masivos (`update(Modelo).values(...)`)"""
+        return {'version': cls.version + 1, 'actualizado_en': datetime.utcnow()}
+
+@event.listens_for(VersionFila, 'before_update', propagate=True)
+def _subir_version(mapper, conexion, fila):
+    # Los UPDATE por el ORM (formularios de edición); los masivos usan Modelo.nueva_version()
+    if db.session.is_modified(fila, include_collections=False):
+        for campo, valor in type(fila).nueva_version().items():
+            setattr(fila, campo, valor)
+
+class Usuario(VersionFila, UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
@@ -16,10 +62,15 @@ class Usuario(UserMixin, db.Model):
     elementos = db.relationship('ElementoAudiovisual', backref='usuario', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verifica la contraseña; si el hash usa otra política, lo regenera (queda pendiente de commit)"""
+        if not verificar_password(self.password_hash, password):
+            return False
+        if necesita_rehash(self.password_hash):
+            self.password_hash = generar_hash(password)
+        return True
 
     def save(self):
         db.session.add(self)
@@ -33,8 +84,33 @@ class Usuario(UserMixin, db.Model):
     def get_by_email(email):
         return Usuario.query.filter_by(email=email).first()
 
-class ElementoAudiovisual(db.Model):
+class Identidad(UserMixin):
+    """Copia de solo lectura de los datos de sesión de un Usuario (lo que usa `current_user`)"""
+
+    def __init__(self, id, nombre, email, es_admin):
+        self.id = id
+        self.nombre = nombre
+        self.email = email
+        self.es_admin = es_admin
+
+    @staticmethod
+    def datos(usuario):
+        """Campos de la identidad como dict, apto para guardarse en la caché (también en Redis)"""
+        return {'id': usuario.id, 'nombre': usuario.nombre, 'email': usuario.email,
+                'es_admin': bool(usuario.es_admin)}
+
+class ElementoAudiovisual(VersionFila, db.Model):
     __tablename__ = 'elementos_audiovisuales'
+    __table_args__ = (
+        db.Index('ix_elementos_disponible_tipo', 'disponible', 'tipo'),
+        # Índice parcial: solo los elementos que se pueden prestar
+        db.Index('ix_elementos_disponibles', 'nombre',
+                 postgresql_where=db.text('disponible'),
+                 sqlite_where=db.text('disponible = 1')),
+        # Búsqueda por prefijo de slug (LIKE 'base-%') en PostgreSQL; SQLite usa GLOB sobre el índice único
+        db.Index('ix_elementos_slug_prefijo', 'slug',
+                 postgresql_ops={'slug': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     placa = db.Column(db.String(20), unique=True, nullable=False)
@@ -44,42 +120,123 @@ class ElementoAudiovisual(db.Model):
     disponible = db.Column(db.Boolean, default=True)
     slug = db.Column(db.String(150), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='CASCADE'), nullable=False)
+    # `version` y `actualizado_en` (VersionFila) dan los ETag de /elemento/<slug>/ (ver prestamos.condicional)
     prestamos = db.relationship('Prestamo', backref='elemento', lazy=True)
 
     def _generate_unique_slug(self):
+        from slugify import slugify
         base = slugify(f"{self.nombre}-{self.placa}") if self.nombre else slugify(self.placa)
-        candidate = base
-        index = 1
-        while ElementoAudiovisual.query.filter_by(slug=candidate).first():
-            candidate = f"{base}-{index}"
-            index += 1
-        return candidate
+        return ElementoAudiovisual.slug_libre(base[:SLUG_BASE_MAX])
+
+    @staticmethod
+    def slug_libre(base, session=None):
+        """Primer slug libre para `base` (base, base-1, base-2, ...) en un número fijo de consultas.
+
+        Si `base` está tomado, el sufijo sale de `SlugContador` con un único
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING, que es atómico aunque
+        varias transacciones pidan la misma base a la vez.
+        """
+        session = session or db.session
+        columna = ElementoAudiovisual.slug
+        consulta = db.select(
+            db.select(columna).where(columna == base).exists(),
+            db.select(SlugContador.ultimo).where(SlugContador.base == base).scalar_subquery(),
+        )
+        # Sin autoflush: el elemento pendiente todavía no tiene slug
+        with session.no_autoflush:
+            existe, ultimo = session.execute(consulta).one()
+            if not existe:
+                return base
+            return ElementoAudiovisual.slug_sufijado(base, session, ultimo)
+
+    @staticmethod
+    def slug_sufijado(base, session=None, ultimo=None):
+        """Reserva `base-<n>` con el siguiente `n` del contador de esa base"""
+        session = session or db.session
+        if ultimo is None:
+            ultimo = session.scalar(db.select(SlugContador.ultimo).where(SlugContador.base == base))
+        if ultimo is None:
+            # Primera colisión de esta base: el contador arranca en el mayor sufijo existente
+            ultimo = session.scalar(SlugContador.sufijo_maximo(base, session.get_bind().dialect.name)) or 0
+        return f"{base}-{SlugContador.siguiente(base, ultimo + 1, session)}"
 
     def save(self):
-        if not getattr(self, 'slug', None):
-            self.slug = self._generate_unique_slug()
-        db.session.add(self)
-        try:
-            db.session.commit()
-        except IntegrityError:
-            db.session.rollback()
-            # Reintentar con slug único
-            self.slug = self._generate_unique_slug()
-            db.session.add(self)
-            db.session.commit()
+        """Guarda el elemento; si otra transacción tomó el mismo slug, asigna otro y reintenta"""
+        for _ in range(SLUG_REINTENTOS):
+            if not self.slug:
+                self.slug = self._generate_unique_slug()
+            try:
+                # El INSERT va en un SAVEPOINT: si falla, el resto de la transacción sigue viva
+                with db.session.begin_nested():
+                    db.session.add(self)
+                break
+            except IntegrityError:
+                # Solo se reintenta si el conflicto fue el slug (no la placa u otra restricción)
+                with db.session.no_autoflush:
+                    tomado = db.session.scalar(db.select(ElementoAudiovisual.id).filter_by(slug=self.slug))
+                if not tomado:
+                    raise
+                self.slug = None
+        else:
+            raise IntegrityError(None, None, Exception(f"No se pudo asignar un slug único a {self.placa}"))
+        db.session.commit()
 
     def public_url(self):
-        return url_for('ver_elemento_slug', slug=self.slug)
+        return url_for('elementos.ver_elemento_slug', slug=self.slug)
 
     @staticmethod
     def get_by_slug(slug):
         return ElementoAudiovisual.query.filter_by(slug=slug).first()
 
+    @staticmethod
+    def version_por_slug(slug, *extras):
+        """(id, version, actualizado_en, *extras) del elemento con ese slug, sin cargar la fila completa"""
+        return db.session.execute(
+            db.select(ElementoAudiovisual.id, ElementoAudiovisual.version, ElementoAudiovisual.actualizado_en,
+                      *extras).filter_by(slug=slug)
+        ).first()
+
     @staticmethod
     def get_all():
         return ElementoAudiovisual.query.all()
 
-class Persona(db.Model):
+class SlugContador(db.Model):
+    """Último sufijo numérico asignado a cada base de slug repetida"""
+    __tablename__ = 'slug_contadores'
+
+    base = db.Column(db.String(150), primary_key=True)
+    ultimo = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def sufijo_maximo(base, dialecto):
+        """Consulta del mayor `n` entre los slugs `base-<n>` (recorre solo ese rango del índice)"""
+        columna = ElementoAudiovisual.slug
+        sufijo = func.substr(columna, len(base) + 2)
+        if dialecto == 'sqlite':
+            # GLOB distingue mayúsculas y aprovecha el índice único; LIKE no
+            numerados = and_(columna.op('GLOB')(f'{base}-[0-9]*'), ~sufijo.op('GLOB')('*[^0-9]*'))
+        else:
+            numerados = and_(columna.like(f'{base}-%'), columna.op('~')(f'^{re.escape(base)}-[0-9]{{1,9}}$'))
+        return db.select(func.max(cast(sufijo, db.Integer))).where(numerados)
+
+    @staticmethod
+    def siguiente(base, inicial, session):
+        """Reserva el siguiente sufijo de `base` (o `inicial` si es la primera vez) y lo devuelve"""
+        dialecto = session.get_bind().dialect.name
+        insertar = (sqlite_insert if dialecto == 'sqlite' else postgresql_insert)(SlugContador)
+        sentencia = (
+            insertar.values(base=base, ultimo=inicial)
+            .on_conflict_do_update(index_elements=['base'], set_={'ultimo': SlugContador.ultimo + 1})
+            .returning(SlugContador.ultimo)
+        )
+        return session.execute(sentencia).scalar_one()
+
+class Persona(VersionFila, db.Model):
+    __table_args__ = (
+        db.Index('ix_persona_email', 'email'),
+        db.Index('ix_persona_nombre', 'nombre'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     apellido = db.Column(db.String(100), nullable=False)
@@ -93,12 +250,242 @@ class Persona(db.Model):
     def nombre_completo(self):
         return f"{self.nombre} {self.apellido}"
 
-class Prestamo(db.Model):
+# Estados en los que el elemento sigue en manos de la persona
+ESTADOS_ACTIVOS = ('pendiente', 'activo')
+
+class Prestamo(VersionFila, db.Model):
+    __table_args__ = (
+        db.Index('ix_prestamo_fecha_id', 'fecha_prestamo', 'id'),
+        db.Index('ix_prestamo_usuario_fecha', 'usuario_id', 'fecha_prestamo'),
+        db.Index('ix_prestamo_elemento', 'elemento_id'),
+        db.Index('ix_prestamo_persona', 'persona_id'),
+        db.Index('ix_prestamo_estado', 'estado'),
+        # Índice parcial: préstamos que todavía no se han cerrado
+        db.Index('ix_prestamo_activos', 'elemento_id',
+                 postgresql_where=db.text("estado IN ('pendiente', 'activo')"),
+                 sqlite_where=db.text("estado IN ('pendiente', 'activo')")),
+        # Préstamos abiertos aún sin aviso de vencimiento, en el orden en que los recorre el trabajador
+        db.Index('ix_prestamo_vencimiento', 'fecha_vencimiento', 'id',
+                 postgresql_where=db.text("estado IN ('pendiente', 'activo') AND aviso_vencido_en IS NULL"),
+                 sqlite_where=db.text("estado IN ('pendiente', 'activo') AND aviso_vencido_en IS NULL")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     elemento_id = db.Column(db.Integer, db.ForeignKey('elementos_audiovisuales.id'), nullable=False)
     persona_id = db.Column(db.Integer, db.ForeignKey('persona.id'), nullable=False)
     fecha_prestamo = db.Column(db.DateTime, default=datetime.utcnow)
     fecha_devolucion = db.Column(db.DateTime, nullable=True)
+    fecha_vencimiento = db.Column(db.DateTime, nullable=True)
+    aviso_vencido_en = db.Column(db.DateTime, nullable=True)  # cuándo se encoló el aviso de vencimiento
     estado = db.Column(db.String(20), default='pendiente')  # pendiente, activo, devuelto, cancelado
-    notas = db.Column(db.Text)
\ No newline at end of file
+    notas = db.Column(db.Text)
+
+    @property
+    def vencido(self):
+        return (self.estado in ESTADOS_ACTIVOS and self.fecha_vencimiento is not None
+                and self.fecha_vencimiento < datetime.utcnow())
+
+    @property
+    def version_listado(self):
+        """Versiones de todo lo que muestra la fila del préstamo en el listado (clave de su fragmento).
+
+        De las filas relacionadas basta la versión: cuáles son lo fijan las claves foráneas del préstamo.
+        """
+        return (*self.version_fila, self.elemento.version, self.persona.version, self.usuario.version,
+                self.vencido)
+
+    @staticmethod
+    def codificar_cursor(prestamo):
+        """Codifica la posición (fecha_prestamo, id) de un préstamo como cursor opaco"""
+        valor = f"{prestamo.fecha_prestamo.isoformat()}|{prestamo.id}"
+        return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decodificar_cursor(cursor):
+        """Devuelve la tupla (fecha_prestamo, id) de un cursor, o None si no es válido"""
+        if not cursor:
+            return None
+        try:
+            valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            fecha, id_ = valor.rsplit('|', 1)
+            return datetime.fromisoformat(fecha), int(id_)
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    @staticmethod
+    def listar_pagina(query=None, despues=None, antes=None, limite=50):
+        """Página de préstamos por cursor (keyset) sobre (fecha_prestamo, id) descendente.
+
+        `despues` avanza hacia préstamos más antiguos y `antes` retrocede hacia
+        los más recientes. Elemento, persona y usuario se cargan en la misma
+        consulta para que la plantilla no dispare consultas por fila.
+        """
+        query = query if query is not None else Prestamo.query
+        query = query.options(
+            joinedload(Prestamo.elemento),
+            joinedload(Prestamo.persona),
+            joinedload(Prestamo.usuario),
+        )
+        posicion_despues = Prestamo.decodificar_cursor(despues)
+        posicion_antes = None if posicion_despues else Prestamo.decodificar_cursor(antes)
+
+        if posicion_antes:
+            fecha, id_ = posicion_antes
+            query = query.filter(or_(
+                Prestamo.fecha_prestamo > fecha,
+                and_(Prestamo.fecha_prestamo == fecha, Prestamo.id > id_)
+            )).order_by(Prestamo.fecha_prestamo.asc(), Prestamo.id.asc())
+        else:
+            if posicion_despues:
+                fecha, id_ = posicion_despues
+                query = query.filter(or_(
+                    Prestamo.fecha_prestamo < fecha,
+                    and_(Prestamo.fecha_prestamo == fecha, Prestamo.id < id_)
+                ))
+            query = query.order_by(Prestamo.fecha_prestamo.desc(), Prestamo.id.desc())
+
+        # Se pide un registro extra para saber si hay más páginas en esa dirección
+        items = query.limit(limite + 1).all()
+        hay_mas = len(items) > limite
+        items = items[:limite]
+
+        if posicion_antes:
+            items.reverse()
+            hay_anteriores, hay_siguientes = hay_mas, True
+        else:
+            hay_anteriores, hay_siguientes = posicion_despues is not None, hay_mas
+
+        return PaginaPrestamos(
+            items=items,
+            anterior=Prestamo.codificar_cursor(items[0]) if items and hay_anteriores else None,
+            siguiente=Prestamo.codificar_cursor(items[-1]) if items and hay_siguientes else None,
+        )
+
+class ContadorTablero(db.Model):
+    """Contador agregado del tablero (ver prestamos.tablero), p. ej. ('activos_tipo', 'camara') -> 12"""
+    __tablename__ = 'contadores_tablero'
+
+    metrica = db.Column(db.String(30), primary_key=True)
+    clave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+class PrestamoEvento(db.Model):
+    """Registro de solo inserción de lo que le pasa a cada préstamo (ver prestamos.eventos)"""
+    __tablename__ = 'prestamo_eventos'
+    __table_args__ = (
+        db.Index('ix_eventos_prestamo', 'prestamo_id', 'tipo'),
+        db.Index('ix_eventos_elemento_fecha', 'elemento_id', 'fecha'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    prestamo_id = db.Column(db.Integer, db.ForeignKey('prestamo.id'), nullable=False)
+    elemento_id = db.Column(db.Integer, db.ForeignKey('elementos_audiovisuales.id'), nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)  # prestamo, devolucion, cancelacion
+    # Cuándo ocurrió (puede ser anterior, p. ej. una devolución con fecha) y cuándo se registró
+    fecha = db.Column(db.DateTime, nullable=False)
+    registrado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class PrestamoIntervalo(db.Model):
+    """Proyección de `prestamo_eventos`: un intervalo [desde, hasta) fuera por préstamo"""
+    __tablename__ = 'prestamo_intervalos'
+    __table_args__ = (
+        # Los dos órdenes: el planificador recorre el rango más corto según la fecha consultada
+        db.Index('ix_intervalos_hasta', 'hasta', 'desde', 'elemento_id'),
+        db.Index('ix_intervalos_desde', 'desde', 'hasta', 'elemento_id'),
+    )
+
+    prestamo_id = db.Column(db.Integer, db.ForeignKey('prestamo.id'), primary_key=True)
+    elemento_id = db.Column(db.Integer, db.ForeignKey('elementos_audiovisuales.id'), nullable=False)
+    desde = db.Column(db.DateTime, nullable=False)
+    # prestamos.eventos.ABIERTO mientras no se devuelva o cancele
+    hasta = db.Column(db.DateTime, nullable=False)
+
+class Reserva(db.Model):
+    """Reserva de un elemento para una persona en el rango [desde, hasta) (ver prestamos.reservas)"""
+    __tablename__ = 'reservas'
+    __table_args__ = (
+        # Índices parciales: solo las reservas vigentes, que son las que chocan con otras y con préstamos
+        db.Index('ix_reservas_hasta', 'hasta', 'desde', 'elemento_id',
+                 postgresql_where=db.text("estado = 'activa'"),
+                 sqlite_where=db.text("estado = 'activa'")),
+        db.Index('ix_reservas_elemento', 'elemento_id', 'hasta', 'desde',
+                 postgresql_where=db.text("estado = 'activa'"),
+                 sqlite_where=db.text("estado = 'activa'")),
+        db.Index('ix_reservas_persona', 'persona_id', 'desde'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    elemento_id = db.Column(db.Integer, db.ForeignKey('elementos_audiovisuales.id'), nullable=False)
+    persona_id = db.Column(db.Integer, db.ForeignKey('persona.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
+    desde = db.Column(db.DateTime, nullable=False)
+    hasta = db.Column(db.DateTime, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='activa')  # activa, cancelada
+    notas = db.Column(db.Text)
+    creada_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    elemento = db.relationship('ElementoAudiovisual')
+    persona = db.relationship('Persona')
+    usuario = db.relationship('Usuario')
+
+class Version(db.Model):
+    """Versión de un espacio de datos entero (p. ej. 'elementos'); sube en cada transacción que lo modifica"""
+    __tablename__ = 'versiones'
+
+    espacio = db.Column(db.String(30), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    actualizado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def leer(espacio, session=None):
+        """(version, actualizado_en) de `espacio`; (0, None) si nunca se modificó"""
+        session = session or db.session
+        fila = session.execute(
+            db.select(Version.version, Version.actualizado_en).where(Version.espacio == espacio)
+        ).first()
+        return tuple(fila) if fila else (0, None)
+
+    @staticmethod
+    def incrementar(session, *espacios):
+        """Sube la versión de `espacios` con un solo upsert, en orden para no cruzar bloqueos"""
+        ahora = datetime.utcnow()
+        insertar = (sqlite_insert if session.get_bind().dialect.name == 'sqlite' else postgresql_insert)(Version)
+        session.execute(
+            insertar.on_conflict_do_update(index_elements=['espacio'],
+                                           set_={'version': Version.version + 1, 'actualizado_en': ahora}),
+            [{'espacio': espacio, 'version': 1, 'actualizado_en': ahora} for espacio in sorted(espacios)],
+        )
+
+class Trabajo(db.Model):
+    """Trabajo en la cola que atiende `python -m prestamos.trabajador` (ver prestamos.trabajos)"""
+    __tablename__ = 'trabajos'
+    __table_args__ = (
+        # Índice parcial: solo lo que falta ejecutar, en el orden en que se toma
+        db.Index('ix_trabajos_pendientes', 'ejecutar_en', 'id',
+                 postgresql_where=db.text("estado = 'pendiente'"),
+                 sqlite_where=db.text("estado = 'pendiente'")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    datos = db.Column(db.JSON, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente, hecho, fallido
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    # Cuándo puede tomarse; al tomarlo se corre hacia adelante mientras dura la reserva
+    ejecutar_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    error = db.Column(db.Text)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class PaginaPrestamos:
+    """Resultado de una página de préstamos con los cursores de navegación"""
+
+    def __init__(self, items, anterior=None, siguiente=None):
+        self.items = items
+        self.anterior = anterior
+        self.siguiente = siguiente
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,152 @@
+"""Detector de consultas N+1 y presupuestos de consultas por endpoint.
+
+Durante cada petición se cuentan las cargas perezosas de cada relación
+(p. ej. `Prestamo.elemento` dentro de un `for` de la plantilla) y las
+sentencias SQL idénticas que se repiten con distintos parámetros (el patrón
+de las relaciones `lazy='dynamic'` como `Persona.prestamos`). Si alguna se
+repite más de NMASUNO_UMBRAL veces, o si el endpoint supera su entrada en
+PRESUPUESTOS, se avisa (`warnings.warn`) o se lanza `ConsultasExcesivas`,
+según NMASUNO_MODO:
+
+    off    no se mide nada (por defecto fuera de modo debug)
+    aviso  RuntimeWarning (por defecto con app.debug)
+    error  ConsultasExcesivas, para que las pruebas fallen
+
+En pruebas también sirve para un bloque cualquiera:
+
+    with limite_consultas(3):
+        cliente.get('/')
+"""
+import threading
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request, request_finished, request_started, request_tearing_down
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from prestamos import config
+
+# Máximo de consultas por endpoint en un GET con sesión iniciada (una más de las que hace hoy, por la
+# identidad del usuario cuando no está en caché). Los demás endpoints solo pasan por el detector N+1
+PRESUPUESTOS = {
+    'prestamos.index': 2,
+    'prestamos.listar_prestamos': 2,
+    'prestamos.mis_prestamos': 2,
+    'elementos.listar_elementos': 5,
+    'elementos.ver_elemento_slug': 3,
+    'reservas.listar_reservas': 2,
+    'personas.listar_personas': 2,
+    'admin.listar_usuarios': 2,
+    'prestamos.nuevo_prestamo': 4,
+    'prestamos.prestamo_lote': 3,
+    'admin.tablero_admin': 3,
+    'api.api_personas': 2,
+    'api.api_elementos': 2,
+}
+
+
+class ConsultasExcesivas(AssertionError):
+    """Un bloque o una petición hizo más consultas de las permitidas o cargas N+1"""
+
+
+class Registro:
+    """Consultas observadas en una petición o en un bloque `limite_consultas`"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.sentencias = Counter()
+        self.relaciones = Counter()
+
+    def repetidas(self, umbral):
+        """Relaciones y sentencias que se ejecutaron más de `umbral` veces"""
+        problemas = [f"carga perezosa de {relacion} ×{veces}"
+                     for relacion, veces in self.relaciones.most_common() if veces > umbral]
+        problemas += [f"sentencia repetida ×{veces}: {' '.join(sentencia.split())[:200]}"
+                      for sentencia, veces in self.sentencias.most_common() if veces > umbral]
+        return problemas
+
+
+_local = threading.local()
+
+
+def _activos():
+    if not hasattr(_local, 'registros'):
+        _local.registros = []
+    return _local.registros
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _contar_sentencia(conexion, cursor, sentencia, parametros, contexto, executemany):
+    for registro in _activos():
+        registro.consultas += 1
+        registro.sentencias[sentencia] += 1
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _contar_carga_perezosa(orm_execute_state):
+    if orm_execute_state.is_relationship_load:
+        relacion = str(getattr(orm_execute_state.loader_strategy_path, 'prop', 'relación'))
+        for registro in _activos():
+            registro.relaciones[relacion] += 1
+
+
+def _reportar(problemas, modo):
+    mensaje = '; '.join(problemas)
+    if modo == 'error':
+        raise ConsultasExcesivas(mensaje)
+    warnings.warn(mensaje, RuntimeWarning, stacklevel=2)
+
+
+@contextmanager
+def limite_consultas(maximo=None, umbral=None, modo='error'):
+    """Cuenta las consultas del bloque; falla si son más de `maximo` o si hay repeticiones N+1"""
+    registro = Registro()
+    _activos().append(registro)
+    try:
+        yield registro
+    finally:
+        _activos().remove(registro)
+    problemas = registro.repetidas(config.NMASUNO_UMBRAL if umbral is None else umbral)
+    if maximo is not None and registro.consultas > maximo:
+        problemas.insert(0, f"{registro.consultas} consultas (máximo {maximo})")
+    if problemas:
+        _reportar(problemas, modo)
+
+
+def _modo(app):
+    return config.NMASUNO_MODO or ('aviso' if app.debug else 'off')
+
+
+def _inicio_peticion(app, **extra):
+    if _modo(app) == 'off':
+        return
+    g.registro_consultas = Registro()
+    _activos().append(g.registro_consultas)
+
+
+def _fin_peticion(app, response, **extra):
+    registro = g.get('registro_consultas')
+    if registro is None:
+        return
+    problemas = registro.repetidas(config.NMASUNO_UMBRAL)
+    maximo = PRESUPUESTOS.get(request.endpoint)
+    if maximo is not None and request.method == 'GET' and registro.consultas > maximo:
+        problemas.insert(0, f"{registro.consultas} consultas (presupuesto {maximo})")
+    if problemas:
+        _reportar([f"{request.endpoint}: {problemas[0]}"] + problemas[1:], _modo(app))
+
+
+def _desmontar(app, **extra):
+    registro = g.pop('registro_consultas', None)
+    if registro is not None and registro in _activos():
+        _activos().remove(registro)
+
+
+def instalar(app):
+    """Conecta el detector a las señales de petición de `app`"""
+    request_started.connect(_inicio_peticion, app)
+    request_finished.connect(_fin_peticion, app)
+    request_tearing_down.connect(_desmontar, app)
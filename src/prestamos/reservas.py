@@ -0,0 +1,148 @@
+"""Reservas de elementos a futuro y búsqueda de disponibilidad por rango de fechas.
+
+Una reserva ocupa su elemento en [desde, hasta). Dos reservas activas del
+mismo elemento no pueden solaparse:
+
+- PostgreSQL: una restricción de exclusión GiST (`btree_gist`) sobre
+  `(elemento_id WITH =, tsrange(desde, hasta) WITH &&)` la hace cumplir la
+  base de datos, aunque dos transacciones reserven a la vez.
+- SQLite: `PrestamoService.reservar` toma el bloqueo de escritura antes de
+  buscar choques, así que la comprobación y el INSERT no se intercalan con
+  otra escritura.
+
+Las consultas de solapamiento van sobre índices ordenados por `hasta`: una
+reserva choca con [desde, hasta) si termina después de `desde` y empieza
+antes de `hasta`. Las reservas ya terminadas, que son casi todas, quedan
+fuera del rango del índice, así que preguntar por fechas futuras recorre
+solo las reservas vigentes.
+
+Un préstamo abierto ocupa su elemento hasta su vencimiento, y un rango que
+ya empezó choca con cualquier préstamo abierto. `libres(desde, hasta)`
+descarta en SQL los elementos con reservas o préstamos en el rango, sin
+cargar reservas en Python:
+
+    python -m prestamos.reservas libres 2025-03-01T08:00 2025-03-03T18:00 [TIPO]
+"""
+import sys
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Prestamo, Reserva, ESTADOS_ACTIVOS
+from prestamos.search import search_elementos
+
+_EXCLUSION = {
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        "ALTER TABLE reservas DROP CONSTRAINT IF EXISTS reservas_sin_solapamiento",
+        "ALTER TABLE reservas ADD CONSTRAINT reservas_sin_solapamiento EXCLUDE USING gist "
+        "(elemento_id WITH =, tsrange(desde, hasta, '[)') WITH &&) WHERE (estado = 'activa')",
+    ],
+}
+
+# Código de PostgreSQL cuando un INSERT viola la restricción de exclusión
+CODIGO_EXCLUSION = '23P01'
+
+# Literal (no parámetro) para que SQLite use los índices parciales `estado = 'activa'`
+_ACTIVA = sa.bindparam('activa', 'activa', literal_execute=True)
+_ABIERTOS = sa.bindparam('abiertos', ESTADOS_ACTIVOS, expanding=True, literal_execute=True)
+
+
+def instalar_exclusion(conexion):
+    """Crea la restricción de exclusión de PostgreSQL (idempotente; en SQLite no hace nada)"""
+    for sentencia in _EXCLUSION.get(conexion.dialect.name, []):
+        conexion.execute(sa.text(sentencia))
+
+
+def _reservas_en(desde, hasta):
+    """Condiciones de las reservas activas que se solapan con [desde, hasta)"""
+    return Reserva.estado == _ACTIVA, Reserva.hasta > desde, Reserva.desde < hasta
+
+
+def _prestamos_en(desde, hasta):
+    """Condiciones de los préstamos abiertos que ocupan su elemento en [desde, hasta)"""
+    # Sin condición sobre fecha_prestamo: los rangos terminan en el futuro y todo préstamo abierto
+    # empezó antes, y así el planificador recorre solo los préstamos abiertos (ix_prestamo_activos)
+    condiciones = [Prestamo.estado.in_(_ABIERTOS)]
+    if desde > datetime.utcnow():
+        # Para un rango futuro el préstamo ocupa el elemento hasta su vencimiento; un rango que
+        # ya empezó choca con cualquier préstamo abierto, esté vencido o no
+        condiciones.append(sa.or_(Prestamo.fecha_vencimiento.is_(None), Prestamo.fecha_vencimiento > desde))
+    return condiciones
+
+
+def ocupados(desde, hasta):
+    """SELECT de los IDs de elementos con una reserva activa o un préstamo abierto en [desde, hasta)"""
+    return sa.union(
+        sa.select(Reserva.elemento_id).where(*_reservas_en(desde, hasta)),
+        sa.select(Prestamo.elemento_id).where(*_prestamos_en(desde, hasta)),
+    )
+
+
+def choques(session, elemento_ids, desde, hasta, persona_id=None):
+    """IDs de `elemento_ids` con reservas activas en el rango (de otras personas si se indica `persona_id`)"""
+    consulta = (
+        sa.select(Reserva.elemento_id).distinct()
+        .where(Reserva.elemento_id.in_(elemento_ids), *_reservas_en(desde, hasta))
+    )
+    if persona_id is not None:
+        consulta = consulta.where(Reserva.persona_id != persona_id)
+    return set(session.scalars(consulta))
+
+
+def prestado_en(session, elemento_id, desde, hasta):
+    """Indica si un préstamo abierto ocupa el elemento en [desde, hasta)"""
+    return session.scalar(sa.select(
+        sa.exists().where(Prestamo.elemento_id == elemento_id, *_prestamos_en(desde, hasta))
+    ))
+
+
+def libres(desde, hasta, q='', tipo=None, limite=20, offset=0):
+    """Elementos sin reservas ni préstamos en [desde, hasta) que coinciden con `q` y `tipo`"""
+    return search_elementos(q, limite=limite, offset=offset, tipo=tipo, excluir=ocupados(desde, hasta))
+
+
+def fin_mas_proximo():
+    """Subconsulta correlacionada con ElementoAudiovisual: el `hasta` más cercano de sus reservas
+    vigentes (NULL si no tiene). Al pasar esa hora `proximas` deja de mostrar la reserva aunque el
+    elemento no cambie, así que va en el ETag de su página"""
+    return (
+        sa.select(sa.func.min(Reserva.hasta))
+        .where(Reserva.elemento_id == ElementoAudiovisual.id, Reserva.estado == _ACTIVA,
+               Reserva.hasta > datetime.utcnow())
+        .scalar_subquery()
+    )
+
+
+def proximas(elemento_id, limite=5, session=None):
+    """Reservas activas del elemento que todavía no terminaron, de la más próxima a la más lejana"""
+    session = session or db.session
+    return session.scalars(
+        sa.select(Reserva)
+        .where(Reserva.elemento_id == elemento_id, Reserva.estado == _ACTIVA, Reserva.hasta > datetime.utcnow())
+        .order_by(Reserva.desde)
+        .limit(limite)
+    ).all()
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    argv = sys.argv[1:] if argv is None else argv
+    app = create_app()
+    with app.app_context():
+        if len(argv) in (3, 4) and argv[0] == 'libres':
+            desde, hasta = datetime.fromisoformat(argv[1]), datetime.fromisoformat(argv[2])
+            elementos = libres(desde, hasta, tipo=argv[3] if len(argv) == 4 else None, limite=50)
+            print(f"Elementos libres entre {desde:%Y-%m-%d %H:%M} y {hasta:%Y-%m-%d %H:%M} (hasta 50):")
+            for elemento in elementos:
+                print(f"  {elemento.placa:<12} {elemento.nombre}")
+        else:
+            print("Uso: python -m prestamos.reservas libres DESDE HASTA [TIPO]")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Búsqueda de personas y elementos para los selectores de préstamo y el catálogo.
+
+Según el motor de base de datos se usa:
+- PostgreSQL: índices GIN de `pg_trgm` sobre el texto concatenado de cada fila,
+  que aceleran los `ILIKE '%texto%'` y permiten ordenar por similitud.
+- SQLite: tablas FTS5 con el tokenizador `trigram`, sincronizadas por triggers,
+  ordenadas por `bm25`.
+- Cualquier otro motor: `ILIKE` sin índice.
+
+Los términos de menos de tres caracteres no generan trigramas, por lo que se
+filtran con `LIKE` sobre las filas que ya coinciden con los demás términos.
+"""
+import sqlalchemy as sa
+
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Persona
+
+LIMITE_POR_DEFECTO = 20
+CANDIDATOS_MINIMOS = 1000
+
+# Texto indexado de cada tabla. En PostgreSQL la expresión debe coincidir
+# exactamente con la del índice GIN para que el planificador lo utilice.
+_TEXTO_PERSONA = "(persona.nombre || ' ' || persona.apellido || ' ' || persona.identificacion)"
+_TEXTO_ELEMENTO = ("(elementos_audiovisuales.placa || ' ' || elementos_audiovisuales.nombre"
+                   " || ' ' || elementos_audiovisuales.tipo)")
+
+_FTS = {
+    'persona_fts': ('persona', ('nombre', 'apellido', 'identificacion')),
+    'elementos_fts': ('elementos_audiovisuales', ('placa', 'nombre', 'tipo')),
+}
+
+_fts_disponible = {}
+
+
+def instalar_busqueda(conexion):
+    """Crea los índices de búsqueda del motor de la conexión (idempotente)"""
+    dialecto = conexion.dialect.name
+    if dialecto == 'postgresql':
+        conexion.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conexion.execute(sa.text(
+            f"CREATE INDEX IF NOT EXISTS ix_persona_busqueda_trgm ON persona "
+            f"USING gin ({_TEXTO_PERSONA.replace('persona.', '')} gin_trgm_ops)"
+        ))
+        conexion.execute(sa.text(
+            f"CREATE INDEX IF NOT EXISTS ix_elementos_busqueda_trgm ON elementos_audiovisuales "
+            f"USING gin ({_TEXTO_ELEMENTO.replace('elementos_audiovisuales.', '')} gin_trgm_ops)"
+        ))
+    elif dialecto == 'sqlite':
+        if not _sqlite_soporta_trigram(conexion):
+            return
+        for fts, (tabla, columnas) in _FTS.items():
+            lista = ', '.join(columnas)
+            nuevos = ', '.join(f"new.{c}" for c in columnas)
+            viejos = ', '.join(f"old.{c}" for c in columnas)
+            sentencias = [
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, "
+                f"content='{tabla}', content_rowid='id', tokenize='trigram')",
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN "
+                f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos}); END",
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos}); END",
+                _trigger_actualizacion(fts, tabla, columnas),
+                f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+            ]
+            for sentencia in sentencias:
+                conexion.execute(sa.text(sentencia))
+    _fts_disponible.clear()
+
+
+def _trigger_actualizacion(fts, tabla, columnas):
+    """Trigger que reindexa la fila solo cuando cambia una columna indexada: los UPDATE de
+    `disponible` o `version` (cada préstamo, devolución o reserva) no tocan la tabla FTS"""
+    lista = ', '.join(columnas)
+    nuevos = ', '.join(f"new.{c}" for c in columnas)
+    viejos = ', '.join(f"old.{c}" for c in columnas)
+    return (f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos}); "
+            f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos}); END")
+
+
+def reinstalar_triggers_actualizacion(conexion):
+    """Reemplaza los triggers `*_au` de las tablas FTS5 existentes (SQLite) por los de `_trigger_actualizacion`"""
+    if conexion.dialect.name != 'sqlite':
+        return
+    for fts, (tabla, columnas) in _FTS.items():
+        if not sa.inspect(conexion).has_table(fts):
+            continue
+        conexion.execute(sa.text(f"DROP TRIGGER IF EXISTS {fts}_au"))
+        conexion.execute(sa.text(_trigger_actualizacion(fts, tabla, columnas)))
+
+
+def _sqlite_soporta_trigram(conexion):
+    version = tuple(int(p) for p in conexion.exec_driver_sql("SELECT sqlite_version()").scalar().split('.'))
+    return version >= (3, 34, 0)
+
+
+def _usa_fts(bind, fts):
+    """Indica si la tabla FTS5 existe en la base de datos (se consulta una vez por motor)"""
+    clave = (str(bind.url), fts)
+    if clave not in _fts_disponible:
+        _fts_disponible[clave] = sa.inspect(bind).has_table(fts)
+    return _fts_disponible[clave]
+
+
+def _terminos(q):
+    return [t for t in (q or '').split() if t]
+
+
+def _like(termino):
+    escapado = termino.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escapado}%"
+
+
+def _filtrar(stmt, q, texto, fts, id_columna, dialecto, usa_fts, tope=None):
+    """Aplica los términos de búsqueda y el orden por relevancia a `stmt`.
+
+    `tope` limita las coincidencias FTS a considerar; solo es correcto si `stmt`
+    no tiene otros filtros.
+    """
+    terminos = _terminos(q)
+    if not terminos:
+        return stmt
+    largos = [t for t in terminos if len(t) >= 3]
+    cortos = [t for t in terminos if len(t) < 3]
+    texto = sa.literal_column(texto)
+
+    if dialecto == 'sqlite' and usa_fts and largos:
+        tabla_fts = sa.table(fts, sa.column('rowid'), sa.column('rank'))
+        consulta = ' '.join('"' + t.replace('"', '""') + '"' for t in largos)
+        candidatos = (sa.select(tabla_fts.c.rowid, tabla_fts.c.rank)
+                      .where(sa.literal_column(fts).op('MATCH')(consulta)))
+        # El tope corta las coincidencias antes de los filtros que se aplican afuera
+        # (términos cortos, y los de `consulta_elementos`): con alguno de ellos se
+        # perderían filas que sí cumplen, así que solo se usa cuando no hay ninguno.
+        # Las que quedan son las de mejor `rank`, no las de menor rowid.
+        if tope is not None and not cortos:
+            candidatos = candidatos.order_by(tabla_fts.c.rank).limit(tope)
+        candidatos = candidatos.subquery()
+        stmt = stmt.join(candidatos, candidatos.c.rowid == id_columna).order_by(candidatos.c.rank)
+        restantes = cortos
+    else:
+        restantes = terminos
+
+    for termino in restantes:
+        stmt = stmt.where(texto.ilike(_like(termino), escape='\\'))
+    if dialecto == 'postgresql':
+        stmt = stmt.order_by(sa.func.similarity(texto, ' '.join(terminos)).desc())
+    return stmt
+
+
+def _tope_candidatos(limite, offset):
+    """Máximo de coincidencias FTS a considerar antes de aplicar los filtros del modelo"""
+    if limite is None:
+        return None
+    return max(CANDIDATOS_MINIMOS, (limite + offset) * 10)
+
+
+def consulta_personas(q, dialecto, usa_fts=False, limite=LIMITE_POR_DEFECTO, offset=0):
+    """Construye el SELECT de personas que coinciden con `q`, por relevancia"""
+    stmt = _filtrar(sa.select(Persona), q, _TEXTO_PERSONA, 'persona_fts',
+                    Persona.id, dialecto, usa_fts, _tope_candidatos(limite, offset))
+    stmt = stmt.order_by(Persona.nombre, Persona.apellido, Persona.id)
+    if limite is not None:
+        stmt = stmt.limit(limite).offset(offset)
+    return stmt
+
+
+def consulta_elementos(q, dialecto, usa_fts=False, limite=LIMITE_POR_DEFECTO, offset=0,
+                       solo_disponibles=False, tipo=None, excluir=None):
+    """Construye el SELECT de elementos que coinciden con `q`, por relevancia"""
+    stmt = sa.select(ElementoAudiovisual)
+    # Con filtros del modelo las coincidencias no se pueden cortar antes de aplicarlos
+    filtrada = solo_disponibles or bool(tipo) or excluir is not None
+    if solo_disponibles:
+        stmt = stmt.where(ElementoAudiovisual.disponible.is_(True))
+    if tipo:
+        stmt = stmt.where(ElementoAudiovisual.tipo == tipo)
+    if excluir is not None:
+        # SELECT de IDs (p. ej. los ocupados en un rango, ver prestamos.reservas)
+        stmt = stmt.where(ElementoAudiovisual.id.not_in(excluir))
+    stmt = _filtrar(stmt, q, _TEXTO_ELEMENTO, 'elementos_fts', ElementoAudiovisual.id, dialecto, usa_fts,
+                    None if filtrada else _tope_candidatos(limite, offset))
+    stmt = stmt.order_by(ElementoAudiovisual.nombre, ElementoAudiovisual.id)
+    if limite is not None:
+        stmt = stmt.limit(limite).offset(offset)
+    return stmt
+
+
+def search_personas(q, limite=LIMITE_POR_DEFECTO, offset=0):
+    """Personas que coinciden con `q` (nombre, apellido o identificación), por relevancia"""
+    bind = db.session.get_bind(mapper=Persona)
+    stmt = consulta_personas(q, bind.dialect.name, _usa_fts(bind, 'persona_fts'), limite, offset)
+    return db.session.scalars(stmt).all()
+
+
+def search_elementos(q, limite=LIMITE_POR_DEFECTO, offset=0, solo_disponibles=False, tipo=None, excluir=None):
+    """Elementos que coinciden con `q` (placa, nombre o tipo), por relevancia"""
+    bind = db.session.get_bind(mapper=ElementoAudiovisual)
+    stmt = consulta_elementos(q, bind.dialect.name, _usa_fts(bind, 'elementos_fts'), limite, offset,
+                              solo_disponibles=solo_disponibles, tipo=tipo, excluir=excluir)
+    return db.session.scalars(stmt).all()
@@ -0,0 +1,55 @@
+"""Política de hash de contraseñas.
+
+El algoritmo y su costo salen de `PASSWORD_HASH_METODO` (formato de werkzeug:
+`scrypt:n:r:p` o `pbkdf2:sha256:iteraciones`). Al iniciar sesión, si el hash
+guardado usa otros parámetros se regenera con los actuales.
+
+Los hashes se calculan en un pool acotado de `PASSWORD_HASH_HILOS` hilos:
+hashlib libera el GIL durante scrypt/pbkdf2, así que como máximo esa cantidad
+de hashes consume CPU a la vez y las demás peticiones del worker siguen
+atendiéndose. Si un hash espera más de `PASSWORD_HASH_ESPERA` segundos en la
+cola se lanza `HashOcupado`.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from prestamos.config import PASSWORD_HASH_METODO, PASSWORD_HASH_HILOS, PASSWORD_HASH_ESPERA
+
+_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_HILOS, thread_name_prefix='hash') if PASSWORD_HASH_HILOS else None
+
+
+class HashOcupado(Exception):
+    """El pool de hashing está saturado y la operación superó el tiempo de espera"""
+
+
+def _ejecutar(funcion, *args):
+    if _pool is None:
+        return funcion(*args)
+    futuro = _pool.submit(funcion, *args)
+    try:
+        return futuro.result(timeout=PASSWORD_HASH_ESPERA)
+    except TimeoutError:
+        futuro.cancel()
+        raise HashOcupado() from None
+
+
+def generar_hash(password):
+    """Hash de `password` con la política configurada"""
+    return _ejecutar(generate_password_hash, password, PASSWORD_HASH_METODO)
+
+
+def verificar_password(password_hash, password):
+    return _ejecutar(check_password_hash, password_hash, password)
+
+
+@functools.lru_cache(maxsize=None)
+def _metodo_completo(metodo):
+    # werkzeug completa los parámetros omitidos ('scrypt' -> 'scrypt:32768:8:1'); se calculan una vez
+    return generate_password_hash('', metodo).split('$', 1)[0]
+
+
+def necesita_rehash(password_hash):
+    """True si `password_hash` no usa el algoritmo y costo configurados"""
+    return password_hash.split('$', 1)[0] != _metodo_completo(PASSWORD_HASH_METODO)
@@ -0,0 +1,275 @@
+"""Operaciones de préstamo, devolución y cancelación sin condiciones de carrera.
+
+Cada operación cambia la disponibilidad del elemento con un `UPDATE`
+condicional (`... WHERE disponible = true`) dentro de una transacción corta:
+la base de datos serializa las escrituras sobre la misma fila, de modo que
+de dos operadores que prestan el mismo elemento a la vez solo uno obtiene
+`rowcount == 1`. Los conflictos de serialización o bloqueos transitorios se
+reintentan automáticamente. Los contadores del tablero (`prestamos.tablero`)
+y el registro de eventos (`prestamos.eventos`) se actualizan en la misma
+transacción.
+
+Un préstamo no puede pisar la reserva de otra persona (`prestamos.reservas`)
+entre su fecha y su vencimiento. Las reservas también empiezan por un UPDATE
+sobre la fila del elemento, que ordena a préstamos y reservas del mismo
+elemento antes de buscar choques.
+"""
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from prestamos import eventos, reservas, tablero
+from prestamos.config import PRESTAMO_DIAS
+from prestamos.database import db
+from prestamos.models import ElementoAudiovisual, Persona, Prestamo, Reserva, ESTADOS_ACTIVOS
+
+# serialization_failure y deadlock_detected de PostgreSQL
+_CODIGOS_REINTENTABLES = {'40001', '40P01'}
+
+
+class ElementoNoDisponible(Exception):
+    """El elemento no existe o ya está prestado; `args` contiene los IDs afectados"""
+
+
+class ElementoReservado(ElementoNoDisponible):
+    """El elemento está libre pero tiene una reserva (o un préstamo) que choca con el rango pedido"""
+
+
+class PrestamoNoModificable(Exception):
+    """El préstamo ya fue devuelto o cancelado"""
+
+
+class ReservaNoModificable(Exception):
+    """La reserva no existe o ya fue cancelada"""
+
+
+def vencimiento(fecha):
+    """Fecha en que vence un préstamo registrado en `fecha`"""
+    return fecha + timedelta(days=PRESTAMO_DIAS)
+
+
+def _es_reintentable(error):
+    original = getattr(error, 'orig', None)
+    codigo = getattr(original, 'sqlstate', None) or getattr(original, 'pgcode', None)
+    if codigo in _CODIGOS_REINTENTABLES:
+        return True
+    # SQLite devuelve "database is locked" cuando vence la espera por el bloqueo de escritura
+    return 'database is locked' in str(original)
+
+
+class PrestamoService:
+    """Servicio de préstamos sobre la sesión de Flask-SQLAlchemy"""
+
+    def __init__(self, session=None, reintentos=5):
+        self.session = session or db.session
+        self.reintentos = reintentos
+
+    def _transaccion(self, operacion):
+        """Ejecuta `operacion()` y confirma; reintenta ante conflictos transitorios"""
+        for intento in range(self.reintentos + 1):
+            try:
+                resultado = operacion()
+                self.session.commit()
+                return resultado
+            except DBAPIError as error:
+                self.session.rollback()
+                if intento == self.reintentos or not _es_reintentable(error):
+                    raise
+                time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+            except Exception:
+                self.session.rollback()
+                raise
+
+    def _reservar_elemento(self, elemento_id):
+        """Marca el elemento como prestado y devuelve su tipo"""
+        tipo = self.session.execute(
+            update(ElementoAudiovisual)
+            .where(ElementoAudiovisual.id == elemento_id, ElementoAudiovisual.disponible.is_(True))
+            .values(disponible=False, **ElementoAudiovisual.nueva_version())
+            .returning(ElementoAudiovisual.tipo)
+        ).scalar_one_or_none()
+        if tipo is None:
+            raise ElementoNoDisponible(elemento_id)
+        return tipo
+
+    def _sin_reservas_ajenas(self, elemento_ids, persona_id, fecha):
+        """Lanza `ElementoReservado` si otra persona reservó alguno de los elementos antes del vencimiento"""
+        reservados = reservas.choques(self.session, elemento_ids, fecha, vencimiento(fecha), persona_id=persona_id)
+        if reservados:
+            raise ElementoReservado(*sorted(reservados))
+
+    def _rol(self, persona_id):
+        return self.session.scalar(select(Persona.rol).where(Persona.id == persona_id))
+
+    def _liberar_elemento(self, elemento_id):
+        self.session.execute(
+            update(ElementoAudiovisual)
+            .where(ElementoAudiovisual.id == elemento_id)
+            .values(disponible=True, **ElementoAudiovisual.nueva_version())
+        )
+
+    def _cerrar(self, prestamo_id, estado, fecha_devolucion=None):
+        """Pasa un préstamo activo a `estado` y libera su elemento"""
+        actual = self.session.execute(
+            select(Prestamo.estado, Prestamo.fecha_prestamo, ElementoAudiovisual.tipo)
+            .join(ElementoAudiovisual, ElementoAudiovisual.id == Prestamo.elemento_id)
+            .where(Prestamo.id == prestamo_id)
+        ).one_or_none()
+        if actual is None or actual.estado not in ESTADOS_ACTIVOS:
+            raise PrestamoNoModificable(prestamo_id)
+        valores = {'estado': estado}
+        if fecha_devolucion is not None:
+            valores['fecha_devolucion'] = fecha_devolucion
+        # La condición sobre el estado leído hace que de dos cierres simultáneos solo uno gane
+        resultado = self.session.execute(
+            update(Prestamo)
+            .where(Prestamo.id == prestamo_id, Prestamo.estado == actual.estado)
+            .values(**valores, **Prestamo.nueva_version())
+        )
+        if resultado.rowcount != 1:
+            raise PrestamoNoModificable(prestamo_id)
+        prestamo = self.session.get(Prestamo, prestamo_id)
+        self._liberar_elemento(prestamo.elemento_id)
+        eventos.cerrar(self.session, prestamo_id, prestamo.elemento_id, estado,
+                       fecha_devolucion or datetime.utcnow())
+        tablero.sumar(self.session, tablero.deltas_cierre(actual.estado, estado, actual.tipo, actual.fecha_prestamo))
+        return prestamo
+
+    def prestar(self, elemento_id, persona_id, usuario_id, notas=None, estado='activo', fecha=None):
+        """Presta el elemento si sigue disponible; lanza `ElementoNoDisponible` si no"""
+        def operacion():
+            tipo = self._reservar_elemento(elemento_id)
+            fecha_prestamo = fecha or datetime.utcnow()
+            self._sin_reservas_ajenas([elemento_id], persona_id, fecha_prestamo)
+            prestamo = Prestamo(
+                usuario_id=usuario_id,
+                elemento_id=elemento_id,
+                persona_id=persona_id,
+                notas=notas,
+                estado=estado,
+                fecha_prestamo=fecha_prestamo,
+                fecha_vencimiento=vencimiento(fecha_prestamo)
+            )
+            self.session.add(prestamo)
+            self.session.flush()
+            eventos.abrir(self.session, [(prestamo.id, elemento_id, fecha_prestamo)])
+            tablero.sumar(self.session, tablero.deltas_apertura(
+                estado, tipo, self._rol(persona_id), prestamo.fecha_prestamo
+            ))
+            return prestamo
+        return self._transaccion(operacion)
+
+    def devolver(self, prestamo_id, fecha=None):
+        """Registra la devolución; lanza `PrestamoNoModificable` si ya estaba cerrado"""
+        return self._transaccion(lambda: self._cerrar(prestamo_id, 'devuelto', fecha or datetime.utcnow()))
+
+    def cancelar(self, prestamo_id):
+        """Cancela el préstamo y libera el elemento"""
+        return self._transaccion(lambda: self._cerrar(prestamo_id, 'cancelado'))
+
+    def prestar_lote(self, elemento_ids, persona_id, usuario_id, notas=None, estado='activo', fecha=None):
+        """Presta varios elementos a una persona en una sola transacción, todos o ninguno.
+
+        Reserva los elementos con un único `UPDATE ... WHERE id IN (...) AND
+        disponible` e inserta los préstamos con un `INSERT` de varias filas.
+        Si algún elemento no está disponible se deshace todo y se lanza
+        `ElementoNoDisponible` con los IDs que fallaron.
+        """
+        # Orden fijo para que dos lotes concurrentes bloqueen las filas en el mismo orden
+        ids = sorted(set(elemento_ids))
+        fecha = fecha or datetime.utcnow()
+
+        def operacion():
+            tipos = self.session.scalars(
+                update(ElementoAudiovisual)
+                .where(ElementoAudiovisual.id.in_(ids), ElementoAudiovisual.disponible.is_(True))
+                .values(disponible=False, **ElementoAudiovisual.nueva_version())
+                .returning(ElementoAudiovisual.tipo)
+            ).all()
+            if len(tipos) != len(ids):
+                raise ElementoNoDisponible(*ids)
+            self._sin_reservas_ajenas(ids, persona_id, fecha)
+            creados = self.session.execute(insert(Prestamo).returning(Prestamo.id, Prestamo.elemento_id), [
+                {
+                    'usuario_id': usuario_id,
+                    'elemento_id': elemento_id,
+                    'persona_id': persona_id,
+                    'notas': notas,
+                    'estado': estado,
+                    'fecha_prestamo': fecha,
+                    'fecha_vencimiento': vencimiento(fecha),
+                }
+                for elemento_id in ids
+            ]).all()
+            eventos.abrir(self.session, [(prestamo_id, elemento_id, fecha) for prestamo_id, elemento_id in creados])
+            rol = self._rol(persona_id)
+            deltas = Counter()
+            for tipo in tipos:
+                deltas.update(tablero.deltas_apertura(estado, tipo, rol, fecha))
+            tablero.sumar(self.session, deltas)
+            return ids
+
+        try:
+            return self._transaccion(operacion)
+        except ElementoReservado:
+            raise
+        except ElementoNoDisponible:
+            disponibles = set(self.session.scalars(
+                select(ElementoAudiovisual.id)
+                .where(ElementoAudiovisual.id.in_(ids), ElementoAudiovisual.disponible.is_(True))
+            ))
+            self.session.rollback()
+            raise ElementoNoDisponible(*[i for i in ids if i not in disponibles])
+
+    def reservar(self, elemento_id, persona_id, usuario_id, desde, hasta, notas=None):
+        """Reserva el elemento en [desde, hasta); lanza `ElementoReservado` si choca con otra reserva o préstamo"""
+        def operacion():
+            # Bloquea la fila del elemento (y en SQLite toma el bloqueo de escritura) antes de buscar
+            # choques; la versión sube porque la página del elemento muestra sus próximas reservas
+            existe = self.session.execute(
+                update(ElementoAudiovisual)
+                .where(ElementoAudiovisual.id == elemento_id)
+                .values(**ElementoAudiovisual.nueva_version())
+                .returning(ElementoAudiovisual.id)
+            ).scalar_one_or_none()
+            if existe is None:
+                raise ElementoNoDisponible(elemento_id)
+            choca = (reservas.choques(self.session, [elemento_id], desde, hasta)
+                     or reservas.prestado_en(self.session, elemento_id, desde, hasta))
+            if choca:
+                raise ElementoReservado(elemento_id)
+            reserva = Reserva(elemento_id=elemento_id, persona_id=persona_id, usuario_id=usuario_id,
+                              desde=desde, hasta=hasta, notas=notas)
+            self.session.add(reserva)
+            try:
+                self.session.flush()
+            except IntegrityError as error:
+                # La restricción de exclusión de PostgreSQL, por si algo escapó a la comprobación
+                if getattr(error.orig, 'sqlstate', None) == reservas.CODIGO_EXCLUSION:
+                    raise ElementoReservado(elemento_id) from error
+                raise
+            return reserva
+        return self._transaccion(operacion)
+
+    def cancelar_reserva(self, reserva_id):
+        """Cancela una reserva activa; lanza `ReservaNoModificable` si no lo está"""
+        def operacion():
+            elemento_id = self.session.execute(
+                update(Reserva)
+                .where(Reserva.id == reserva_id, Reserva.estado == 'activa')
+                .values(estado='cancelada')
+                .returning(Reserva.elemento_id)
+            ).scalar_one_or_none()
+            if elemento_id is None:
+                raise ReservaNoModificable(reserva_id)
+            self.session.execute(
+                update(ElementoAudiovisual)
+                .where(ElementoAudiovisual.id == elemento_id)
+                .values(**ElementoAudiovisual.nueva_version())
+            )
+            return elemento_id
+        return self._transaccion(operacion)
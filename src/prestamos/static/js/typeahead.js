@@ -0,0 +1,55 @@
+// Autocompletado de los selectores de persona y elemento del formulario de préstamos.
+// Cada <input data-typeahead-url="..." data-typeahead-target="id_del_select"> consulta
+// la ruta JSON indicada mientras se escribe y reemplaza las opciones del <select>.
+// Con data-typeahead-rango="desde hasta" también envía los valores de esos campos
+// (p. ej. /api/disponibilidad, que necesita el rango de fechas).
+(function () {
+    'use strict';
+
+    function actualizarOpciones(select, resultados) {
+        // Conservar las opciones elegidas aunque no estén entre los nuevos resultados
+        var seleccionadas = Array.prototype.slice.call(select.selectedOptions);
+        var elegidas = {};
+        select.innerHTML = '';
+        seleccionadas.forEach(function (opcion) {
+            elegidas[opcion.value] = true;
+            select.add(new Option(opcion.text, opcion.value, true, true));
+        });
+        resultados.forEach(function (r) {
+            if (!elegidas[r.id]) {
+                select.add(new Option(r.texto, r.id));
+            }
+        });
+    }
+
+    document.querySelectorAll('[data-typeahead-url]').forEach(function (input) {
+        var select = document.getElementById(input.dataset.typeaheadTarget);
+        var temporizador = null;
+        var ultimaConsulta = null;
+        if (!select) {
+            return;
+        }
+        input.addEventListener('input', function () {
+            clearTimeout(temporizador);
+            temporizador = setTimeout(function () {
+                var q = input.value.trim();
+                var url = input.dataset.typeaheadUrl + '?q=' + encodeURIComponent(q);
+                (input.dataset.typeaheadRango || '').split(' ').filter(Boolean).forEach(function (id) {
+                    var campo = document.getElementById(id);
+                    url += '&' + id + '=' + encodeURIComponent(campo ? campo.value : '');
+                });
+                if (url === ultimaConsulta) {
+                    return;
+                }
+                ultimaConsulta = url;
+                fetch(url, {headers: {'Accept': 'application/json'}, credentials: 'same-origin'})
+                    .then(function (respuesta) { return respuesta.ok ? respuesta.json() : null; })
+                    .then(function (datos) {
+                        if (datos && url === ultimaConsulta) {
+                            actualizarOpciones(select, datos.resultados);
+                        }
+                    });
+            }, 250);
+        });
+    });
+})();
@@ -0,0 +1,156 @@
+"""Contadores del tablero de administración (/admin/tablero).
+
+En lugar de agregar toda la tabla `prestamo` en cada visita, `PrestamoService`
+suma o resta en `contadores_tablero` dentro de la misma transacción que
+presta, devuelve o cancela (un `INSERT ... ON CONFLICT DO UPDATE`). El
+tablero lee unas pocas filas, sin importar el tamaño del historial.
+
+Métricas (columna `metrica`, con su `clave`):
+    estado        préstamos por estado (pendiente, activo, devuelto, cancelado)
+    activos_tipo  préstamos abiertos por tipo de elemento
+    rol           préstamos por rol de la persona
+    dia           préstamos registrados por día (AAAA-MM-DD)
+    activos_dia   préstamos abiertos por día de préstamo (para contar los vencidos)
+
+Si los contadores se desalinean (por ejemplo, tras editar la base a mano) se
+reconstruyen desde `prestamo` con:
+    python -m prestamos.tablero recalcular
+"""
+import sys
+from collections import Counter
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from prestamos.config import PRESTAMO_DIAS
+from prestamos.database import db
+from prestamos.models import ContadorTablero, ElementoAudiovisual, Persona, Prestamo, ESTADOS_ACTIVOS
+
+
+def _dia(fecha):
+    return fecha.date().isoformat()
+
+
+def deltas_apertura(estado, tipo, rol, fecha):
+    """Cambios en los contadores al registrar un préstamo"""
+    deltas = Counter({('estado', estado): 1, ('rol', str(rol)): 1, ('dia', _dia(fecha)): 1})
+    if estado in ESTADOS_ACTIVOS:
+        deltas[('activos_tipo', tipo)] += 1
+        deltas[('activos_dia', _dia(fecha))] += 1
+    return deltas
+
+
+def deltas_cierre(estado_anterior, estado, tipo, fecha):
+    """Cambios en los contadores al pasar un préstamo abierto a `estado` (devuelto o cancelado)"""
+    return Counter({
+        ('estado', estado_anterior): -1,
+        ('estado', estado): 1,
+        ('activos_tipo', tipo): -1,
+        ('activos_dia', _dia(fecha)): -1,
+    })
+
+
+def sumar(session, deltas):
+    """Aplica los deltas con un solo upsert; las claves van ordenadas para no cruzar bloqueos"""
+    filas = [{'metrica': metrica, 'clave': clave, 'valor': valor}
+             for (metrica, clave), valor in sorted(deltas.items()) if valor]
+    if not filas:
+        return
+    insertar = (sqlite_insert if session.get_bind().dialect.name == 'sqlite' else postgresql_insert)(ContadorTablero)
+    session.execute(
+        insertar.on_conflict_do_update(index_elements=['metrica', 'clave'],
+                                       set_={'valor': ContadorTablero.valor + insertar.excluded.valor}),
+        filas,
+    )
+    # Los días sin préstamos abiertos no se guardan, así contar vencidos recorre pocas filas
+    dias = [clave for (metrica, clave), valor in deltas.items() if metrica == 'activos_dia' and valor < 0]
+    if dias:
+        session.execute(sa.delete(ContadorTablero).where(
+            ContadorTablero.metrica == 'activos_dia', ContadorTablero.clave.in_(dias), ContadorTablero.valor <= 0
+        ))
+
+
+def reconstruir(ejecutor):
+    """Reemplaza los contadores por los calculados desde `prestamo` (sesión o conexión, sin confirmar)"""
+    dia = sa.cast(sa.func.date(Prestamo.fecha_prestamo), sa.String)
+    abiertos = Prestamo.estado.in_(ESTADOS_ACTIVOS)
+    consultas = {
+        'estado': sa.select(Prestamo.estado, sa.func.count()).group_by(Prestamo.estado),
+        'activos_tipo': sa.select(ElementoAudiovisual.tipo, sa.func.count()).select_from(Prestamo)
+            .join(ElementoAudiovisual, ElementoAudiovisual.id == Prestamo.elemento_id)
+            .where(abiertos).group_by(ElementoAudiovisual.tipo),
+        'rol': sa.select(Persona.rol, sa.func.count()).select_from(Prestamo)
+            .join(Persona, Persona.id == Prestamo.persona_id).group_by(Persona.rol),
+        'dia': sa.select(dia, sa.func.count()).group_by(dia),
+        'activos_dia': sa.select(dia, sa.func.count()).where(abiertos).group_by(dia),
+    }
+    ejecutor.execute(sa.delete(ContadorTablero))
+    filas = [{'metrica': metrica, 'clave': str(clave), 'valor': valor}
+             for metrica, consulta in consultas.items()
+             for clave, valor in ejecutor.execute(consulta)]
+    if filas:
+        ejecutor.execute(sa.insert(ContadorTablero), filas)
+    return len(filas)
+
+
+def recalcular(session=None):
+    """Reconstruye todos los contadores a partir de la tabla `prestamo` y confirma"""
+    session = session or db.session
+    filas = reconstruir(session)
+    session.commit()
+    return filas
+
+
+def resumen(session=None, dias=30, hoy=None):
+    """Datos del tablero: lee solo las filas de contadores necesarias"""
+    session = session or db.session
+    hoy = hoy or date.today()
+    desde = (hoy - timedelta(days=dias - 1)).isoformat()
+    corte = (hoy - timedelta(days=PRESTAMO_DIAS)).isoformat()
+    metricas = {'estado': {}, 'activos_tipo': {}, 'rol': {}, 'dia': {}}
+    consulta = sa.select(ContadorTablero.metrica, ContadorTablero.clave, ContadorTablero.valor).where(
+        ContadorTablero.metrica.in_(['estado', 'activos_tipo', 'rol'])
+        | ((ContadorTablero.metrica == 'dia') & (ContadorTablero.clave >= desde))
+    )
+    for metrica, clave, valor in session.execute(consulta):
+        metricas[metrica][clave] = valor
+    vencidos = session.scalar(
+        sa.select(sa.func.coalesce(sa.func.sum(ContadorTablero.valor), 0))
+        .where(ContadorTablero.metrica == 'activos_dia', ContadorTablero.clave < corte)
+    )
+    por_dia = [((hoy - timedelta(days=i)).isoformat(), 0) for i in range(dias - 1, -1, -1)]
+    return {
+        'estados': metricas['estado'],
+        'activos': sum(metricas['estado'].get(estado, 0) for estado in ESTADOS_ACTIVOS),
+        'activos_tipo': sorted(metricas['activos_tipo'].items(), key=lambda par: -par[1]),
+        'roles': sorted(metricas['rol'].items(), key=lambda par: -par[1]),
+        'por_dia': [(dia, metricas['dia'].get(dia, valor)) for dia, valor in por_dia],
+        'vencidos': vencidos,
+        'dias_vencimiento': PRESTAMO_DIAS,
+    }
+
+
+def main(argv=None):
+    from prestamos.db_init import create_app
+
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else 'mostrar'
+    app = create_app()
+    with app.app_context():
+        if comando == 'recalcular':
+            print(f"Contadores recalculados: {recalcular()} filas.")
+        elif comando == 'mostrar':
+            datos = resumen()
+            print(f"Préstamos abiertos: {datos['activos']} ({datos['vencidos']} vencidos)")
+            for estado, valor in sorted(datos['estados'].items()):
+                print(f"  {estado:<12} {valor}")
+        else:
+            print(f"Comando desconocido: {comando}. Use 'mostrar' o 'recalcular'.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Proceso trabajador: atiende la cola de trabajos y busca préstamos vencidos.
+
+Corre aparte de los workers web, que nunca envían correos ni escanean
+préstamos. Cada VENCIDOS_INTERVALO segundos encola los avisos de vencimiento
+(ver prestamos.avisos) y entre tanto ejecuta los trabajos pendientes de a
+TRABAJOS_LOTE. Se pueden levantar varios trabajadores a la vez.
+
+Uso:
+    python -m prestamos.trabajador                 # bucle continuo (Ctrl+C o SIGTERM para salir)
+    python -m prestamos.trabajador --una-vez       # escanea, vacía la cola y termina (para cron)
+    python -m prestamos.trabajador escanear        # solo encola los avisos de vencidos
+    python -m prestamos.trabajador estado          # trabajos por tipo y estado
+    python -m prestamos.trabajador reintentar      # vuelve a encolar los trabajos fallidos
+"""
+import argparse
+import signal
+import sys
+import time
+
+from prestamos.avisos import escanear_vencidos  # también registra la tarea 'correo'
+from prestamos.config import TRABAJOS_ESPERA, VENCIDOS_INTERVALO
+from prestamos.trabajos import conteo, procesar, reintentar_fallidos
+
+
+class Trabajador:
+    """Bucle de escaneo y ejecución; `detener()` lo termina al acabar el lote en curso"""
+
+    def __init__(self, intervalo=VENCIDOS_INTERVALO, espera=TRABAJOS_ESPERA):
+        self.intervalo = intervalo
+        self.espera = espera
+        self.activo = True
+
+    def detener(self, *_):
+        self.activo = False
+
+    def ejecutar(self, una_vez=False):
+        proximo_escaneo = 0.0
+        while self.activo:
+            if time.monotonic() >= proximo_escaneo:
+                encolados = escanear_vencidos()
+                if encolados:
+                    print(f"{encolados} avisos de vencimiento encolados", flush=True)
+                proximo_escaneo = time.monotonic() + self.intervalo
+            procesados = procesar()
+            if procesados:
+                print(f"{procesados} trabajos procesados", flush=True)
+            elif una_vez:
+                break
+            else:
+                # Espera en tramos cortos para responder rápido a SIGTERM
+                limite = time.monotonic() + self.espera
+                while self.activo and time.monotonic() < limite:
+                    time.sleep(min(0.5, self.espera))
+
+
+def main(argv=None):
+    from prestamos.aplicacion import create_app
+
+    parser = argparse.ArgumentParser(description='Ejecuta los trabajos en segundo plano y los avisos de vencimiento.')
+    parser.add_argument('comando', nargs='?', default='ejecutar',
+                        choices=['ejecutar', 'escanear', 'estado', 'reintentar'])
+    parser.add_argument('--una-vez', action='store_true', help='termina cuando la cola queda vacía')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        if args.comando == 'escanear':
+            print(f"{escanear_vencidos()} avisos de vencimiento encolados")
+        elif args.comando == 'estado':
+            filas = conteo()
+            for tipo, estado, cantidad in filas:
+                print(f"  {tipo:<12} {estado:<10} {cantidad}")
+            if not filas:
+                print("La cola está vacía.")
+        elif args.comando == 'reintentar':
+            print(f"{reintentar_fallidos()} trabajos fallidos vueltos a encolar")
+        else:
+            trabajador = Trabajador()
+            signal.signal(signal.SIGTERM, trabajador.detener)
+            try:
+                trabajador.ejecutar(una_vez=args.una_vez)
+            except KeyboardInterrupt:
+                pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
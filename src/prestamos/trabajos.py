@@ -0,0 +1,137 @@
+"""Cola de trabajos en segundo plano guardada en la base de datos (tabla `trabajos`).
+
+La aplicación web y el escaneo de vencidos solo encolan; los ejecuta el
+proceso `python -m prestamos.trabajador`. Cada tipo de trabajo se registra
+con `@tarea(tipo)` y recibe la lista de trabajos de ese tipo tomados en la
+misma vuelta, de modo que puede procesarlos por lotes (p. ej. enviar varios
+correos por una sola conexión SMTP).
+
+Para tomar trabajos se corre `ejecutar_en` hacia adelante con un único
+`UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING`: varios
+trabajadores no toman el mismo trabajo, y si uno muere, sus trabajos vuelven a
+estar disponibles al vencer la reserva (TRABAJOS_RESERVA). Por eso un trabajo
+puede ejecutarse más de una vez y las tareas deben tolerarlo.
+
+Los trabajos terminados se borran; los que agotan TRABAJOS_INTENTOS quedan
+con estado `fallido` y su último error.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+from prestamos.config import TRABAJOS_LOTE, TRABAJOS_RESERVA, TRABAJOS_INTENTOS
+from prestamos.database import db
+from prestamos.models import Trabajo
+
+# Espera antes de reintentar: 30 s, 1 min, 2 min, ... hasta una hora
+_ESPERA_BASE = 30
+_ESPERA_MAX = 3600
+
+TAREAS = {}
+
+
+def tarea(tipo):
+    """Registra `f(trabajos)` como la tarea de `tipo`; devuelve {id: error} de los que fallaron"""
+    def decorador(funcion):
+        TAREAS[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(session, tipo, datos_lista, ejecutar_en=None):
+    """Agrega un trabajo de `tipo` por cada dict de `datos_lista` (sin confirmar la transacción)"""
+    if not datos_lista:
+        return
+    ejecutar_en = ejecutar_en or datetime.utcnow()
+    session.execute(insert(Trabajo), [
+        {'tipo': tipo, 'datos': datos, 'estado': 'pendiente', 'intentos': 0,
+         'ejecutar_en': ejecutar_en, 'creado_en': datetime.utcnow()}
+        for datos in datos_lista
+    ])
+
+
+def tomar(limite=TRABAJOS_LOTE, session=None):
+    """Reserva hasta `limite` trabajos listos y los devuelve (id, tipo, datos, intentos)"""
+    session = session or db.session
+    ahora = datetime.utcnow()
+    candidatos = (
+        select(Trabajo.id)
+        # Estado como literal para que SQLite use el índice parcial ix_trabajos_pendientes
+        .where(Trabajo.estado == bindparam('pendiente', 'pendiente', literal_execute=True), Trabajo.ejecutar_en <= ahora)
+        .order_by(Trabajo.ejecutar_en, Trabajo.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )
+    tomados = session.execute(
+        update(Trabajo)
+        .where(Trabajo.id.in_(candidatos))
+        .values(ejecutar_en=ahora + timedelta(seconds=TRABAJOS_RESERVA), intentos=Trabajo.intentos + 1)
+        .returning(Trabajo.id, Trabajo.tipo, Trabajo.datos, Trabajo.intentos)
+        .execution_options(synchronize_session=False)
+    ).all()
+    session.commit()
+    return sorted(tomados, key=lambda trabajo: trabajo.id)
+
+
+def _terminar(session, hechos, fallidos):
+    if hechos:
+        session.execute(delete(Trabajo).where(Trabajo.id.in_(hechos)))
+    ahora = datetime.utcnow()
+    for trabajo, error in fallidos:
+        espera = min(_ESPERA_BASE * 2 ** (trabajo.intentos - 1), _ESPERA_MAX)
+        session.execute(
+            update(Trabajo)
+            .where(Trabajo.id == trabajo.id)
+            .values(estado='fallido' if trabajo.intentos >= TRABAJOS_INTENTOS else 'pendiente',
+                    ejecutar_en=ahora + timedelta(seconds=espera), error=str(error)[:2000])
+        )
+    session.commit()
+
+
+def procesar(limite=TRABAJOS_LOTE, session=None):
+    """Toma un lote de trabajos, los ejecuta agrupados por tipo y registra el resultado"""
+    session = session or db.session
+    trabajos = tomar(limite, session)
+    por_tipo = defaultdict(list)
+    for trabajo in trabajos:
+        por_tipo[trabajo.tipo].append(trabajo)
+
+    hechos, fallidos = [], []
+    for tipo, grupo in por_tipo.items():
+        funcion = TAREAS.get(tipo)
+        if funcion is None:
+            errores = {trabajo.id: f"tipo de trabajo desconocido: {tipo}" for trabajo in grupo}
+        else:
+            try:
+                errores = funcion(grupo) or {}
+            except Exception as error:
+                session.rollback()
+                errores = {trabajo.id: repr(error) for trabajo in grupo}
+        for trabajo in grupo:
+            if trabajo.id in errores:
+                fallidos.append((trabajo, errores[trabajo.id]))
+            else:
+                hechos.append(trabajo.id)
+    _terminar(session, hechos, fallidos)
+    return len(trabajos)
+
+
+def conteo(session=None):
+    """Cantidad de trabajos por (tipo, estado)"""
+    session = session or db.session
+    return session.execute(
+        select(Trabajo.tipo, Trabajo.estado, func.count())
+        .group_by(Trabajo.tipo, Trabajo.estado).order_by(Trabajo.tipo, Trabajo.estado)
+    ).all()
+
+
+def reintentar_fallidos(session=None):
+    """Vuelve a encolar los trabajos fallidos con sus intentos en cero"""
+    session = session or db.session
+    resultado = session.execute(
+        update(Trabajo).where(Trabajo.estado == 'fallido')
+        .values(estado='pendiente', intentos=0, ejecutar_en=datetime.utcnow())
+    )
+    session.commit()
+    return resultado.rowcount
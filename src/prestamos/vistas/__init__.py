@@ -0,0 +1,13 @@
+"""Vistas de la aplicación, un blueprint por sección.
+
+Los blueprints no cambian las URLs, pero sí el nombre de cada endpoint:
+`url_for('prestamos.index')`, `url_for('elementos.ver_elemento_slug', slug=...)`.
+"""
+from prestamos.vistas import admin, api, auth, elementos, personas, prestamos, reservas
+
+BLUEPRINTS = (auth.bp, prestamos.bp, elementos.bp, reservas.bp, personas.bp, admin.bp, api.bp)
+
+
+def registrar(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
@@ -0,0 +1,133 @@
+"""Vistas de administración: tablero, importación, usuarios y métricas"""
+import hmac
+import io
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, Response, current_app
+from flask_login import current_user, login_required
+
+from prestamos.config import METRICS_TOKEN
+from prestamos.database import db, solo_lectura
+from prestamos.metricas import texto_prometheus
+from prestamos.models import Usuario
+from prestamos.seguridad import HashOcupado
+from prestamos.tablero import resumen as resumen_tablero
+
+bp = Blueprint('admin', __name__)
+
+MENSAJE_HASH_OCUPADO = 'El servidor está ocupado calculando contraseñas. Inténtalo de nuevo en unos segundos.'
+
+@bp.route('/metrics')
+def metricas():
+    """Pool de conexiones, cachés y tiempos por endpoint en formato Prometheus"""
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+            abort(401)
+    elif not current_user.is_authenticated:
+        # Sin token, solo un administrador con sesión iniciada
+        return redirect(url_for('auth.login'))
+    elif not current_user.es_admin:
+        abort(403)
+    return Response(texto_prometheus(db.engine, current_app.jinja_env.fragmentos), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/admin/tablero')
+@login_required
+@solo_lectura
+def tablero_admin():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+    return render_template('admin/tablero.html', datos=resumen_tablero())
+
+@bp.route('/admin/importar', methods=['GET', 'POST'])
+@login_required
+def importar_datos():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+
+    # Importa email_validator y slugify: solo se cargan si alguien importa un archivo
+    from prestamos.importar import importar_personas, importar_elementos, ErrorImportacion
+    from prestamos.forms import ImportarForm
+    form = ImportarForm()
+    resultado = None
+    if form.validate_on_submit():
+        archivo = io.TextIOWrapper(form.archivo.data.stream, encoding='utf-8-sig', newline='')
+        try:
+            if form.tipo.data == 'personas':
+                resultado = importar_personas(archivo)
+            else:
+                resultado = importar_elementos(archivo, current_user.id)
+        except ErrorImportacion as error:
+            flash(str(error))
+        except UnicodeDecodeError:
+            flash('El archivo debe estar codificado en UTF-8.')
+    return render_template('admin/importar.html', form=form, resultado=resultado)
+
+@bp.route('/usuarios')
+@login_required
+@solo_lectura
+def listar_usuarios():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+
+    usuarios = Usuario.query.all()
+    return render_template('usuarios/lista.html', usuarios=usuarios)
+
+@bp.route('/usuarios/nuevo', methods=['GET', 'POST'])
+@login_required
+def nuevo_usuario():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+
+    from prestamos.forms import UsuarioForm
+    form = UsuarioForm()
+
+    if form.validate_on_submit():
+        usuario = Usuario(
+            nombre=form.nombre.data,
+            email=form.email.data,
+            es_admin=form.es_admin.data
+        )
+        try:
+            usuario.set_password(form.password.data)
+        except HashOcupado:
+            flash(MENSAJE_HASH_OCUPADO)
+            return render_template('usuarios/form.html', form=form, titulo='Nuevo Usuario'), 503
+        db.session.add(usuario)
+        db.session.commit()
+        flash('Usuario creado exitosamente.')
+        return redirect(url_for('admin.listar_usuarios'))
+
+    return render_template('usuarios/form.html', form=form, titulo='Nuevo Usuario')
+
+@bp.route('/usuarios/editar/<int:id>', methods=['GET', 'POST'])
+@login_required
+def editar_usuario(id):
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+
+    usuario = Usuario.query.get_or_404(id)
+    from prestamos.forms import UsuarioForm
+    form = UsuarioForm(obj=usuario)
+    form.id_usuario = id
+
+    if form.validate_on_submit():
+        usuario.nombre = form.nombre.data
+        usuario.email = form.email.data
+        usuario.es_admin = form.es_admin.data
+        if form.password.data:
+            try:
+                usuario.set_password(form.password.data)
+            except HashOcupado:
+                # Descarta también los demás campos: el usuario queda como estaba
+                db.session.rollback()
+                flash(MENSAJE_HASH_OCUPADO)
+                return render_template('usuarios/form.html', form=form, titulo='Editar Usuario'), 503
+        db.session.commit()
+        flash('Usuario actualizado exitosamente.')
+        return redirect(url_for('admin.listar_usuarios'))
+
+    return render_template('usuarios/form.html', form=form, titulo='Editar Usuario')
@@ -0,0 +1,106 @@
+"""Rutas JSON: autocompletado, disponibilidad por rango de fechas y préstamos en lote"""
+from datetime import datetime
+
+from flask import Blueprint, abort, jsonify, request
+from flask_login import current_user, login_required
+
+from prestamos import reservas
+from prestamos.config import API_LIMITE, BUSQUEDA_LIMITE, LOTE_MAXIMO
+from prestamos.database import db, solo_lectura
+from prestamos.models import Persona
+from prestamos.search import search_personas, search_elementos
+from prestamos.services import PrestamoService, ElementoNoDisponible
+from prestamos.vistas.comun import texto_persona, texto_elemento
+
+bp = Blueprint('api', __name__)
+
+def _pagina_api():
+    """Lee los parámetros `q`, `pagina` y `limite` de las rutas de autocompletado"""
+    q = request.args.get('q', '').strip()
+    pagina = max(1, request.args.get('pagina', 1, type=int))
+    limite = max(1, min(request.args.get('limite', API_LIMITE, type=int), BUSQUEDA_LIMITE))
+    return q, pagina, limite
+
+@bp.route('/api/personas')
+@login_required
+@solo_lectura
+def api_personas():
+    q, pagina, limite = _pagina_api()
+    # Se pide un resultado extra para saber si existe una página siguiente
+    personas = search_personas(q, limite=limite + 1, offset=(pagina - 1) * limite)
+    return jsonify(
+        resultados=[{'id': p.id, 'texto': texto_persona(p)} for p in personas[:limite]],
+        pagina=pagina,
+        hay_mas=len(personas) > limite
+    )
+
+@bp.route('/api/elementos')
+@login_required
+@solo_lectura
+def api_elementos():
+    q, pagina, limite = _pagina_api()
+    solo_disponibles = request.args.get('disponibles', '1') != '0'
+    elementos = search_elementos(q, limite=limite + 1, offset=(pagina - 1) * limite, solo_disponibles=solo_disponibles)
+    return jsonify(
+        resultados=[{'id': e.id, 'texto': texto_elemento(e)} for e in elementos[:limite]],
+        pagina=pagina,
+        hay_mas=len(elementos) > limite
+    )
+
+def _rango_api():
+    """Lee `desde` y `hasta` (ISO 8601) de la URL; aborta con 400 si faltan o no son válidas"""
+    try:
+        desde = datetime.fromisoformat(request.args.get('desde', ''))
+        hasta = datetime.fromisoformat(request.args.get('hasta', ''))
+    except ValueError:
+        abort(400, 'Indique desde y hasta con el formato AAAA-MM-DDTHH:MM.')
+    if hasta <= desde:
+        abort(400, 'hasta debe ser posterior a desde.')
+    return desde, hasta
+
+@bp.route('/api/disponibilidad')
+@login_required
+@solo_lectura
+def api_disponibilidad():
+    """Elementos sin reservas ni préstamos entre `desde` y `hasta`, filtrables por `tipo` y `q`"""
+    desde, hasta = _rango_api()
+    q, pagina, limite = _pagina_api()
+    tipo = request.args.get('tipo', '').strip() or None
+    elementos = reservas.libres(desde, hasta, q, tipo=tipo, limite=limite + 1, offset=(pagina - 1) * limite)
+    return jsonify(
+        resultados=[{'id': e.id, 'texto': texto_elemento(e), 'tipo': e.tipo, 'slug': e.slug}
+                    for e in elementos[:limite]],
+        pagina=pagina,
+        hay_mas=len(elementos) > limite
+    )
+
+@bp.post('/api/prestamos/lote')
+@login_required
+def api_prestamo_lote():
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify(error='El cuerpo debe ser un objeto JSON con persona_id y elemento_ids.'), 400
+    try:
+        persona_id = int(datos.get('persona_id'))
+        elemento_ids = datos.get('elemento_ids') or []
+        # Una cadena o un objeto se recorrerían carácter por carácter o por sus claves
+        if not isinstance(elemento_ids, list):
+            raise TypeError
+        elemento_ids = [int(i) for i in elemento_ids]
+    except (TypeError, ValueError):
+        return jsonify(error='persona_id debe ser un entero y elemento_ids una lista de enteros.'), 400
+    if not elemento_ids or len(set(elemento_ids)) > LOTE_MAXIMO:
+        return jsonify(error=f'Indique entre 1 y {LOTE_MAXIMO} elementos.'), 400
+    if db.session.get(Persona, persona_id) is None:
+        return jsonify(error='La persona indicada no existe.'), 404
+    try:
+        ids = PrestamoService().prestar_lote(
+            elemento_ids,
+            persona_id=persona_id,
+            usuario_id=current_user.id,
+            notas=datos.get('notas')
+        )
+    except ElementoNoDisponible as error:
+        return jsonify(error='Hay elementos no disponibles; no se registró ningún préstamo.',
+                       no_disponibles=list(error.args)), 409
+    return jsonify(elemento_ids=ids, prestamos=len(ids)), 201
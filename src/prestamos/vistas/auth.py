@@ -0,0 +1,50 @@
+"""Inicio y cierre de sesión; exige sesión iniciada en el resto de la aplicación"""
+from urllib.parse import urlparse
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import current_user, login_user, logout_user
+
+from prestamos.database import db
+from prestamos.models import Usuario
+from prestamos.seguridad import HashOcupado
+
+bp = Blueprint('auth', __name__)
+
+# Endpoints que se atienden sin sesión iniciada (/metrics comprueba su token o exige un administrador)
+PUBLICOS = ('auth.login', 'static', 'admin.metricas')
+
+@bp.before_app_request
+def check_login():
+    if request.endpoint in PUBLICOS:
+        return
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    from prestamos.forms import LoginForm
+    form = LoginForm()
+    if form.validate_on_submit():
+        usuario = Usuario.query.filter_by(email=form.email.data).first()
+        try:
+            valido = usuario is not None and usuario.check_password(form.password.data)
+        except HashOcupado:
+            flash('Hay demasiados inicios de sesión en curso. Inténtalo de nuevo en unos segundos.')
+            return render_template('admin/login_form.html', form=form), 503
+        if valido:
+            if usuario in db.session.dirty:
+                # Guarda el hash regenerado porque cambió la política de contraseñas
+                db.session.commit()
+            login_user(usuario)
+            next_page = request.args.get('next')
+            if next_page and urlparse(next_page).netloc == '':
+                return redirect(next_page)
+            return redirect(url_for('prestamos.index'))
+        else:
+            flash('Credenciales inválidas. Inténtalo de nuevo.')
+    return render_template('admin/login_form.html', form=form)
+
+@bp.route('/logout')
+def logout():
+    logout_user()
+    return redirect(url_for('prestamos.index'))
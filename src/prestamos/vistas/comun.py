@@ -0,0 +1,16 @@
+"""Funciones compartidas por las vistas de varios blueprints"""
+
+
+def texto_persona(persona):
+    return f"{persona.nombre_completo} - {persona.identificacion} ({persona.rol})"
+
+
+def texto_elemento(elemento):
+    return f"{elemento.placa} - {elemento.nombre}"
+
+
+def con_seleccion(resultados, seleccionado):
+    """Garantiza que la opción ya seleccionada aparezca entre los resultados del buscador"""
+    if seleccionado is not None and seleccionado not in resultados:
+        resultados.insert(0, seleccionado)
+    return resultados
@@ -0,0 +1,116 @@
+"""Catálogo de elementos audiovisuales: listado, detalle, alta y baja"""
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+
+from prestamos import condicional, reservas
+from prestamos.cache import cache
+from prestamos.database import db, solo_lectura
+from prestamos.models import ElementoAudiovisual, Prestamo, Reserva, Version
+from prestamos.search import search_elementos
+
+bp = Blueprint('elementos', __name__)
+
+def _fila_elemento(elemento):
+    """Columnas de un elemento que usa el catálogo, en un formato apto para la caché"""
+    return {
+        'id': elemento.id,
+        'placa': elemento.placa,
+        'nombre': elemento.nombre,
+        'tipo': elemento.tipo,
+        'disponible': elemento.disponible,
+        'slug': elemento.slug,
+        'user_id': elemento.user_id,
+        # Con el id, la clave de la fila en la caché de fragmentos de index.html
+        'version': elemento.version,
+        'actualizado_en': elemento.actualizado_en.isoformat() if elemento.actualizado_en else None,
+    }
+
+@bp.route('/elementos')
+@login_required
+@solo_lectura
+def listar_elementos():
+    placa = request.args.get('placa', '').strip()
+    tipo = request.args.get('tipo', '').strip()
+    version, actualizado_en = Version.leer('elementos')
+    etiqueta = condicional.etag('elementos', version)
+    no_modificado = condicional.no_modificado(etiqueta, actualizado_en)
+    if no_modificado:
+        return no_modificado
+    # La versión del catálogo va en las claves: la generación de la caché es por proceso y no ve las
+    # escrituras de otros workers, así que sin ella se servirían filas viejas con el ETag nuevo
+    elementos = cache.obtener('elementos', f'listado:{version}:{tipo}:{placa}', lambda: [
+        _fila_elemento(e) for e in search_elementos(placa, limite=None, tipo=tipo or None)
+    ])
+    tipos = cache.obtener('elementos', f'tipos:{version}', lambda: [
+        t[0] for t in db.session.query(ElementoAudiovisual.tipo).distinct().order_by(ElementoAudiovisual.tipo)
+    ])
+    return condicional.con_validadores(
+        render_template('index.html', elementos=elementos, placa=placa, tipo=tipo, tipos=tipos,
+                        version_catalogo=(version, actualizado_en)),
+        etiqueta, actualizado_en)
+
+@bp.route('/elemento/<slug>/')
+@login_required
+@solo_lectura
+def ver_elemento_slug(slug):
+    # Solo si el navegador trae un ETag vale la pena leer la versión antes que la fila. El ETag lleva el
+    # id (un slug reutilizado por otro elemento empieza de nuevo en la versión 1) y el fin de la reserva
+    # más próxima (al vencer, la página cambia sin que cambie el elemento)
+    if request.if_none_match:
+        fila = ElementoAudiovisual.version_por_slug(slug, reservas.fin_mas_proximo())
+        if fila:
+            id_, version, actualizado_en, fin_reserva = fila
+            etiqueta = condicional.etag('elemento', (id_, version, actualizado_en), fin_reserva)
+            no_modificado = condicional.no_modificado(etiqueta, actualizado_en)
+            if no_modificado:
+                return no_modificado
+    elemento = ElementoAudiovisual.get_by_slug(slug)
+    if not elemento:
+        abort(404)
+    # Sin solapamientos, la reserva que termina primero es también la primera que muestra `proximas`
+    proximas = reservas.proximas(elemento.id)
+    fin_reserva = min((reserva.hasta for reserva in proximas), default=None)
+    return condicional.con_validadores(
+        render_template('elemento_view.html', elemento=elemento, reservas=proximas),
+        condicional.etag('elemento', elemento.version_fila, fin_reserva), elemento.actualizado_en)
+
+@bp.post('/elementos/eliminar/<int:id>')
+@login_required
+def eliminar_elemento(id):
+    elemento = ElementoAudiovisual.query.get_or_404(id)
+    prestamos_count = Prestamo.query.filter_by(elemento_id=id).count()
+    reservas_count = Reserva.query.filter_by(elemento_id=id).count()
+    if prestamos_count > 0 or reservas_count > 0 or not elemento.disponible:
+        flash('No se puede eliminar el elemento porque tiene préstamos o reservas asociados o está prestado.')
+        return redirect(url_for('elementos.listar_elementos'))
+    if elemento.user_id != current_user.id and not current_user.es_admin:
+        flash('No tienes permiso para eliminar este elemento.')
+        return redirect(url_for('elementos.listar_elementos'))
+    db.session.delete(elemento)
+    db.session.commit()
+    flash('Elemento eliminado correctamente.')
+    return redirect(url_for('elementos.listar_elementos'))
+
+@bp.route('/nuevo-elemento', methods=['GET', 'POST'])
+@login_required
+def nuevo_elemento():
+    from prestamos.forms import ElementoForm
+    form = ElementoForm()
+    if form.validate_on_submit():
+        elemento = ElementoAudiovisual(
+            placa=form.placa.data,
+            nombre=form.nombre.data,
+            tipo=form.tipo.data,
+            descripcion=form.descripcion.data,
+            disponible=True,
+            user_id=current_user.id
+        )
+        try:
+            elemento.save()
+            flash('Elemento audiovisual creado exitosamente.')
+            return redirect(url_for('elementos.listar_elementos'))
+        except IntegrityError:
+            db.session.rollback()
+            flash('La placa ingresada ya existe en el sistema.')
+    return render_template('admin/elemento_form.html', form=form)
@@ -0,0 +1,70 @@
+"""Gestión de las personas que reciben préstamos"""
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_login import current_user, login_required
+
+from prestamos.database import db, solo_lectura
+from prestamos.models import Persona, Prestamo, Reserva
+
+bp = Blueprint('personas', __name__)
+
+@bp.route('/personas')
+@login_required
+@solo_lectura
+def listar_personas():
+    personas = Persona.query.all()
+    return render_template('personas/lista.html', personas=personas)
+
+@bp.route('/personas/nueva', methods=['GET', 'POST'])
+@login_required
+def nueva_persona():
+    from prestamos.forms import PersonaForm
+    form = PersonaForm()
+    if form.validate_on_submit():
+        persona = Persona(
+            nombre=form.nombre.data,
+            apellido=form.apellido.data,
+            identificacion=form.identificacion.data,
+            email=form.email.data,
+            telefono=form.telefono.data,
+            rol=form.rol.data
+        )
+        db.session.add(persona)
+        db.session.commit()
+        flash('Persona registrada correctamente.')
+        return redirect(url_for('personas.listar_personas'))
+    return render_template('personas/form.html', form=form, titulo='Nueva Persona')
+
+@bp.route('/personas/editar/<int:id>', methods=['GET', 'POST'])
+@login_required
+def editar_persona(id):
+    persona = Persona.query.get_or_404(id)
+    from prestamos.forms import PersonaForm
+    form = PersonaForm(obj=persona)
+    form.id_persona = id
+    if form.validate_on_submit():
+        persona.nombre = form.nombre.data
+        persona.apellido = form.apellido.data
+        persona.identificacion = form.identificacion.data
+        persona.email = form.email.data
+        persona.telefono = form.telefono.data
+        persona.rol = form.rol.data
+        db.session.commit()
+        flash('Datos de la persona actualizados correctamente.')
+        return redirect(url_for('personas.listar_personas'))
+    return render_template('personas/form.html', form=form, titulo='Editar Persona')
+
+@bp.post('/personas/eliminar/<int:id>')
+@login_required
+def eliminar_persona(id):
+    if not current_user.es_admin:
+        flash('No tienes permiso para eliminar personas.')
+        return redirect(url_for('personas.listar_personas'))
+    persona = Persona.query.get_or_404(id)
+    prestamos_count = Prestamo.query.filter_by(persona_id=id).count()
+    if prestamos_count > 0 or Reserva.query.filter_by(persona_id=id).count() > 0:
+        flash('No se puede eliminar la persona porque tiene préstamos o reservas asociados.')
+        return redirect(url_for('personas.listar_personas'))
+    db.session.delete(persona)
+    db.session.commit()
+    flash('Persona eliminada correctamente.')
+    return redirect(url_for('personas.listar_personas'))
@@ -0,0 +1,228 @@
+"""Listados, registro, exportación, devolución y cancelación de préstamos"""
+import tempfile
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, Response, send_file, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
+
+from prestamos.config import BUSQUEDA_LIMITE, LOTE_MAXIMO, PRESTAMOS_POR_PAGINA, PRESTAMOS_POR_PAGINA_MAX
+from prestamos.database import solo_lectura
+from prestamos.exportar import filas_prestamos, generar_csv, escribir_xlsx, parsear_fecha
+from prestamos.models import ElementoAudiovisual, Prestamo
+from prestamos.search import search_personas, search_elementos
+from prestamos.services import PrestamoService, ElementoNoDisponible, ElementoReservado, PrestamoNoModificable
+from prestamos.vistas.comun import texto_persona, texto_elemento, con_seleccion
+
+bp = Blueprint('prestamos', __name__)
+
+def _pagina_prestamos(query=None):
+    """Obtiene la página de préstamos indicada por los cursores de la URL"""
+    limite = request.args.get('limite', PRESTAMOS_POR_PAGINA, type=int)
+    limite = max(1, min(limite, PRESTAMOS_POR_PAGINA_MAX))
+    return Prestamo.listar_pagina(
+        query,
+        despues=request.args.get('despues'),
+        antes=request.args.get('antes'),
+        limite=limite
+    )
+
+@bp.route('/')
+@login_required
+@solo_lectura
+def index():
+    prestamos = _pagina_prestamos()
+    return render_template('prestamos/lista.html', prestamos=prestamos)
+
+@bp.route('/prestamos')
+@login_required
+@solo_lectura
+def mis_prestamos():
+    prestamos = Prestamo.query.filter_by(usuario_id=current_user.id).options(
+        joinedload(Prestamo.elemento),
+        joinedload(Prestamo.usuario)
+    ).all()
+    return render_template('mis_prestamos.html', prestamos=prestamos)
+
+@bp.route('/prestamos/lista')
+@login_required
+@solo_lectura
+def listar_prestamos():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+    prestamos = _pagina_prestamos()
+    return render_template('prestamos/lista.html', prestamos=prestamos)
+
+@bp.route('/prestamos/exportar')
+@login_required
+@solo_lectura
+def exportar_prestamos():
+    if not current_user.es_admin:
+        flash('No tienes permisos para acceder a esta sección.')
+        return redirect(url_for('prestamos.index'))
+    try:
+        desde = parsear_fecha(request.args.get('desde'))
+        hasta = parsear_fecha(request.args.get('hasta'))
+    except ValueError:
+        abort(400, 'Las fechas deben tener el formato AAAA-MM-DD.')
+    estado = request.args.get('estado') or None
+    filas = filas_prestamos(desde, hasta, estado)
+    nombre = f"prestamos-{datetime.now():%Y%m%d-%H%M%S}"
+
+    if request.args.get('formato') == 'xlsx':
+        archivo = tempfile.TemporaryFile()
+        try:
+            escribir_xlsx(filas, archivo)
+        except RuntimeError as error:
+            archivo.close()
+            abort(501, str(error))
+        archivo.seek(0)
+        return send_file(
+            archivo,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=f"{nombre}.xlsx"
+        )
+
+    return Response(
+        stream_with_context(generar_csv(filas)),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{nombre}.csv"'}
+    )
+
+@bp.route('/prestamos/nuevo', methods=['GET', 'POST'])
+@login_required
+def nuevo_prestamo():
+    from prestamos.forms import PrestamoForm
+    form = PrestamoForm()
+
+    # Soporte de buscador por GET
+    q_persona = request.args.get('q_persona', '').strip()
+    q_elemento = request.args.get('q_elemento', '').strip()
+
+    if form.validate_on_submit():
+        try:
+            PrestamoService().prestar(
+                elemento_id=form.elemento_id.data,
+                persona_id=form.persona_id.data,
+                usuario_id=current_user.id,
+                notas=form.notas.data,
+                estado='activo',
+                fecha=datetime.utcnow()
+            )
+            flash('Préstamo registrado correctamente.')
+            return redirect(url_for('prestamos.mis_prestamos'))
+        except ElementoReservado:
+            flash('El elemento seleccionado está reservado por otra persona antes de su vencimiento.')
+        except ElementoNoDisponible:
+            flash('El elemento seleccionado no está disponible.')
+
+    # Opciones iniciales de los selectores (el resto se obtiene con /api/personas y /api/elementos)
+    personas = con_seleccion(search_personas(q_persona, limite=BUSQUEDA_LIMITE), getattr(form, 'persona', None))
+    form.persona_id.choices = [(p.id, texto_persona(p)) for p in personas]
+    elementos = con_seleccion(search_elementos(q_elemento, limite=BUSQUEDA_LIMITE, solo_disponibles=True), getattr(form, 'elemento', None))
+    form.elemento_id.choices = [(e.id, texto_elemento(e)) for e in elementos]
+
+    return render_template('prestamos/form.html', form=form, titulo='Nuevo Préstamo', q_persona=q_persona, q_elemento=q_elemento)
+
+@bp.route('/prestamos/lote', methods=['GET', 'POST'])
+@login_required
+def prestamo_lote():
+    from prestamos.forms import PrestamoLoteForm
+    form = PrestamoLoteForm(maximo=LOTE_MAXIMO)
+
+    if form.validate_on_submit():
+        try:
+            ids = PrestamoService().prestar_lote(
+                form.elemento_ids.data,
+                persona_id=form.persona_id.data,
+                usuario_id=current_user.id,
+                notas=form.notas.data
+            )
+            flash(f'Se registraron {len(ids)} préstamos correctamente.')
+            return redirect(url_for('prestamos.mis_prestamos'))
+        except ElementoNoDisponible as error:
+            placas = [e.placa for e in form.elementos if e.id in error.args]
+            flash('No se registró ningún préstamo. Elementos no disponibles: ' + ', '.join(placas))
+
+    personas = con_seleccion(search_personas('', limite=BUSQUEDA_LIMITE), getattr(form, 'persona', None))
+    form.persona_id.choices = [(p.id, texto_persona(p)) for p in personas]
+    elementos = search_elementos('', limite=BUSQUEDA_LIMITE, solo_disponibles=True)
+    for seleccionado in getattr(form, 'elementos', []):
+        con_seleccion(elementos, seleccionado)
+    form.elemento_ids.choices = [(e.id, texto_elemento(e)) for e in elementos]
+    return render_template('prestamos/lote.html', form=form, maximo=LOTE_MAXIMO)
+
+@bp.route('/solicitar-prestamo/<int:elemento_id>', methods=['GET', 'POST'])
+@login_required
+def solicitar_prestamo(elemento_id):
+    from prestamos.forms import PrestamoForm
+
+    elemento = ElementoAudiovisual.query.get_or_404(elemento_id)
+    if not elemento.disponible:
+        flash('Este elemento no está disponible actualmente.')
+        return redirect(url_for('elementos.ver_elemento_slug', slug=elemento.slug))
+
+    form = PrestamoForm()
+
+    q_persona = request.args.get('q_persona', '').strip()
+    q_elemento = request.args.get('q_elemento', '').strip()
+    form.elemento_id.data = elemento_id
+
+    if form.validate_on_submit():
+        try:
+            PrestamoService().prestar(
+                elemento_id=elemento_id,
+                persona_id=form.persona_id.data,
+                usuario_id=current_user.id,
+                notas=form.notas.data,
+                estado='pendiente'
+            )
+        except ElementoReservado:
+            flash('Este elemento está reservado por otra persona antes de su vencimiento.')
+            return redirect(url_for('elementos.ver_elemento_slug', slug=elemento.slug))
+        except ElementoNoDisponible:
+            flash('Este elemento no está disponible actualmente.')
+            return redirect(url_for('elementos.ver_elemento_slug', slug=elemento.slug))
+        flash('Solicitud de préstamo realizada correctamente.')
+        return redirect(url_for('prestamos.mis_prestamos'))
+
+    # Opciones iniciales de los selectores, con el elemento actual preseleccionado
+    personas = con_seleccion(search_personas(q_persona, limite=BUSQUEDA_LIMITE), getattr(form, 'persona', None))
+    form.persona_id.choices = [(p.id, f"{p.nombre} {p.apellido} - {p.rol.capitalize()}") for p in personas]
+    elementos = con_seleccion(search_elementos(q_elemento, limite=BUSQUEDA_LIMITE, solo_disponibles=True), elemento)
+    form.elemento_id.choices = [(e.id, f"{e.nombre} - {e.placa}") for e in elementos]
+
+    return render_template('prestamos/form.html', form=form, titulo='Solicitar Préstamo', q_persona=q_persona, q_elemento=q_elemento, elemento=elemento)
+
+@bp.route('/devolver-prestamo/<int:prestamo_id>')
+@login_required
+def devolver_prestamo(prestamo_id):
+    prestamo = Prestamo.query.get_or_404(prestamo_id)
+    # Permitir que cualquier usuario autenticado reciba el préstamo
+    try:
+        PrestamoService().devolver(prestamo.id)
+    except PrestamoNoModificable:
+        if prestamo.estado == 'devuelto':
+            flash('Este préstamo ya fue devuelto.')
+        else:
+            flash('Este préstamo fue cancelado y no se puede devolver.')
+        return redirect(request.referrer or url_for('prestamos.index'))
+    flash('Elemento devuelto correctamente.')
+    return redirect(request.referrer or url_for('prestamos.index'))
+
+@bp.post('/cancelar-prestamo/<int:prestamo_id>')
+@login_required
+def cancelar_prestamo(prestamo_id):
+    prestamo = Prestamo.query.get_or_404(prestamo_id)
+    if prestamo.usuario_id != current_user.id and not current_user.es_admin:
+        flash('No tienes permiso para cancelar este préstamo.')
+        return redirect(request.referrer or url_for('prestamos.index'))
+    try:
+        PrestamoService().cancelar(prestamo.id)
+    except PrestamoNoModificable:
+        flash('Este préstamo ya está cerrado.')
+        return redirect(request.referrer or url_for('prestamos.index'))
+    flash('Préstamo cancelado correctamente.')
+    return redirect(request.referrer or url_for('prestamos.index'))
@@ -0,0 +1,80 @@
+"""Reservas de elementos a futuro: listado, alta y cancelación"""
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
+
+from prestamos.config import BUSQUEDA_LIMITE, RESERVA_DIAS_MAX
+from prestamos.database import db, solo_lectura
+from prestamos.models import ElementoAudiovisual, Reserva
+from prestamos.search import search_personas, search_elementos
+from prestamos.services import PrestamoService, ElementoNoDisponible, ElementoReservado, ReservaNoModificable
+from prestamos.vistas.comun import texto_persona, texto_elemento, con_seleccion
+
+bp = Blueprint('reservas', __name__)
+
+@bp.route('/reservas')
+@login_required
+@solo_lectura
+def listar_reservas():
+    query = Reserva.query.filter(Reserva.estado == 'activa', Reserva.hasta > datetime.utcnow())
+    if not current_user.es_admin:
+        query = query.filter(Reserva.usuario_id == current_user.id)
+    lista = query.options(
+        joinedload(Reserva.elemento),
+        joinedload(Reserva.persona),
+        joinedload(Reserva.usuario)
+    ).order_by(Reserva.desde, Reserva.id).all()
+    return render_template('reservas/lista.html', reservas=lista)
+
+@bp.route('/reservas/nueva', methods=['GET', 'POST'])
+@login_required
+def nueva_reserva():
+    from prestamos.forms import ReservaForm
+    form = ReservaForm(dias_maximo=RESERVA_DIAS_MAX)
+    q_persona = request.args.get('q_persona', '').strip()
+
+    if request.method == 'GET' and request.args.get('elemento_id', type=int):
+        form.elemento_id.data = request.args.get('elemento_id', type=int)
+
+    if form.validate_on_submit():
+        try:
+            PrestamoService().reservar(
+                elemento_id=form.elemento_id.data,
+                persona_id=form.persona_id.data,
+                usuario_id=current_user.id,
+                desde=form.desde.data,
+                hasta=form.hasta.data,
+                notas=form.notas.data
+            )
+            flash('Reserva registrada correctamente.')
+            return redirect(url_for('reservas.listar_reservas'))
+        except ElementoReservado:
+            flash('El elemento ya está reservado o prestado en esas fechas.')
+        except ElementoNoDisponible:
+            flash('El elemento seleccionado no existe.')
+
+    personas = con_seleccion(search_personas(q_persona, limite=BUSQUEDA_LIMITE), getattr(form, 'persona', None))
+    form.persona_id.choices = [(p.id, texto_persona(p)) for p in personas]
+    elemento = getattr(form, 'elemento', None)
+    if elemento is None and form.elemento_id.data:
+        elemento = db.session.get(ElementoAudiovisual, form.elemento_id.data)
+    elementos = con_seleccion(search_elementos('', limite=BUSQUEDA_LIMITE), elemento)
+    form.elemento_id.choices = [(e.id, texto_elemento(e)) for e in elementos]
+    return render_template('reservas/form.html', form=form, q_persona=q_persona, dias_maximo=RESERVA_DIAS_MAX)
+
+@bp.post('/reservas/cancelar/<int:reserva_id>')
+@login_required
+def cancelar_reserva(reserva_id):
+    reserva = Reserva.query.get_or_404(reserva_id)
+    if reserva.usuario_id != current_user.id and not current_user.es_admin:
+        flash('No tienes permiso para cancelar esta reserva.')
+        return redirect(request.referrer or url_for('reservas.listar_reservas'))
+    try:
+        PrestamoService().cancelar_reserva(reserva.id)
+    except ReservaNoModificable:
+        flash('Esta reserva ya estaba cancelada.')
+        return redirect(request.referrer or url_for('reservas.listar_reservas'))
+    flash('Reserva cancelada correctamente.')
+    return redirect(request.referrer or url_for('reservas.listar_reservas'))
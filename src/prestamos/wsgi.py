@@ -0,0 +1,11 @@
+"""Punto de entrada WSGI para producción.
+
+    gunicorn -c gunicorn.conf.py prestamos.wsgi:app
+
+Con los workers `gthread` de gunicorn.conf.py, una consulta lenta o un hash
+de contraseña ocupa un hilo, no el proceso entero: los demás hilos del mismo
+proceso siguen atendiendo peticiones.
+"""
+from prestamos.aplicacion import create_app
+
+app = create_app()